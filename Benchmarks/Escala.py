@@ -0,0 +1,232 @@
+"""
+End-to-end benchmark of the pipelines over synthetic bases of growing size.
+
+For each size a base is generated (see Benchmarks/Sintetico.py) and the benchmark times
+Consist.pipeline, the full manejo sequence (ManejoRunner, not incremental) and the dashboard
+aggregations the interface runs on the result (regional summaries of Consist). The times, the
+steps of each pipeline and the scaling exponent between consecutive sizes are written to a JSON
+file, so a change that makes a step grow faster than the base shows up:
+
+    python -m Benchmarks.Escala --tamanhos 1000 10000 100000 1000000 --saida escala.json
+    python -m Benchmarks.Escala --tamanhos 1000 10000 --anterior escala.json
+
+An exponent of 1 means the phase grows linearly with the number of talhões, 2 quadratically.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Benchmarks.Sintetico import gerar, remover, REGIOES, SUBREGIOES, UNIDADES
+from Database.Consistencia import Consist
+from Database.Pool import ConnectionPool
+from Database.Telemetry import PipelineTelemetry
+from Threads.Runner import ManejoRunner
+
+TAMANHOS = [1000, 10000, 100000, 1000000]
+
+FASES = ['geracao', 'consistencia', 'manejo', 'painel']
+
+# Columns summed per region by the economic evaluation charts
+COLUNAS_PAINEL = ['CustosPostoFabrica', 'CustosColheitaTotal', 'CustoMADPE', 'CustosTAXAADM']
+
+# A phase is flagged when it takes longer than this ratio of the previous result
+TOLERANCIA = 1.25
+
+
+def painel(db, goal):
+    """
+    Run the aggregations of the result dashboard on an output table, as the interface does after a run.
+
+    :return: The number of summaries computed.
+    """
+    consist = Consist(db)
+    consist.print_ajuste_base('apex_base_1')
+    unidades = [(unidade, 1) for unidade in dict.fromkeys(UNIDADES.values())]
+    regioes = [(regiao, 3) for regiao in REGIOES]
+    subregioes = [(subregiao, 5) for subregiao in SUBREGIOES]
+    total = 0
+    for other, n in unidades + regioes + subregioes:
+        for regime in ('Reforma', 'Regeneração'):
+            consist.regional_resumo(goal, regime, other, n)
+            total += 1
+    for other, n in unidades + regioes:
+        for coluna in COLUNAS_PAINEL:
+            for regime, sufixo in (('Reforma', '_REF_REF'), ('Regeneração', '_REF_REG')):
+                consist.regional_resumo_av(goal, regime, other, n, coluna + sufixo, 'True')
+                total += 1
+    return total
+
+
+class Escala:
+    """
+    Times the pipelines on a synthetic base of each size.
+    """
+
+    def __init__(self, pasta, seed=1, vetorizado=False, manter_bases=False):
+        """
+        :param pasta: The folder of the synthetic bases.
+        :param seed: The seed of the generator.
+        :param vetorizado: Compute the manejo chain with the VectorEngine.
+        :param manter_bases: Keep the bases after they are measured (the largest take a few GB).
+        """
+        self.pasta = pasta
+        self.seed = seed
+        self.vetorizado = vetorizado
+        self.manter_bases = manter_bases
+
+    def medir(self, n):
+        """
+        Generate a base with n talhões and time each phase on it.
+
+        :return: A dict with the size, the row counts, the time of each phase and of each step.
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        db = os.path.join(self.pasta, f"sintetico_{n}.db")
+        etapas = {'Consist': {}, 'APEX': {}}
+
+        def registrar(pipeline):
+            def callback(stats):
+                etapas[pipeline][stats['Etapa']] = stats['Tempo']
+            return callback
+
+        tempos = {}
+        inicio = time.perf_counter()
+        linhas = gerar(db, n, self.seed)
+        tempos['geracao'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        Consist(db).pipeline(telemetria=PipelineTelemetry(db, 'Consist', registrar('Consist')))
+        tempos['consistencia'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        runner = ManejoRunner(db, True, vetorizado=self.vetorizado, incremental=False, estatisticas=registrar('APEX'))
+        goal = runner.simulate(progress=False)
+        tempos['manejo'] = time.perf_counter() - inicio
+        if goal is None:
+            raise RuntimeError(f"A simulação falhou com {n} talhões")
+
+        inicio = time.perf_counter()
+        resumos = painel(db, goal)
+        tempos['painel'] = time.perf_counter() - inicio
+
+        ConnectionPool.for_path(db).close()
+        tamanho = os.path.getsize(db)
+        if not self.manter_bases:
+            remover(db)
+        return {'talhoes': n, 'linhas': linhas, 'bytes': tamanho, 'resumos': resumos, 'tempos': tempos,
+                'etapas': etapas}
+
+    def run(self, tamanhos, verbose=True):
+        """
+        Measure every size, smallest first.
+
+        :return: The report: the environment, the result of each size and the scaling exponents.
+        """
+        resultados = []
+        for n in sorted(tamanhos):
+            resultado = self.medir(n)
+            resultados.append(resultado)
+            if verbose:
+                print(f"{n:>9} talhões: " + ", ".join(f"{fase} {resultado['tempos'][fase]:.2f} s" for fase in FASES))
+        return {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'ambiente': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'sistema': platform.platform(),
+                'processador': platform.processor() or platform.machine(),
+            },
+            'seed': self.seed,
+            'vetorizado': self.vetorizado,
+            'resultados': resultados,
+            'expoentes': expoentes(resultados),
+        }
+
+
+def expoentes(resultados):
+    """
+    Return the scaling exponent of each phase and step between consecutive sizes.
+
+    The exponent is log(t2 / t1) / log(n2 / n1): 1 when the time grows like the number of talhões.
+
+    :return: A list of dicts {'de': n1, 'para': n2, 'fases': {...}, 'etapas': {pipeline: {...}}}.
+    """
+    def expoente(t1, t2, razao):
+        return math.log(t2 / t1) / razao if t1 > 0 and t2 > 0 else None
+
+    pares = []
+    for antes, depois in zip(resultados, resultados[1:]):
+        razao = math.log(depois['talhoes'] / antes['talhoes'])
+        pares.append({
+            'de': antes['talhoes'],
+            'para': depois['talhoes'],
+            'fases': {fase: expoente(antes['tempos'][fase], depois['tempos'][fase], razao) for fase in FASES},
+            'etapas': {pipeline: {etapa: expoente(tempo, depois['etapas'][pipeline][etapa], razao)
+                                  for etapa, tempo in steps.items() if etapa in depois['etapas'][pipeline]}
+                       for pipeline, steps in antes['etapas'].items()},
+        })
+    return pares
+
+
+def comparar(relatorio, anterior, tolerancia=TOLERANCIA):
+    """
+    Compare the phases of two reports at the sizes both measured.
+
+    :return: A list of (talhões, phase, previous time, current time) for the phases that got slower
+             than the tolerance.
+    """
+    antes = {resultado['talhoes']: resultado['tempos'] for resultado in anterior['resultados']}
+    regressoes = []
+    for resultado in relatorio['resultados']:
+        previous = antes.get(resultado['talhoes'])
+        if previous is None:
+            continue
+        for fase in FASES:
+            if previous.get(fase) and resultado['tempos'][fase] > tolerancia * previous[fase]:
+                regressoes.append((resultado['talhoes'], fase, previous[fase], resultado['tempos'][fase]))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the pipelines on synthetic bases of growing size.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS, help="Numbers of talhões (default: 1k to 1M).")
+    parser.add_argument('--pasta', default='bench', help="Folder of the synthetic bases (default: bench).")
+    parser.add_argument('--saida', default='escala.json', help="The JSON report (default: escala.json).")
+    parser.add_argument('--anterior', help="A previous report to compare with.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--vetorizado', action='store_true', help="Run the vectorized engine.")
+    parser.add_argument('--manter-bases', action='store_true', help="Keep the synthetic bases.")
+    args = parser.parse_args(argv)
+
+    relatorio = Escala(args.pasta, args.seed, args.vetorizado, args.manter_bases).run(args.tamanhos)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"Relatório: {args.saida}")
+
+    for par in relatorio['expoentes']:
+        print(f"{par['de']} -> {par['para']}: " +
+              ", ".join(f"{fase} {valor:.2f}" for fase, valor in par['fases'].items() if valor is not None))
+
+    if args.anterior:
+        with open(args.anterior, encoding='utf-8') as f:
+            regressoes = comparar(relatorio, json.load(f))
+        for n, fase, antes, depois in regressoes:
+            print(f"Regressão: {fase} com {n} talhões, {antes:.2f} s -> {depois:.2f} s")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+Micro-benchmarks of the manejo steps, each checked against its golden output.
+
+``capturar`` runs the pipeline once on a base and keeps a snapshot of the database before every
+step (its inputs) plus the final one. The snapshot that follows a step is its golden output.
+``medir`` then runs each step (ESPAreaBasal, perdas, CustosColheitaOP, AVPipeline,
+t700_organizador, ...) in isolation on a copy of its inputs, over repeated runs, and compares what
+it wrote (the resources declared in OutputPlanner) with the golden output within a numeric
+tolerance. A rewrite of a step can so be timed and validated on its own, before the whole chain
+is run. The vectorized engine is captured as one more step ('motor_vetorizado'), which starts
+from the inputs of the SQL chain and must give the output table the chain ends with.
+
+    python -m Benchmarks.Etapas capturar capturas/ --talhoes 2000
+    python -m Benchmarks.Etapas medir capturas/ --etapas perdas av_pipeline --repeticoes 10
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Benchmarks.Sintetico import gerar, remover
+from Database.Consistencia import Consist
+from Database.Pool import ConnectionPool
+from Database.Query import check_identifiers
+from Threads.Runner import ManejoRunner
+
+MANIFESTO = 'manifesto.json'
+
+# Default tolerance of the numeric columns, as in numpy.isclose
+RTOL = 1e-9
+ATOL = 1e-6
+
+
+def snapshot(conn, path):
+    """
+    Copy a database, page by page, from an open connection (with what it has committed) to a new file.
+    """
+    remover(path)
+    with sqlite3.connect(path) as destino:
+        conn.backup(destino)
+    destino.close()
+
+
+def capturar(base, pasta, check_remanescentes=True):
+    """
+    Run the consistency and manejo pipelines on a copy of a base, keeping the inputs of every step.
+
+    :param base: The database to capture (it is not modified).
+    :param pasta: The output folder: the snapshots ('entradas/'), the final state and the manifest.
+    :param check_remanescentes: Whether remanescentes take the decision of the talhão they refer to.
+    :return: The manifest: the output table, the run parameters and, per step, its method, its
+             input and golden snapshots and the resources it writes.
+    """
+    os.makedirs(os.path.join(pasta, 'entradas'), exist_ok=True)
+    db = os.path.join(pasta, 'trabalho.db')
+    with sqlite3.connect(base) as origem:
+        snapshot(origem, db)
+    origem.close()
+    Consist(db).pipeline()
+
+    runner = ManejoRunner(db, check_remanescentes, incremental=False, retomar=False)
+    context = runner.db.begin_run()
+    acrescimo_colheita = context.parametro(10) / 100
+    goal = f'Apex_Manejo_{runner.next_run() + 1}'
+    graph = runner.graph(runner.steps(goal, acrescimo_colheita))
+    etapas = []
+    try:
+        for i, node in enumerate(graph.nodes):
+            entrada = os.path.join('entradas', f"{i:02d}_{node.name}.db")
+            snapshot(runner.db.connect(), os.path.join(pasta, entrada))
+            node.func(*node.args)
+            etapas.append({'nome': node.name, 'metodo': node.func.__name__, 'entrada': entrada,
+                           'escritas': sorted(node.writes)})
+    finally:
+        runner.db.end_run()
+    snapshot(runner.db.connect(), os.path.join(pasta, 'saida.db'))
+
+    # Each step's golden output is the input of the next one
+    for etapa, seguinte in zip(etapas, etapas[1:]):
+        etapa['golden'] = seguinte['entrada']
+    etapas[-1]['golden'] = 'saida.db'
+
+    # The vectorized engine replaces the SQL chain from 'formato_longo' to 't700_organizador'
+    runner.vetorizado = True
+    nomes = [etapa['nome'] for etapa in etapas]
+    for node in runner.graph(runner.steps(goal, acrescimo_colheita)).nodes:
+        if node.name == 'motor_vetorizado' and 'formato_longo' in nomes:
+            cadeia = etapas[nomes.index('formato_longo'):nomes.index('t700_organizador') + 1]
+            etapas.append({'nome': node.name, 'metodo': node.func.__name__, 'entrada': cadeia[0]['entrada'],
+                           'golden': cadeia[-1]['golden'],
+                           'escritas': sorted({w for etapa in cadeia for w in etapa['escritas']
+                                               if w.partition('.')[0] == goal.lower()})})
+    remover(db)
+
+    manifesto = {'data': datetime.now().isoformat(timespec='seconds'), 'base': os.path.abspath(base), 'goal': goal,
+                 'check_remanescentes': check_remanescentes, 'acrescimo_colheita': acrescimo_colheita,
+                 'etapas': etapas}
+    with open(os.path.join(pasta, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    return manifesto
+
+
+def ler(conn, resource):
+    """
+    Read a written resource ('table' or 'table.column') in rowid order, or None if it does not exist.
+    """
+    table, _, column = resource.partition('.')
+    check_identifiers(table, column or None)
+    schema = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND lower(name) = ?", (table,)).fetchone()
+    if schema is None:
+        return None
+    if column and column not in [info[1].lower() for info in conn.execute(f"PRAGMA table_info({table})")]:
+        return None
+    return pd.read_sql(f"SELECT {column or '*'} FROM {table} ORDER BY rowid", conn)
+
+
+def comparar(golden, teste, escritas, rtol=RTOL, atol=ATOL):
+    """
+    Compare the resources a step wrote with its golden output.
+
+    Numeric columns are equal within the tolerance (NULL only matches NULL); the other columns must
+    be identical.
+
+    :param golden: Path to the golden snapshot.
+    :param teste: Path to the database the step ran on.
+    :param escritas: The resources written by the step.
+    :return: A list of differences, empty when the outputs match.
+    """
+    diferencas = []
+    with sqlite3.connect(golden) as a, sqlite3.connect(teste) as b:
+        for resource in escritas:
+            esperado, obtido = ler(a, resource), ler(b, resource)
+            if esperado is None or obtido is None:
+                if (esperado is None) != (obtido is None):
+                    diferencas.append(f"{resource}: {'sobrando' if esperado is None else 'faltando'}")
+                continue
+            if len(esperado) != len(obtido):
+                diferencas.append(f"{resource}: {len(obtido)} linhas, esperadas {len(esperado)}")
+                continue
+            for column in esperado.columns:
+                if column not in obtido.columns:
+                    diferencas.append(f"{resource}: coluna {column} faltando")
+                    continue
+                x, y = esperado[column], obtido[column]
+                if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
+                    iguais = np.isclose(x.to_numpy(float), y.to_numpy(float), rtol=rtol, atol=atol, equal_nan=True)
+                else:
+                    iguais = np.array([u == v or (pd.isna(u) and pd.isna(v)) for u, v in zip(x, y)], dtype=bool)
+                if not iguais.all():
+                    i = int(np.flatnonzero(~iguais)[0])
+                    diferencas.append(f"{resource}: coluna {column}, {int((~iguais).sum())} valores diferentes "
+                                      f"(linha {i}: {x.tolist()[i]!r} != {y.tolist()[i]!r})")
+    a.close()
+    b.close()
+    return diferencas
+
+
+def executar(pasta, manifesto, etapa, destino, substituto=None):
+    """
+    Run one step on a copy of its inputs.
+
+    :param pasta: The capture folder.
+    :param manifesto: The capture manifest.
+    :param etapa: The step entry of the manifest.
+    :param destino: The database file the step runs on (replaced).
+    :param substituto: An alternative implementation, called as substituto(manejo, *args) instead of
+                       the step method.
+    :return: The time of the step call, in seconds (the copy and the run context are not counted).
+    """
+    with sqlite3.connect(os.path.join(pasta, etapa['entrada'])) as origem:
+        snapshot(origem, destino)
+    origem.close()
+    runner = ManejoRunner(destino, manifesto['check_remanescentes'], vetorizado=etapa['nome'] == 'motor_vetorizado',
+                          incremental=False, retomar=False)
+    runner.db.begin_run()
+    try:
+        steps = {name: (func, args) for name, func, args in runner.steps(manifesto['goal'],
+                                                                         manifesto['acrescimo_colheita'])}
+        func, args = steps[etapa['nome']]
+        if substituto is not None:
+            func, args = substituto, (runner.db, *args)
+        inicio = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - inicio
+    finally:
+        runner.db.end_run()
+        ConnectionPool.for_path(destino).close()
+
+
+def medir(pasta, etapas=None, repeticoes=5, rtol=RTOL, atol=ATOL, substitutos=None):
+    """
+    Time the captured steps in isolation and check their output.
+
+    :param pasta: The capture folder (see capturar).
+    :param etapas: The step names (default: every step but the vectorized engine).
+    :param repeticoes: The runs of each step; the output is checked after the first one.
+    :param rtol: The relative tolerance of the numeric columns.
+    :param atol: The absolute tolerance of the numeric columns.
+    :param substitutos: A dict {step name: alternative implementation}, see executar.
+    :return: A list of dicts per step: its times, their minimum and median, and the differences found.
+    """
+    with open(os.path.join(pasta, MANIFESTO), encoding='utf-8') as f:
+        manifesto = json.load(f)
+    por_nome = {etapa['nome']: etapa for etapa in manifesto['etapas']}
+    if etapas is None:
+        etapas = [nome for nome in por_nome if nome != 'motor_vetorizado']
+    desconhecidas = [nome for nome in etapas if nome not in por_nome]
+    if desconhecidas:
+        raise ValueError(f"Etapas não capturadas: {', '.join(desconhecidas)}")
+
+    destino = os.path.join(pasta, 'execucao.db')
+    resultados = []
+    for nome in etapas:
+        etapa = por_nome[nome]
+        substituto = (substitutos or {}).get(nome)
+        tempos, diferencas = [], []
+        for repeticao in range(repeticoes):
+            tempos.append(executar(pasta, manifesto, etapa, destino, substituto))
+            if repeticao == 0:
+                diferencas = comparar(os.path.join(pasta, etapa['golden']), destino, etapa['escritas'], rtol, atol)
+        remover(destino)
+        resultados.append({'etapa': nome, 'metodo': etapa['metodo'], 'tempos': tempos, 'minimo': min(tempos),
+                           'mediana': statistics.median(tempos), 'diferencas': diferencas})
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-step benchmarks of the manejo pipeline against golden outputs.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    captura = comandos.add_parser('capturar', help="Capture the inputs and golden outputs of every step.")
+    captura.add_argument('pasta', help="The capture folder.")
+    origem = captura.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--base', help="The database to capture (it is not modified).")
+    origem.add_argument('--talhoes', type=int, help="Capture a synthetic base with this many talhões.")
+    captura.add_argument('--seed', type=int, default=1, help="The seed of the synthetic base.")
+    captura.add_argument('--sem-remanescentes', action='store_true', help="Do not organize the remanescentes.")
+
+    medicao = comandos.add_parser('medir', help="Time the captured steps and compare their output.")
+    medicao.add_argument('pasta', help="The capture folder.")
+    medicao.add_argument('--etapas', nargs='+', help="The steps to run (default: all but motor_vetorizado).")
+    medicao.add_argument('--repeticoes', type=int, default=5)
+    medicao.add_argument('--rtol', type=float, default=RTOL)
+    medicao.add_argument('--atol', type=float, default=ATOL)
+    medicao.add_argument('--saida', help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'capturar':
+        base = args.base
+        if base is None:
+            os.makedirs(args.pasta, exist_ok=True)
+            base = os.path.join(args.pasta, 'sintetico.db')
+            gerar(base, args.talhoes, args.seed)
+        manifesto = capturar(base, args.pasta, not args.sem_remanescentes)
+        print(f"{len(manifesto['etapas'])} etapas capturadas em {args.pasta}")
+        return 0
+
+    try:
+        resultados = medir(args.pasta, args.etapas, args.repeticoes, args.rtol, args.atol)
+    except ValueError as e:
+        print(e)
+        return 2
+    print(f"\n{'Etapa':<28}{'Método':<38}{'Mínimo (s)':>12}{'Mediana (s)':>13}  Saída")
+    for resultado in resultados:
+        print(f"{resultado['etapa']:<28}{resultado['metodo']:<38}{resultado['minimo']:>12.4f}"
+              f"{resultado['mediana']:>13.4f}  {'ok' if not resultado['diferencas'] else 'DIFERENTE'}")
+        for diferenca in resultado['diferencas']:
+            print(f"    {diferenca}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    return 1 if any(resultado['diferencas'] for resultado in resultados) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Synthetic APEX bases of any size, for the benchmarks.
+
+The tables have the schema the interface gives the sample workbooks of BaseTestes/ when they are
+imported (see the header lists of UISetup.setup_db_buttons), and are written by the same function
+(importar_planilha). Their values follow the domains and distributions of those workbooks: the talhão areas, stems and volumes of the inventories, the
+productivity curve, the harvest, transport and silviculture cost sheets. The talhão codes are
+built like the real ones ('GNSACR00627P12-084'), including the remanescentes ('...7..') and the
+'R' suffix, so the parsing of the Talhao dimension and the regional summaries see the same cases.
+
+    python -m Benchmarks.Sintetico base.db 100000
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from Database.Importacao import importar_planilha
+from Database.Pool import ConnectionPool
+
+# Region -> unit (first two letters of the talhão code)
+UNIDADES = {'SA': 'GN', 'VI': 'GN', 'CO': 'NE', 'PI': 'NE', 'SB': 'NE', 'IP': 'RD', 'PO': 'RD', 'BO': 'RD'}
+REGIOES = list(UNIDADES)
+SUBREGIOES = ['CR', 'PE', 'SA', 'CA', 'CE', 'AL', 'IT', 'PC', 'SB', 'PD', 'PO', 'MA', 'BA', 'VI']
+# Region columns of the productivity curve and of the transport costs
+REGIOES_EXTENSO = ['Sabinopolis', 'Cocais', 'Piracicaba', 'SantaBarbara', 'BeloOriente', 'Ipaba', 'Pompeu',
+                   'Virginopolis']
+FAMILIAS_COLHEITA = ['BO', 'CO', 'GN', 'PO', 'SB', 'PI']
+ESPACAMENTOS = ['3,00 x 3,00', '3,00 x 2,00', '3,30 x 2,50', '2,80 x 2,80', 'Indefinido']
+MATERIAIS = [f'CNB{k:03d}' for k in range(1, 30)] + ['SEM0001', 'E-GRAND']
+
+# Projects per 900 talhões, as in the sample inventory
+TALHOES_POR_PROJETO = 900
+
+PARAMETROS = {'GanhoGenetico': 10.0, 'PerdaGenetica': 95.0, 'R2': 90.0, 'TalhadiaRA': 5.0, 'TalhadiaRB': 4.0,
+              'RA3': 1100.0, 'RB3': 1000.0, 'RA2': 1200.0, 'RB2': 1050.0, 'AcrescimoColheitaTalhadia': 10.0,
+              'Juros': 8.0, 'AvaliacaoEco': 95.0, 'MecColheita': 97.0}
+
+
+def talhoes(n):
+    """
+    Return n distinct talhão codes: one remanescente every 23 talhões and an 'R' suffix every 17.
+    """
+    codes = []
+    for i in range(n):
+        regiao = REGIOES[i % len(REGIOES)]
+        projeto = f"{UNIDADES[regiao]}{regiao}{SUBREGIOES[(i * 7) % len(SUBREGIOES)]}{i // TALHOES_POR_PROJETO:05d}"
+        rotacao = f"{'R' if i % 3 == 0 else 'P'}{10 + i % 8:02d}"
+        if i % 23 == 0:
+            rotacao = rotacao[:1] + '7' + rotacao[2:]
+        code = f"{projeto}{rotacao}-{i % TALHOES_POR_PROJETO + 1:03d}"
+        codes.append(code + 'R' if i % 17 == 0 else code)
+    return codes
+
+
+def inventario(rng, codes, datas, fracao):
+    """
+    An inventory sheet (IFC/IFPC) measuring a fraction of the talhões.
+    """
+    sel = rng.random(len(codes)) < fracao
+    k = int(sel.sum())
+    return pd.DataFrame({
+        'Talhao': np.asarray(codes)[sel],
+        'DT_Medicao': datas[sel],
+        'Fustes': np.clip(rng.normal(1020, 260, k), 30, None),
+        'VTCC': rng.gamma(6.0, 53.0, k),
+        'Area': np.clip(rng.gamma(2.0, 12.3, k), 0.02, None).round(2),
+    })
+
+
+def tabelas(n, seed=1):
+    """
+    Build the tables of a base with n talhões.
+
+    :param n: The number of talhões (rows of CadastroFlorestal and Orcamento).
+    :param seed: The seed of the random values; the same (n, seed) gives the same base.
+    :return: A dict {table name: DataFrame} in import order.
+    """
+    rng = np.random.default_rng(seed)
+    codes = talhoes(n)
+    medicao = pd.to_datetime('2023-01-01') + pd.to_timedelta(rng.integers(0, 500, n), unit='D')
+    plantio = medicao - pd.to_timedelta((rng.uniform(2, 18, n) * 365).astype(int), unit='D')
+
+    sheets = {
+        'IFC': inventario(rng, codes, medicao, 0.6),
+        'IFPC': inventario(rng, codes, medicao, 0.5),
+        'Orcamento': pd.DataFrame({'TalhaoAtual': codes, 'TalhaoReferencia': [None] * n}),
+        'CadastroFlorestal': pd.DataFrame({
+            'Talhao': codes,
+            'DCR_Projeto': ['FAZ ' + code[6:11] for code in codes],
+            'DT_Plantio': plantio,
+            'ESP': rng.choice(ESPACAMENTOS, n, p=[0.4, 0.2, 0.2, 0.15, 0.05]),
+            'DCR_MatGen': rng.choice(MATERIAIS, n),
+            'Area': np.clip(rng.gamma(2.0, 12.3, n), 0.02, None).round(2),
+            'DIST_LP': rng.uniform(0, 30, n).round(1),
+            'DIST_PFRod': rng.uniform(10, 200, n).round(1),
+            'DIST_PFFer': rng.uniform(0, 100, n).round(1),
+            'DIST_LFRod': np.where(rng.random(n) < 0.4, 0.0, rng.uniform(10, 230, n).round(1)),
+            'DIST_Total': rng.uniform(10, 250, n).round(1),
+        }),
+    }
+
+    # Relative productivity (100 at age 7), a Chapman-Richards curve levelling off around 125
+    idades = np.arange(2, 41, 0.5)
+    curva = pd.DataFrame({'Idade': idades})
+    for regiao in REGIOES_EXTENSO:
+        k = rng.uniform(0.37, 0.43)
+        forma = (1 - np.exp(-k * idades)) ** 3.5
+        curva[regiao] = 100 * forma / (1 - np.exp(-k * 7)) ** 3.5
+    sheets['CurvaProdutividade'] = curva
+
+    # Whether the material sprouts in each kind of region, about one SIM in four as in the sample sheet
+    sheets['RTMaterialGenetico'] = pd.DataFrame({
+        'DCR_MatGen': MATERIAIS,
+        'RegAlta': rng.choice(['SIM', 'NÃO'], len(MATERIAIS), p=[0.25, 0.75]),
+        'RegBaixaEncosta': rng.choice(['SIM', 'NÃO'], len(MATERIAIS), p=[0.25, 0.75]),
+        'RegBaixaBaixada': rng.choice(['SIM', 'NÃO'], len(MATERIAIS), p=[0.2, 0.8]),
+    })
+
+    inclinacao = pd.DataFrame({'Regiao': REGIOES + ['CNB'], 'Area': rng.uniform(2000, 22000, len(REGIOES) + 1)})
+    classes = rng.dirichlet([17, 3, 0.2], len(inclinacao))
+    for i, classe in enumerate(['0_28', '29_38', '38_MAIS']):
+        inclinacao[f'HA{classe}'] = inclinacao['Area'] * classes[:, i]
+    for i, classe in enumerate(['0_28', '29_38', '38_MAIS']):
+        inclinacao[f'PCT{classe}'] = classes[:, i]
+    sheets['ClassesInclinacao'] = inclinacao
+
+    # Planting in year 0, then maintenance, the second rotation from year 7
+    silvicultura = pd.DataFrame({'Fase': ['Reforma'] + [f'Manutencao{k}' for k in range(1, 14)], 'ANO': np.arange(14)})
+    for regiao in ['BO', 'IP', 'PO', 'CO', 'PI', 'SB', 'SA', 'VI']:
+        silvicultura[regiao] = np.r_[rng.uniform(10000, 13000), rng.uniform(500, 4500, 6),
+                                     rng.uniform(2000, 4000), rng.uniform(300, 3000, 6)].round(2)
+    sheets['CustosSilvicultura_REF_REG'] = silvicultura
+
+    # Cost per m³ growing slower than the distance: ~17 at 5 km, ~60 at 100 km, ~120 at 480 km
+    distancia = np.arange(5, 485, 5)
+    transporte = pd.DataFrame({'Distancia': distancia})
+    for regiao in REGIOES_EXTENSO:
+        transporte[regiao] = rng.uniform(0.9, 1.2) * (14.5 + 0.49 * distancia - 0.00057 * distancia ** 2)
+    sheets['CustosTransRod'] = transporte
+
+    sheets['OutrosCustos'] = pd.DataFrame({
+        'Regiao': REGIOES,
+        'ApoioColheita': rng.uniform(600, 900, len(REGIOES)),
+        'EstInterna': rng.uniform(1500, 4000, len(REGIOES)),
+        'EstExterna': rng.uniform(1000, 2100, len(REGIOES)),
+        'MovPatio': 0.0,
+        'ADM': rng.uniform(3000, 3800, len(REGIOES)),
+        'Taxas': rng.uniform(500, 700, len(REGIOES)),
+    })
+
+    # Harvest cost per m³ falling with the tree volume (PD: harvester, GW: semi-mechanized)
+    prod = np.arange(100, 610, 10)
+    for familia in FAMILIAS_COLHEITA:
+        fator = rng.uniform(0.8, 1.3)
+        sheets[f'CustosColheita{familia}'] = pd.DataFrame({
+            'PROD': prod,
+            'VMI': prod * rng.uniform(0.00088, 0.00104),
+            'PD': fator * (36 + 5676 / prod),
+            'GW': fator * (70 + 9072 / prod),
+        })
+
+    sheets['ProdMin'] = pd.DataFrame({'Regiao': SUBREGIOES, 'ProdMin': rng.uniform(150, 250, len(SUBREGIOES)).round(1)})
+    sheets['Elevacao'] = pd.DataFrame({'Regiao': REGIOES,
+                                       'Elev': ['Região Alta' if regiao in ('SA', 'VI', 'CO', 'PI', 'SB') else 'Região Baixa'
+                                                for regiao in REGIOES]})
+    sheets['CustoFerr'] = pd.DataFrame({'Regiao': ['SB', 'PI'], 'Custo': rng.uniform(9, 13, 2)})
+    sheets['CustoMovPatio'] = pd.DataFrame({'Regiao': ['SB', 'PI'], 'Custo': rng.uniform(1, 3, 2)})
+    sheets['CustoEstExterna'] = pd.DataFrame({'Regiao': REGIOES, 'Custo': rng.uniform(2, 6, len(REGIOES))})
+    sheets['CustoTerra'] = pd.DataFrame({'Regiao': REGIOES, 'Custo': rng.uniform(100, 900, len(REGIOES))})
+    sheets['IndiceBrotacao'] = pd.DataFrame({'Idade': [str(k) for k in range(7, 15)],
+                                             'Perda': [100, 98, 95, 90, 85, 80, 70, 60]})
+    return sheets
+
+
+def remover(path):
+    """
+    Close the pooled connections to a database and delete its files, so the path can be reused.
+    """
+    pool = ConnectionPool.for_path(path)
+    pool.close()
+    pool.schema.invalidate()
+    for arquivo in (path, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+
+def gerar(path, n, seed=1):
+    """
+    Create a synthetic base.
+
+    :param path: The SQLite file to create (replaced if it exists).
+    :param n: The number of talhões.
+    :param seed: The seed of the random values.
+    :return: A dict {table name: row count}.
+    """
+    remover(path)
+    pool = ConnectionPool.for_path(path)
+    sheets = tabelas(n, seed)
+    with pool.writer() as conn:
+        for table_name, df in sheets.items():
+            importar_planilha(conn, pool.schema, df, table_name)
+        conn.execute(f"""
+            CREATE TABLE Parametros (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {', '.join(f'{column} TEXT' for column in PARAMETROS)}
+            )
+        """)
+        conn.execute(f"INSERT INTO Parametros ({', '.join(PARAMETROS)}) VALUES ({', '.join('?' * len(PARAMETROS))})",
+                     list(PARAMETROS.values()))
+    return {table_name: len(df) for table_name, df in sheets.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create a synthetic APEX base.")
+    parser.add_argument('base', help="The SQLite file to create (replaced if it exists).")
+    parser.add_argument('talhoes', type=int, help="The number of talhões.")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    for table_name, rows in gerar(args.base, args.talhoes, args.seed).items():
+        print(f"{table_name}: {rows}")
@@ -0,0 +1,130 @@
+import re
+
+import numpy as np
+
+from Database.Query import check_identifiers
+
+NUMERIC_LITERAL = re.compile(r'^\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?\s*$')
+
+
+def numeric_affinity(value):
+    """
+    Convert a TEXT operand the way SQLite does before comparing it with a NUMERIC column.
+
+    :param value: The value read from a TEXT column.
+    :return: The number, if the text is a well-formed numeric literal, or the value unchanged.
+    """
+    if isinstance(value, str) and NUMERIC_LITERAL.match(value):
+        return float(value)
+    return value
+
+
+def numeric_type(declared):
+    """
+    Check whether a declared column type gives the column INTEGER, REAL or NUMERIC affinity.
+    """
+    declared = (declared or '').upper()
+    textual = declared == '' or any(name in declared for name in ('CHAR', 'CLOB', 'TEXT', 'BLOB'))
+    return 'INT' in declared or not textual
+
+
+class AsOfIndex:
+    """
+    Sorted keys of a step-function table, for "largest key <= value" lookups.
+
+    Tables such as 'CustosColheita??' (PROD -> POND) and 'IndiceBrotacao' (Idade -> Perda) are read
+    with ``WHERE key <= value ORDER BY key DESC LIMIT 1``. The index keeps the numeric keys sorted
+    once, with the value of the last row of each key (the row the descending index scan returns),
+    so every probe of a batch is resolved by one ``searchsorted`` pass. ``create_table`` writes the
+    same keys to a TEMP table indexed on (Grupo, Chave), so the SQL steps can resolve several
+    lookup tables with one UPDATE.
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: (key, value) pairs in the rowid order of the table. Keys that are not numbers
+                     never compare as <= a number and are left out.
+        """
+        ordered = sorted((key, rowid, value) for rowid, (key, value) in enumerate(rows)
+                         if isinstance(key, (int, float)))
+        keys, values = [], []
+        for key, _, value in ordered:
+            if keys and keys[-1] == key:
+                values[-1] = value
+            else:
+                keys.append(key)
+                values.append(value)
+        self.keys = np.array(keys, dtype=np.float64)
+        self.values = values
+
+    @classmethod
+    def from_table(cls, conn, table, key_column, value_column, schema=None):
+        """
+        Build the index of a lookup table.
+
+        :param conn: The connection to read through.
+        :param table: The lookup table.
+        :param key_column: The key column (compared with a number).
+        :param value_column: The column returned by the lookup.
+        :param schema: The SchemaCatalog of the database, used to read the key's declared type.
+        :return: An AsOfIndex.
+        """
+        check_identifiers(table, key_column, value_column)
+        info = schema.table_info(conn, table) if schema is not None else \
+            conn.execute(f"PRAGMA table_info({table})").fetchall()
+        declared = next((row[2] for row in info if row[1].lower() == key_column.lower()), '')
+        rows = conn.execute(f"SELECT {key_column}, {value_column} FROM {table} ORDER BY rowid").fetchall()
+        if not numeric_type(declared):
+            # A TEXT key gets NUMERIC affinity when compared with a number
+            rows = [(numeric_affinity(key), value) for key, value in rows]
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, probes):
+        """
+        Return, for each probe, the position of the largest key <= probe, or -1 when there is none
+        (NaN probes included).
+        """
+        probes = np.asarray(probes, dtype=np.float64)
+        position = np.searchsorted(self.keys, probes, side='right') - 1
+        position[np.isnan(probes)] = -1
+        return position
+
+    def lookup(self, probes):
+        """
+        Resolve every probe at once.
+
+        :param probes: An array of numbers (NaN for NULL).
+        :return: A float array with the value of the largest key <= each probe, NaN when there is none.
+        """
+        values = np.array([np.nan if value is None else float(value) for value in self.values], dtype=np.float64)
+        position = self.positions(probes)
+        result = np.full(len(position), np.nan)
+        found = position >= 0
+        result[found] = values[position[found]]
+        return result
+
+    @staticmethod
+    def create_table(conn, name, indexes):
+        """
+        Write several indexes to one TEMP table (Grupo, Chave, Valor), indexed on (Grupo, Chave).
+
+        A step then reads the value of each row with
+        ``SELECT Valor FROM temp.<name> WHERE Grupo = ? AND Chave <= value ORDER BY Chave DESC LIMIT 1``,
+        every group at once. Values keep their storage class.
+
+        :param conn: The connection whose TEMP schema receives the table.
+        :param name: The table name.
+        :param indexes: A dict {group: AsOfIndex}.
+        """
+        check_identifiers(name)
+        conn.execute(f"DROP TABLE IF EXISTS temp.{name}")
+        conn.execute(f"CREATE TEMP TABLE {name} (Grupo TEXT, Chave REAL, Valor)")
+        conn.executemany(
+            f"INSERT INTO temp.{name} (Grupo, Chave, Valor) VALUES (?, ?, ?)",
+            [(group, float(key), value) for group, index in indexes.items()
+             for key, value in zip(index.keys.tolist(), index.values)]
+        )
+        conn.execute(f"CREATE INDEX temp.{name}_Grupo_Chave ON {name} (Grupo, Chave)")
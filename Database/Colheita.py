@@ -0,0 +1,108 @@
+import numpy as np
+
+from Database.Query import check_identifiers
+
+
+class PonderacaoColheita:
+    """
+    Weighted harvest costs (POND) of the 'CustosColheita??' tables, computed for every front at once.
+
+    Each table holds the cost of the 'PD' and 'GW' harvest systems per productivity class; POND is
+    their mean weighted by the share of each slope class of the front in 'ClassesInclinacaoResumo'.
+    The PD and GW columns of all fronts are read into one NaN-padded matrix, weighted with a single
+    NumPy expression and written back with one bulk UPDATE per table. Rows are matched by position:
+    the n-th row of a table (in rowid order) gets the POND of 'id' = n, as it always did.
+    """
+
+    # Front in 'ClassesInclinacaoResumo' -> cost table
+    FRENTES = {
+        'BO': 'CustosColheitaBO',
+        'CO': 'CustosColheitaCO',
+        'GN': 'CustosColheitaGN',
+        'PO': 'CustosColheitaPO',
+        'SB': 'CustosColheitaSB',
+        'PI': 'CustosColheitaPI',
+    }
+
+    CNB = 'CustosColheitaCNB'
+
+    def __init__(self, manejo):
+        """
+        :param manejo: The Manejo instance (connections, schema and run context).
+        """
+        self.db = manejo
+
+    @staticmethod
+    def _matrix(conn, tables, column):
+        """
+        Read one column of several tables into a float matrix, one row per table, NaN for NULL and padding.
+        """
+        values = []
+        for table in tables:
+            check_identifiers(table, column)
+            values.append([row[0] for row in conn.execute(f"SELECT {column} FROM {table} ORDER BY rowid")])
+        matrix = np.full((len(values), max((len(v) for v in values), default=0)), np.nan)
+        for i, v in enumerate(values):
+            matrix[i, :len(v)] = np.array([np.nan if x is None else x for x in v], dtype=np.float64)
+        return matrix, [len(v) for v in values]
+
+    def pesos(self, frentes):
+        """
+        Return the PD and GW_CE weights of the fronts, 0 for a front without them.
+        """
+        context = self.db.run_context()
+        pesos = []
+        for column in ('PD', 'GW_CE'):
+            lookup = context.lookup('ClassesInclinacaoResumo', column)
+            pesos.append(np.array([lookup.get(frente) if lookup.get(frente) is not None else 0 for frente in frentes],
+                                  dtype=np.float64))
+        return pesos
+
+    def ponderar(self, frentes=None):
+        """
+        Compute and write the POND column of the cost table of each front.
+
+        :param frentes: A dict {front: table} (default: FRENTES).
+        """
+        frentes = self.FRENTES if frentes is None else frentes
+        tables = list(frentes.values())
+        peso_pd, peso_gw = self.pesos(list(frentes))
+
+        with self.db.connect() as conn:
+            pd, sizes = self._matrix(conn, tables, 'PD')
+            gw, _ = self._matrix(conn, tables, 'GW')
+            # A NULL cost counts as 0, whatever the weight
+            pond = (np.where(np.isnan(pd), 0.0, pd * peso_pd[:, None])
+                    + np.where(np.isnan(gw), 0.0, gw * peso_gw[:, None]))
+
+            for i, table in enumerate(tables):
+                if not self.db.schema.has_column(conn, table, 'POND'):
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN POND FLOAT")
+                conn.executemany(f"UPDATE {table} SET POND = ? WHERE id = ?",
+                                 zip(pond[i, :sizes[i]].tolist(), range(1, sizes[i] + 1)))
+
+    def cnb(self):
+        """
+        Build 'CustosColheitaCNB' as the area-weighted mean of the PROD, VMI, PD and GW of the other
+        fronts (over the rows that all of them have), then compute its POND with the 'CNB' weights.
+        The table is rebuilt on every call.
+        """
+        tables = list(self.FRENTES.values())
+        areas = self.db.run_context().lookup('ClassesInclinacaoResumo', 'AREA')
+        area = np.array([areas.get(frente) for frente in self.FRENTES], dtype=np.float64)
+        area_cnb = areas.get('CNB')
+
+        with self.db.connect() as conn:
+            columns = {}
+            for column in ('PROD', 'VMI', 'PD', 'GW'):
+                matrix, sizes = self._matrix(conn, tables, column)
+                columns[column] = (matrix[:, :min(sizes)] * area[:, None]).sum(axis=0) / area_cnb
+            # NaN (a NULL cost in any front) is written as NULL
+            values = zip(*([None if np.isnan(x) else x for x in columns[c].tolist()] for c in columns))
+
+            conn.execute(f"DROP TABLE IF EXISTS {self.CNB}")
+            conn.execute(f"CREATE TABLE {self.CNB} (id INTEGER PRIMARY KEY, PROD FLOAT, VMI FLOAT, PD FLOAT, GW FLOAT)")
+            conn.executemany(f"INSERT INTO {self.CNB} (id, PROD, VMI, PD, GW) VALUES (?, ?, ?, ?, ?)",
+                             ((i, *row) for i, row in enumerate(values, start=1)))
+
+        self.ponderar({'CNB': self.CNB})
@@ -1,15 +1,33 @@
 import sqlite3
 import pandas as pd
 import statistics
+from contextlib import contextmanager, nullcontext
+
+from Database.Indices import IndexManager
+from Database.Pool import ConnectionPool
+from Database.Talhoes import TalhaoDimension
+from Database.Telemetry import PipelineTelemetry
 
 
 class Consist:
     def __init__(self, db):
         self.db = db
         self.temp_table_counter = 0
+        # (table, component, column) -> values grouped by regime and component, see _regional_values
+        self._regional = {}
+        self._regional_version = None
 
     def connect(self):
-        return sqlite3.connect(self.db)
+        # Anything written through this instance may change the grouped values
+        self._regional.clear()
+        return ConnectionPool.for_path(self.db).writer()
+
+    def connect_readonly(self):
+        return ConnectionPool.for_path(self.db).reader()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
 
     def vacuum_database(self):
         """
@@ -49,15 +67,10 @@ class Consist:
         :return: A list of table names.
         """
         # Connect to the SQLite database
-        with self.connect() as conn:
+        with self.connect_readonly() as conn:
             try:
-                # Create a cursor object
-                cur = conn.cursor()
-                # Execute the query to list tables
-                cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-
-                # Fetch all results and extract table names
-                tables = [table[0] for table in cur.fetchall()]
+                # List tables from the schema catalog
+                tables = self.schema.tables(conn)
 
             except Exception as e:
                 # Handle exceptions if necessary
@@ -76,12 +89,11 @@ class Consist:
         :return: A dictionary with column names as keys and the corresponding row values as values.
         """
         try:
-            with self.connect() as conn:
+            with self.connect_readonly() as conn:
                 cursor = conn.cursor()
 
                 # Fetch column names
-                cursor.execute(f"PRAGMA table_info({table_name});")
-                columns = [column[1] for column in cursor.fetchall()]
+                columns = self.schema.columns(conn, table_name)
 
                 # Fetch the row based on the rowid
                 cursor.execute(f"SELECT * FROM {table_name} WHERE rowid = ?", (rowid,))
@@ -110,54 +122,78 @@ class Consist:
         with self.connect() as conn:
             cur = conn.cursor()
 
-            # Check if the column already exists in the table
-            cur.execute(f"PRAGMA table_info({table_name})")
-            existing_columns = [column[1] for column in cur.fetchall()]
-
-            # Add the column if it doesn't exist
-            if column_name not in existing_columns:
+            # Add the column if it doesn't exist (answered from the schema catalog)
+            if not self.schema.has_column(conn, table_name, column_name):
                 cur.execute(f"""
                     ALTER TABLE {table_name}
                     ADD COLUMN {column_name} {data_type}
                 """)
 
+    def _regional_values(self, table_name, regime, other, n, coluna):
+        """
+        Returns the non-null values of a column for the talhões of a regime whose code has 'other' at position n.
+
+        The two characters at positions 1, 3 and 5 are the unit, region and sub-region of the talhão.
+        For those, the first call reads the whole column once, grouped by regime and by the integer
+        code of the component in the Talhao dimension, and the summary panels, which ask for every
+        region of the same table, are answered from these groups. The groups are dropped when the
+        schema version changes (a table was created, altered or dropped) and when this instance
+        writes to the database. Talhões missing from the dimension are grouped by slicing the code.
+        """
+        component = TalhaoDimension.component(n, 2) if isinstance(n, int) else None
+        with self.connect_readonly() as conn:
+            if component is None or not self.schema.has_table(conn, TalhaoDimension.TABLE):
+                cur = conn.cursor()
+                cur.execute(
+                    f"""
+                    SELECT {coluna}
+                    FROM {table_name}
+                    WHERE ManejoAPEX_Final = ? AND SUBSTR(Talhao, {n}, 2) = ?
+                    """,
+                    (regime, other)
+                )
+                return [a[0] for a in cur.fetchall() if a[0] is not None]
+
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if version != self._regional_version:
+                self._regional = {}
+                self._regional_version = version
+            key = (table_name, component, coluna)
+            if key not in self._regional:
+                values = {code: value for value, code in TalhaoDimension(self.schema).codes(conn, component).items()}
+                cur = conn.cursor()
+                cur.execute(
+                    f"""
+                    SELECT t.ManejoAPEX_Final, d.{component},
+                           CASE WHEN d.Talhao IS NULL THEN SUBSTR(t.Talhao, {n}, 2) END, t.{coluna}
+                    FROM {table_name} AS t
+                    LEFT JOIN {TalhaoDimension.TABLE} AS d ON d.Talhao = t.Talhao
+                    """
+                )
+                groups = {}
+                for manejo, code, sliced, value in cur.fetchall():
+                    if value is not None:
+                        groups.setdefault((manejo, sliced if code is None else values[code]), []).append(value)
+                self._regional[key] = groups
+            return self._regional[key].get((regime, other), [])
+
     def regional_resumo(self, table_name, regime, other, n, coluna="Area"):
-        with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                f"""
-                SELECT {coluna}
-                FROM {table_name}
-                WHERE ManejoAPEX_Final = '{regime}' AND SUBSTR(Talhao, {n}, 2) = '{other}'
-                """
-            )
-            r = cur.fetchall()
-            r = [a[0] for a in r if a[0] is not None]
-            sum_r = round(sum(r))
-            return sum_r
+        r = self._regional_values(table_name, regime, other, n, coluna)
+        sum_r = round(sum(r))
+        return sum_r
 
     def regional_resumo_av(self, table_name, regime, other, n, coluna="Area", soma='True'):
-        with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                f"""
-                SELECT {coluna}
-                FROM {table_name}
-                WHERE ManejoAPEX_Final = '{regime}' AND SUBSTR(Talhao, {n}, 2) = '{other}'
-                """
-            )
-            r = cur.fetchall()
-            r = [a[0] for a in r if a[0] is not None]
-            if soma == 'True':
-                sum_r = round(sum(r))
-                return sum_r
-            else:
-                try:
-                    mean_r = round(sum(r)/len(r))
-                except Exception:
-                    mean_r = 0
-                print(mean_r)
-                return mean_r
+        r = self._regional_values(table_name, regime, other, n, coluna)
+        if soma == 'True':
+            sum_r = round(sum(r))
+            return sum_r
+        else:
+            try:
+                mean_r = round(sum(r)/len(r))
+            except Exception:
+                mean_r = 0
+            print(mean_r)
+            return mean_r
 
     def fetch_all_data(self, table_name):
         """
@@ -166,7 +202,7 @@ class Consist:
         :param table_name: The name of the table to fetch data from.
         :return: A DataFrame containing all rows from the table.
         """
-        with self.connect() as conn:
+        with self.connect_readonly() as conn:
             cur = conn.cursor()
             query = f"SELECT * FROM {table_name}"
             cur.execute(query)
@@ -376,7 +412,8 @@ class Consist:
             # Step 2: Insert initial data from 'apex_base_0'
             self._insert_initial_data(cur)
 
-            # Step 3: Update 'apex_base_1' with data from 'apex_tmp_6'
+            # Step 3: Update 'apex_base_1' with data from 'apex_tmp_6' (looked up through its Talhao index)
+            IndexManager(self.schema).provision(conn, ['apex_temp_6'])
             self._update_with_apex_tmp_6(cur)
 
             # Step 4: Calculate and update 'idade' and 'idade_classe'
@@ -492,7 +529,7 @@ class Consist:
 
         :return: A tuple containing the rows and their corresponding headers.
         """
-        with self.connect() as conn:
+        with self.connect_readonly() as conn:
             cur = conn.cursor()
 
             # Step 1: Execute the query to select rows needing adjustment
@@ -529,7 +566,7 @@ class Consist:
 
         results = []
 
-        with self.connect() as conn:
+        with self.connect_readonly() as conn:
             cur = conn.cursor()
 
             for label, condition in conditions.items():
@@ -672,69 +709,127 @@ class Consist:
         for row in sorted(selected_rows, reverse=True):
             table_widget.removeRow(row.row())
 
-    def pipeline(self):
-        self.update_table(
-            'IFPC',
-            {'Projeto': ('SUBSTR(talhao, 1, 11)', 'TEXT'),
-             'SubRegiao': ('SUBSTR(Talhao, 5, 2)', 'TEXT'),
-             'Regiao': ('SUBSTR(Talhao, 3, 2)', 'TEXT')
-             }
-        )
-        self.update_table('IFC',
-                          {'Projeto': ('SUBSTR(talhao, 1, 11)', 'TEXT'),
-                           'SubRegiao': ('SUBSTR(Talhao, 5, 2)', 'TEXT'),
-                           'Regiao': ('SUBSTR(Talhao, 3, 2)', 'TEXT'),
-                           'Lote': ('SUBSTR(Talhao, 1, 14)', 'TEXT'),
-                           'Rotacao': ("CASE WHEN SUBSTR(Talhao, 12, 1) = 'R' THEN '1' ELSE '2' END;", 'INTEGER'),
-                           'ChaveSubRot': ('SubRegiao||Rotacao', 'TEXT'),
-                           'FustesPond': ('Fustes*Area', 'INTEGER'),
-                           'VTCCPond': ('VTCC*Area', 'FLOAT'),
-                           }
-                          )
-        self.update_table('Orcamento',
-                          {'Projeto': ('SUBSTR(TalhaoAtual, 1, 11)', 'TEXT'),
-                           'SubRegiao': ('SUBSTR(TalhaoAtual, 5, 2)', 'TEXT'),
-                           'Regiao': ('SUBSTR(TalhaoAtual, 3, 2)', 'TEXT'),
-                           'LoteAtual': ('SUBSTR(TalhaoAtual, 1, 14)', 'TEXT'),
-                           'LoteAntigo': ('SUBSTR(TalhaoReferencia, 1, 14)', 'TEXT'),
-                           'Rotacao': ("CASE WHEN SUBSTR(TalhaoAtual, 12, 1) = 'R' THEN '1' ELSE '2' END;", 'INTEGER'),
-                           'ChaveSubRot': ('SubRegiao||Rotacao', 'TEXT')
-                           }
-                          )
-        self.update_table('ClassesInclinacao',
-                          {'Pond0_28': ('Area*PCT0_28', 'FLOAT'),
-                           'Pond29_Mais': ('Area*(PCT29_38+PCT38_MAIS)', 'FLOAT')
-                           }
-                          )
+    def update_talhao_components(self, table_name: str, col_talhao: dict):
+        """
+        Fills columns of a table with components of its talhão codes, read from the Talhao dimension.
+
+        :param table_name: Name of the table to update.
+        :param col_talhao: Dictionary where the key is the column name and the value is a tuple of
+                           (talhão column, component, data type); see TalhaoDimension.COMPONENTS.
+        """
+        # Ensure all required columns exist
+        for column_name, (talhao_column, component, data_type) in col_talhao.items():
+            self.add_column(table_name, column_name, data_type)
+
+        by_talhao = {}
+        for column_name, (talhao_column, component, data_type) in col_talhao.items():
+            by_talhao.setdefault(talhao_column, {})[column_name] = component
+
+        dimension = TalhaoDimension(self.schema)
+        with self.connect() as conn:
+            dimension.extend(conn, {table_name: list(by_talhao)})
+            for talhao_column, columns in by_talhao.items():
+                dimension.attach(conn, table_name, talhao_column, columns)
+
+    def pipeline(self, telemetria=None, auditoria=None):
+        """
+        Run the consistency steps, measuring each of them (see PipelineTelemetry).
+
+        :param telemetria: The PipelineTelemetry to record into (default: a new one, saved as 'Consist').
+        :param auditoria: A QueryPlanAuditor that explains the statements of each step.
+        :return: The result of ajuste_base.
+        """
+        telemetria = PipelineTelemetry(self.db, 'Consist') if telemetria is None else telemetria
+
+        @contextmanager
+        def etapa(name):
+            with telemetria.etapa(name), auditoria.etapa(name) if auditoria is not None else nullcontext():
+                yield
+
+        try:
+            return self._pipeline(etapa)
+        finally:
+            telemetria.save()
+
+    def _pipeline(self, etapa):
+        # Talhão codes are parsed once into the Talhao dimension, and their components copied from there
+        with etapa('dim_talhao'), self.connect() as conn:
+            TalhaoDimension(self.schema).extend(conn)
+        with etapa('componentes_ifpc'):
+            self.update_talhao_components(
+                'IFPC',
+                {'Projeto': ('Talhao', 'Projeto', 'TEXT'),
+                 'SubRegiao': ('Talhao', 'SubRegiao', 'TEXT'),
+                 'Regiao': ('Talhao', 'Regiao', 'TEXT')
+                 }
+            )
+        with etapa('componentes_ifc'):
+            self.update_talhao_components('IFC',
+                                          {'Projeto': ('Talhao', 'Projeto', 'TEXT'),
+                                           'SubRegiao': ('Talhao', 'SubRegiao', 'TEXT'),
+                                           'Regiao': ('Talhao', 'Regiao', 'TEXT'),
+                                           'Lote': ('Talhao', 'Lote', 'TEXT'),
+                                           'Rotacao': ('Talhao', 'Rotacao', 'INTEGER'),
+                                           }
+                                          )
+            self.update_table('IFC',
+                              {'ChaveSubRot': ('SubRegiao||Rotacao', 'TEXT'),
+                               'FustesPond': ('Fustes*Area', 'INTEGER'),
+                               'VTCCPond': ('VTCC*Area', 'FLOAT'),
+                               }
+                              )
+        with etapa('componentes_orcamento'):
+            self.update_talhao_components('Orcamento',
+                                          {'Projeto': ('TalhaoAtual', 'Projeto', 'TEXT'),
+                                           'SubRegiao': ('TalhaoAtual', 'SubRegiao', 'TEXT'),
+                                           'Regiao': ('TalhaoAtual', 'Regiao', 'TEXT'),
+                                           'LoteAtual': ('TalhaoAtual', 'Lote', 'TEXT'),
+                                           'LoteAntigo': ('TalhaoReferencia', 'Lote', 'TEXT'),
+                                           'Rotacao': ('TalhaoAtual', 'Rotacao', 'INTEGER'),
+                                           }
+                                          )
+            self.update_table('Orcamento',
+                              {'ChaveSubRot': ('SubRegiao||Rotacao', 'TEXT')
+                               }
+                              )
+        with etapa('classes_inclinacao'):
+            self.update_table('ClassesInclinacao',
+                              {'Pond0_28': ('Area*PCT0_28', 'FLOAT'),
+                               'Pond29_Mais': ('Area*(PCT29_38+PCT38_MAIS)', 'FLOAT')
+                               }
+                              )
         # Aggregating by 'lote'
-        self.aggregate_data(
-            group_by_column='Lote',
-            table_suffix='Lote',
-            output_columns={
-                'FustesPond': 'AGGL_Fustes',
-                'VTCCPond': 'AGGL_VTCC'
-            }
-        )
+        with etapa('agregado_lote'):
+            self.aggregate_data(
+                group_by_column='Lote',
+                table_suffix='Lote',
+                output_columns={
+                    'FustesPond': 'AGGL_Fustes',
+                    'VTCCPond': 'AGGL_VTCC'
+                }
+            )
 
         # Aggregating by 'projeto'
-        self.aggregate_data(
-            group_by_column='Projeto',
-            table_suffix='Projeto',
-            output_columns={
-                'FustesPond': 'AGGP_Fustes',
-                'VTCCPond': 'AGGP_VTCC'
-            }
-        )
+        with etapa('agregado_projeto'):
+            self.aggregate_data(
+                group_by_column='Projeto',
+                table_suffix='Projeto',
+                output_columns={
+                    'FustesPond': 'AGGP_Fustes',
+                    'VTCCPond': 'AGGP_VTCC'
+                }
+            )
 
         # Aggregating by 'chave_sub_reg'
-        self.aggregate_data(
-            group_by_column='ChaveSubRot',
-            table_suffix='SubRegiao',
-            output_columns={
-                'FustesPond': 'AGGSR_Fustes',
-                'VTCCPond': 'AGGSR_VTCC'
-            }
-        )
+        with etapa('agregado_subregiao'):
+            self.aggregate_data(
+                group_by_column='ChaveSubRot',
+                table_suffix='SubRegiao',
+                output_columns={
+                    'FustesPond': 'AGGSR_Fustes',
+                    'VTCCPond': 'AGGSR_VTCC'
+                }
+            )
 
         # Define the parameters for each temp table creation in a list of dictionaries
         temp_table_configs = [
@@ -793,14 +888,18 @@ class Consist:
         ]
         # Iterate over the configurations and create the temporary tables
         for config in temp_table_configs:
-            self.create_temp_table(
-                base_table=config['base_table'],
-                join_table=config['join_table'],
-                columns=config['columns'],
-                join_column=config['join_column'],
-                old_join_column=config['old_join_column'],
-                ref_column=config['ref_column']
-            )
-        self.create_and_populate_final_table()
-        self.create_final_table_2()
-        return self.ajuste_base()
+            with etapa(f"temp_{config['join_table'].lower()}"):
+                self.create_temp_table(
+                    base_table=config['base_table'],
+                    join_table=config['join_table'],
+                    columns=config['columns'],
+                    join_column=config['join_column'],
+                    old_join_column=config['old_join_column'],
+                    ref_column=config['ref_column']
+                )
+        with etapa('tabela_final'):
+            self.create_and_populate_final_table()
+        with etapa('tabela_final_2'):
+            self.create_final_table_2()
+        with etapa('ajuste_base'):
+            return self.ajuste_base()
@@ -0,0 +1,124 @@
+import sqlite3
+
+from Database.Pool import ConnectionPool
+
+
+class PipelineContext:
+    """
+    Run-scoped snapshot of 'Parametros' and of the small lookup tables read by the Manejo steps.
+
+    It is built once at the start of a run, so each step reads parameters and regional lookups from
+    memory instead of issuing its own queries. Lookups keep the first row of each key, which is what
+    the correlated subqueries they replace returned. A run may also replace some values of the
+    'Parametros' row (a sweep scenario) without writing them to the table.
+    """
+
+    LOOKUPS = {
+        'ProdMin': ('Regiao', ['ProdMin']),
+        'Elevacao': ('Regiao', ['Elev']),
+        'CustoTerra': ('Regiao', ['Custo']),
+        'CustoFerr': ('Regiao', ['Custo']),
+        'CustoMovPatio': ('Regiao', ['Custo']),
+        'CustoEstExterna': ('Regiao', ['Custo']),
+        'IndiceBrotacao': ('Idade', ['Perda']),
+        'ClassesInclinacaoResumo': ('FRENTE', ['AREA', 'PD', 'GW_CE', 'TOTAL']),
+    }
+
+    def __init__(self, db, parametros=None):
+        """
+        :param db: Path to the SQLite database file.
+        :param parametros: A dict {Parametros column: value} that replaces values of the last row for this run.
+        """
+        self.db = db
+        self._rows = {}
+        self._errors = {}
+        self.anos = {}  # Year columns of the cost tables, filled by Manejo.Anos
+        with ConnectionPool.for_path(db).writer() as conn:
+            cur = conn.execute("SELECT * FROM Parametros ORDER BY rowid DESC LIMIT 1")
+            self.colunas = [column[0] for column in cur.description]
+            self.parametros = cur.fetchone()
+            for table in self.LOOKUPS:
+                self._load(conn, table)
+        if parametros and self.parametros is not None:
+            self.parametros = tuple(parametros.get(column, value) for column, value in zip(self.colunas, self.parametros))
+
+    def _load(self, conn, table):
+        key, columns = self.LOOKUPS[table]
+        try:
+            rows = conn.execute(f"SELECT {key}, {', '.join(columns)} FROM {table} ORDER BY rowid").fetchall()
+        except sqlite3.OperationalError as e:
+            # Keep the error so a step that needs the table fails the same way it did with a direct query
+            self._rows.pop(table, None)
+            self._errors[table] = e
+            return
+        self._errors.pop(table, None)
+        self._rows[table] = rows
+
+    def reload(self, table):
+        """
+        Re-read a lookup table that was rebuilt during the run (e.g. 'ClassesInclinacaoResumo').
+
+        :param table: The lookup table name.
+        """
+        with ConnectionPool.for_path(self.db).writer() as conn:
+            self._load(conn, table)
+
+    def parametro(self, index):
+        """
+        Return a numeric value from the last 'Parametros' row.
+
+        :param index: Position of the column in the 'Parametros' table.
+        :return: The value as a float.
+        """
+        return float(self.parametros[index])
+
+    def rows(self, table):
+        """
+        Return every (key, values...) row of a lookup table, in rowid order.
+
+        :param table: The lookup table name.
+        :return: A list of tuples.
+        """
+        if table in self._errors:
+            raise self._errors[table]
+        return self._rows[table]
+
+    def lookup(self, table, column=None):
+        """
+        Return a lookup table as a dict keyed on its key column.
+
+        :param table: The lookup table name.
+        :param column: The value column to return (defaults to the first one).
+        :return: A dict {key: value}, keeping the first row of duplicated keys.
+        """
+        key, columns = self.LOOKUPS[table]
+        position = 1 + (columns.index(column) if column else 0)
+        mapping = {}
+        for row in self.rows(table):
+            mapping.setdefault(row[0], row[position])
+        return mapping
+
+    @staticmethod
+    def case_map(expression, mapping, name=None):
+        """
+        Build a SQL CASE expression (with bound parameters) that maps the values of an expression.
+
+        :param expression: The SQL expression to map (e.g. 'Regiao').
+        :param mapping: A dict {value: result}. Values without a match become NULL.
+        :param name: Use named parameters ':<name>_k<i>'/':<name>_v<i>' instead of '?', for statements
+                     that bind their other values by name.
+        :return: A tuple (sql, params); params is a dict when name is given.
+        """
+        if not mapping:
+            return "NULL", {} if name else []
+        if name:
+            sql = f"CASE {expression} " + " ".join(f"WHEN :{name}_k{i} THEN :{name}_v{i}"
+                                                   for i in range(len(mapping))) + " END"
+            params = {}
+            for i, (key, value) in enumerate(mapping.items()):
+                params[f'{name}_k{i}'] = key
+                params[f'{name}_v{i}'] = value
+            return sql, params
+        sql = f"CASE {expression} " + " ".join("WHEN ? THEN ?" for _ in mapping) + " END"
+        params = [item for pair in mapping.items() for item in pair]
+        return sql, params
@@ -4,13 +4,24 @@ from PyQt5 import QtSql, QtWidgets
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QLabel
 
+from Database.Importacao import importar_planilha
+from Database.Journal import RunJournal
+from Database.Pool import ConnectionPool
+
 
 class Database:
     def __init__(self, db):
         self.db = db
 
     def connect(self):
-        return sqlite3.connect(self.db)
+        return ConnectionPool.for_path(self.db).writer()
+
+    def connect_readonly(self):
+        return ConnectionPool.for_path(self.db).reader()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
 
     def list_apexes(self):
         """
@@ -19,15 +30,10 @@ class Database:
         :return: A list of table names.
         """
         # Connect to the SQLite database
-        with self.connect() as conn:
+        with self.connect_readonly() as conn:
             try:
-                # Create a cursor object
-                cur = conn.cursor()
-                # Execute the query to list tables
-                cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-
-                # Fetch all results and extract table names
-                tables = [table[0] for table in cur.fetchall()]
+                # List tables from the schema catalog
+                tables = self.schema.tables(conn)
 
             except Exception as e:
                 # Handle exceptions if necessary
@@ -37,41 +43,28 @@ class Database:
         # The connection is automatically closed when leaving the 'with' block
         return tables
 
+    def list_manejo_tables(self):
+        """
+        Lists the output tables of the finished manejo runs ('Apex_Manejo_N').
+
+        The table of a run that was interrupted (or is still running) is left out until the run
+        finishes, see RunJournal.
+
+        :return: A list of table names.
+        """
+        return RunJournal(self.db).finished([x for x in self.list_apexes() if x.startswith('Apex_Manejo')])
+
     def create_table_from_dataframe(self, df, table_name, parent=None):
         """
-        Create a table in the database from a DataFrame, including a primary key column.
+        Create a table in the database from a DataFrame, including a primary key column (see importar_planilha).
 
         :param df: The DataFrame to be written to the table.
         :param table_name: The name of the table to be created.
         :param parent: The parent widget to attach the popup to.
         """
         try:
-            # Convert all string elements in the DataFrame to uppercase
-            df = df.apply(lambda col: col.map(lambda x: x.upper() if isinstance(x, str) else x))
-
-            # Add a primary key column
-            df.insert(0, 'id', range(1, len(df) + 1))
-
             with self.connect() as conn:
-                # Write the DataFrame to a temporary table without a primary key
-                temp_table = f"temp_{table_name}"
-                df.to_sql(temp_table, conn, if_exists='replace', index=False)
-
-                # Get the column names and types from the DataFrame
-                columns = ', '.join([f'"{col}"' for col in df.columns])
-
-                # Create the final table with a primary key
-                cursor = conn.cursor()
-                cursor.execute(f"""
-                    CREATE TABLE {table_name} (
-                        id INTEGER PRIMARY KEY,
-                        {', '.join([f'"{col}" {dtype}' for col, dtype in zip(df.columns[1:], df.dtypes)])}
-                    )
-                """)
-
-                # Insert data from the temporary table into the final table
-                cursor.execute(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {temp_table}")
-                cursor.execute(f"DROP TABLE {temp_table}")
+                importar_planilha(conn, self.schema, df, table_name)
                 conn.commit()
 
                 self.show_popup(f"Tabela '{table_name}' criada com sucesso com 'id' como chave primária.",'white', parent)
@@ -87,7 +80,7 @@ class Database:
         :return: DataFrame with the data.
         """
         try:
-            with self.connect() as conn:
+            with self.connect_readonly() as conn:
                 df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
                 df = df.apply(lambda col: col.map(lambda x: x.upper() if isinstance(x, str) else "{:,.2f}".format(x).replace(',', 'X').replace('.', ',').replace('X', '.') if isinstance(x, (int, float)) else x))
                 return df
@@ -101,11 +94,8 @@ class Database:
         :return: List of table names.
         """
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-                tables = cursor.fetchall()
-                return [table[0] for table in tables]
+            with self.connect_readonly() as conn:
+                return self.schema.tables(conn)
         except Exception as e:
             self.show_popup(f"Erro: {e}", 'red', parent)
             return []
@@ -203,19 +193,16 @@ class Database:
 
     def create_tabs_for_apex_manejo_tables(self, add_new_tab_method):
         """
-        Create tabs for all tables matching the 'Apex_Manejo%' pattern.
+        Create tabs for all tables matching the 'Apex_Manejo%' pattern, except those of interrupted runs.
 
         :param add_new_tab_method: The method to add new tabs, usually passed as self.add_new_tab.
         """
         try:
-            with self.connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'Apex_Manejo%';")
-                tables = cursor.fetchall()
+            with self.connect_readonly() as conn:
+                tables = [name for name in self.schema.tables(conn) if name.lower().startswith('apex_manejo')]
 
-                for table in tables:
-                    table_name = table[0]
-                    add_new_tab_method(table_name)
+            for table_name in RunJournal(self.db).finished(tables):
+                add_new_tab_method(table_name)
 
         except sqlite3.Error as e:
             print(f"An error occurred while querying the database: {e}")
@@ -225,26 +212,15 @@ class Database:
         Populates a QTreeWidget with tables and columns from the SQLite database.
         :param tree_widget: The QTreeWidget to populate.
         """
-        with self.connect() as conn:
-            cur = conn.cursor()
-
+        with self.connect_readonly() as conn:
             tree_widget.clear()  # Clear previous items
 
-            # Query to get the list of tables
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cur.fetchall()
-
-            for table in tables:
-                table_name = table[0]
+            # Tables and columns come from the schema catalog, so only a schema change costs a PRAGMA
+            for table_name in self.schema.tables(conn):
                 table_item = QtWidgets.QTreeWidgetItem(tree_widget, [table_name])
                 table_item.setExpanded(False)  # Ensure the table item is not expanded
 
-                # Query to get columns for the current table
-                cur.execute(f"PRAGMA table_info({table_name});")
-                columns = cur.fetchall()
-
-                for column in columns:
-                    column_name = column[1]
+                for column_name in self.schema.columns(conn, table_name):
                     QtWidgets.QTreeWidgetItem(table_item, [column_name])
 
     def execute_query_db(self, query_text):
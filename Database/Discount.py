@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class DiscountCache:
+    """
+    Memoized discount factors ``1 / (1 + juros) ** ano``, keyed on the interest rate and the year vector.
+
+    The vectors are computed once with NumPy and shared (read-only) by every step, run and parameter
+    sweep in the process, so the cost steps no longer rebuild them for each REF_REG/REF_REF call.
+    """
+
+    # Named horizons used by the cost steps: position 7 (cut at year 7) and the last year of the table
+    HORIZONS = {
+        'vpl7': 7,
+        'vpl14': -1,
+    }
+    MAX_ENTRIES = 64
+
+    def __init__(self):
+        self._factors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def factors(self, juros, anos):
+        """
+        Return the discount factor of each year.
+
+        :param juros: The interest rate as a fraction (e.g. 0.08).
+        :param anos: The sequence of years.
+        :return: A read-only float64 array, in the same order as ``anos``.
+        """
+        key = (float(juros), tuple(float(ano) for ano in anos))
+        with self._lock:
+            taxas = self._factors.get(key)
+            if taxas is not None:
+                self._factors.move_to_end(key)
+                return taxas
+
+        taxas = 1 / np.power(1 + key[0], np.array(key[1], dtype=np.float64))
+        taxas.flags.writeable = False
+        with self._lock:
+            self._factors[key] = taxas
+            while len(self._factors) > self.MAX_ENTRIES:
+                self._factors.popitem(last=False)
+        return taxas
+
+    def horizon(self, juros, anos, name):
+        """
+        Return the discount factor of a named horizon (see ``HORIZONS``).
+
+        :param juros: The interest rate as a fraction.
+        :param anos: The sequence of years.
+        :param name: The horizon name, e.g. 'vpl7'.
+        :return: The factor as a float.
+        """
+        return float(self.factors(juros, anos)[self.HORIZONS[name]])
+
+    def horizons(self, juros, anos):
+        """
+        Return the factors used by the cost steps.
+
+        :param juros: The interest rate as a fraction.
+        :param anos: The sequence of years.
+        :return: A tuple (vpl7, vpl14).
+        """
+        return self.horizon(juros, anos, 'vpl7'), self.horizon(juros, anos, 'vpl14')
+
+    def clear(self):
+        """
+        Forget every cached vector.
+        """
+        with self._lock:
+            self._factors.clear()
+
+
+# Shared by every Manejo instance in the process
+DISCOUNTS = DiscountCache()
@@ -0,0 +1,512 @@
+import numpy as np
+
+from Database.AsOf import AsOfIndex, numeric_affinity, numeric_type
+from Database.Query import check_identifiers
+from Database.Regions import RegionSheets
+
+
+def sql_substr(value, start, length=None):
+    """
+    Python version of SQLite's SUBSTR(X, Y, Z), including its rules for zero and negative arguments.
+    """
+    if value is None or start is None:
+        return None
+    size = len(value)
+    p1 = int(start)
+    p2 = size if length is None else int(length)
+    negative = p2 < 0
+    if negative:
+        p2 = -p2
+    if p1 < 0:
+        p1 += size
+        if p1 < 0:
+            p2 += p1
+            if p2 < 0:
+                p2 = 0
+            p1 = 0
+    elif p1 > 0:
+        p1 -= 1
+    elif p2 > 0:
+        p2 -= 1
+    if negative:
+        p1 -= p2
+        if p1 < 0:
+            p2 += p1
+            p1 = 0
+    return value[p1:p1 + p2]
+
+
+def sql_instr(value, search):
+    """
+    Python version of SQLite's INSTR(X, Y): 1-based position of Y in X, 0 if absent, NULL for NULL.
+    """
+    if value is None:
+        return None
+    return value.find(search) + 1
+
+
+def sql_round(value):
+    """
+    SQLite's ROUND(X) (no digits): halves are rounded away from zero.
+    """
+    return np.where(value >= 0, np.trunc(value + 0.5), -np.trunc(-value + 0.5))
+
+
+class VectorEngine:
+    """
+    Computes the whole manejo chain (ESPAreaBasal through t700_organizador) in memory.
+
+    'apex_base_1' and the lookup tables are loaded once into NumPy arrays, every derived column is
+    computed with vectorized operations that follow the SQL steps' semantics (NULL propagation,
+    division by zero yielding NULL, the first row winning in lookups, UPDATEs reading the old
+    values of the row), and 'Apex_Manejo_N' is written with a single bulk insert. The lookup
+    tables built earlier in the run (VPL totals, POND, ClassesInclinacaoResumo) still come from
+    the SQL steps.
+    """
+
+    NUMERIC_COLUMNS = ['Area', 'Idade', 'IdadeClasse', 'VTCC', 'Fustes', 'DIST_LP', 'DIST_PFRod', 'DIST_LFRod']
+    TEXT_COLUMNS = ['Regiao', 'Talhao', 'Regime', 'ESP', 'DCR_MatGen']
+    SEMENTES = ('SEM0001', 'E-GRAND', 'E-RESIN', 'PINUS', 'E-GLOBU', 'E-UROPH', 'E-TOREL', 'E-SALIG')
+
+    def __init__(self, manejo):
+        """
+        :param manejo: The Manejo instance of the run (connection, run context and VPL factors).
+        """
+        self.db = manejo
+        self._tables = {}
+        self._affinities = {}
+        self._as_of = {}
+
+    # ----------------------------------------------------------------- loading
+    def _load(self, source_table):
+        with self.db.connect() as conn:
+            cur = conn.execute(f"SELECT * FROM {source_table} ORDER BY rowid")
+            names = [column[0] for column in cur.description]
+            rows = cur.fetchall()
+        return names, rows
+
+    def _rows(self, table, columns):
+        key = (table.lower(), tuple(columns))
+        if key not in self._tables:
+            with self.db.connect() as conn:
+                self._tables[key] = conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"
+                ).fetchall()
+        return self._tables[key]
+
+    def _numeric_column(self, table, column):
+        """
+        Return True if the declared type of a column gives it INTEGER, REAL or NUMERIC affinity.
+        """
+        key = (table.lower(), column.lower())
+        if key not in self._affinities:
+            declared = ''
+            with self.db.connect() as conn:
+                for row in conn.execute(f"PRAGMA table_info({table})"):
+                    if row[1].lower() == column.lower():
+                        declared = row[2]
+            self._affinities[key] = numeric_type(declared)
+        return self._affinities[key]
+
+    def _numeric_keys(self, table, key_column):
+        """
+        Return the key normalizer used when the key is compared with a number: a TEXT column gets
+        NUMERIC affinity applied to its values, as SQLite does in that comparison.
+        """
+        if self._numeric_column(table, key_column):
+            return lambda key: key
+        return numeric_affinity
+
+    def _match(self, table, key_column, columns, values, numeric=False):
+        """
+        Equality lookup (``WHERE table.key = value``) for every value, keeping the first row of
+        each key. NULL never matches.
+
+        :param numeric: True when the values come from a numeric column (or expression).
+        :return: A list with the matched row (tuple of 'columns') or None for each value.
+        """
+        mapping = {}
+        normalize = self._numeric_keys(table, key_column) if numeric else (lambda key: key)
+        for row in self._rows(table, [key_column] + columns):
+            key = normalize(row[0])
+            if key is None or (numeric and not isinstance(key, (int, float))):
+                continue
+            mapping.setdefault(key, row[1:])
+
+        if numeric:
+            probes = [None if value is None or np.isnan(value) else value for value in values]
+        elif self._numeric_column(table, key_column):
+            probes = [numeric_affinity(value) for value in values]
+        else:
+            probes = list(values)
+        return [None if probe is None else mapping.get(probe) for probe in probes]
+
+    def _last_below(self, table, key_column, value_column, values):
+        """
+        For each value, return the lookup value of the largest numeric key <= value
+        (``WHERE key <= value ORDER BY key DESC LIMIT 1``), NaN when there is none.
+        Equal keys resolve to the last row, as the descending index scan does.
+        """
+        key = (table.lower(), key_column.lower(), value_column.lower())
+        if key not in self._as_of:
+            normalize = self._numeric_keys(table, key_column)
+            self._as_of[key] = AsOfIndex([(normalize(row[0]), row[1])
+                                          for row in self._rows(table, [key_column, value_column])])
+        return self._as_of[key].lookup(values)
+
+    def _regions(self, sheet):
+        with self.db.connect() as conn:
+            return RegionSheets(self.db.schema).regions(conn, sheet)
+
+    def _by_region(self, regiao, matches, codes):
+        # The row's value is read from the column of its region (see RegionSheets)
+        result = np.full(len(regiao), np.nan)
+        for column, code in enumerate(codes):
+            mask = regiao == code
+            result[mask] = self._column(matches, column)[mask]
+        return result
+
+    @staticmethod
+    def _column(matches, index):
+        return VectorEngine._floats([None if row is None else row[index] for row in matches])
+
+    @staticmethod
+    def _floats(values):
+        return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+    @staticmethod
+    def _div(numerator, denominator):
+        # SQLite returns NULL for a division by zero
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = numerator / denominator
+        return np.where(denominator == 0, np.nan, result)
+
+    @staticmethod
+    def _coalesce0(values):
+        return np.where(np.isnan(values), 0.0, values)
+
+    @staticmethod
+    def _not_equal(left, right):
+        # 'a <> b' is NULL (not true) when either side is NULL
+        return (left != right) & ~np.isnan(left) & ~np.isnan(np.broadcast_to(right, np.shape(left)))
+
+    def supports(self, source_table='apex_base_1'):
+        """
+        Check that the input columns hold the storage classes the engine reproduces exactly
+        (numbers or NULL in the numeric columns, text or NULL in the text columns). The lookup
+        tables need no check: their values are compared as stored, as the SQL steps do.
+
+        :param source_table: The base table of the run.
+        :return: True if the run can use the engine.
+        """
+        names, rows = self._load(source_table)
+        position = {name.lower(): index for index, name in enumerate(names)}
+        for column in self.NUMERIC_COLUMNS + self.TEXT_COLUMNS:
+            if column.lower() not in position:
+                return False
+        for row in rows:
+            for column in self.NUMERIC_COLUMNS:
+                value = row[position[column.lower()]]
+                if value is not None and not isinstance(value, (int, float)):
+                    return False
+            for column in self.TEXT_COLUMNS:
+                value = row[position[column.lower()]]
+                if value is not None and not isinstance(value, str):
+                    return False
+        return True
+
+    # ----------------------------------------------------------------- pipeline
+    def run(self, table_name, columns, remanescentes=False, acrescimo_colheita=None, source_table='apex_base_1'):
+        """
+        Compute and write 'table_name' in one pass.
+
+        :param table_name: The output table (e.g. 'Apex_Manejo_3').
+        :param columns: The planned (column, type) pairs, as returned by OutputPlanner.columns.
+        :param remanescentes: Whether remanescentes take the decision of the talhão they refer to.
+        :param acrescimo_colheita: The harvest cost increase used by REF_REF.
+        :param source_table: The base table.
+        """
+        check_identifiers(table_name, source_table)
+        names, rows = self._load(source_table)
+        position = {name.lower(): index for index, name in enumerate(names)}
+        n = len(rows)
+
+        def num(column):
+            return self._floats([row[position[column.lower()]] for row in rows])
+
+        def txt(column):
+            return [row[position[column.lower()]] for row in rows]
+
+        context = self.db.run_context()
+        out = {}
+
+        regiao = np.array(txt('Regiao'), dtype=object)
+        talhao = txt('Talhao')
+        regime = np.array(txt('Regime'), dtype=object)
+        area, idade, vtcc = num('Area'), num('Idade'), num('VTCC')
+
+        # ESPAreaBasal
+        esp = txt('ESP')
+        # The output rows get the rowids 1..n, in the order of the base table
+        esp_ab = np.array([self.db.esp_ab(value, rowid) for rowid, value in enumerate(esp, start=1)], dtype=np.float64)
+        with self.db.connect() as conn:
+            qtd = {value: conn.execute("SELECT round(10000 / ?, 1)", (value,)).fetchone()[0]
+                   for value in set(esp_ab.tolist())}
+        out['EspAB'] = esp_ab
+        out['QTDArvIdeal'] = self._floats([qtd[value] for value in esp_ab.tolist()])
+
+        # update_curva_and_vol7
+        sheet_columns, codes = zip(*self._regions('CurvaProdutividade'))
+        curva = self._by_region(regiao, self._match('CurvaProdutividade', 'Idade', list(sheet_columns),
+                                                    num('IdadeClasse'), numeric=True), codes)
+        curva = np.where(np.isnan(curva), 130.00, curva)
+        fator = np.where(curva < 100, self._div(1.0, curva / 100), curva / 100)
+        vol7 = np.where(idade < 7, vtcc * fator,
+                        np.where(self._not_equal(vtcc, 0), (1 - (fator - 1)) * vtcc, 0.0))
+        out.update({'Curva': curva, 'Fator': fator, 'Vol7': vol7})
+
+        # perdas
+        brotacao = self._last_below('IndiceBrotacao', 'Idade', 'Perda', idade)
+        fallback = self._lowest('IndiceBrotacao', 'Idade', 'Perda')
+        brotacao = np.where(np.isnan(brotacao), fallback, brotacao)
+        perda = context.parametro(2)
+        r2 = context.parametro(3)
+        col = context.parametro(13)
+        value4 = context.parametro(1)
+        talhadia = np.where(regime == 'R',
+                            (brotacao / 100) * (perda / 100) * (r2 / 100) * (col / 100),
+                            (brotacao / 100) * (perda / 100) * (col / 100))
+        vol7_rot = {'2ROT': vol7 * talhadia, '1ROT': vol7 * (1 + (value4 / 100))}
+        out.update({'FatoresBrotacao': brotacao, 'FatoresTalhadia': talhadia,
+                    'Vol7_2ROT': vol7_rot['2ROT'], 'Vol7_1ROT': vol7_rot['1ROT']})
+
+        # Cost steps, for both REF types
+        pond = self._colheita_pond(regiao, vol7)
+        outros = self._match('OutrosCustos', 'Regiao', ['ApoioColheita', 'EstInterna', 'ADM', 'Taxas'], regiao)
+        apoio, est_interna = self._column(outros, 0), self._column(outros, 1)
+        adm_taxas = self._column(outros, 2) + self._column(outros, 3)
+
+        for ref_type, rot_type in (('REF_REG', '2ROT'), ('REF_REF', '1ROT')):
+            vpl7, vpl14 = self.db.HorizontesVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
+            vol_rot = vol7_rot[rot_type]
+
+            total = self._column(self._match(f'CustosSilvicultura_{ref_type}_VPL_Total', 'Regiao', ['Total'], regiao), 0)
+            out[f'CustoMADPE_{ref_type}'] = self._div(total, vpl7 * vol7 + vpl14 * vol_rot)
+
+            pond_rot = self._colheita_pond(regiao, vol_rot)
+            out['CustosColheitaPond'] = pond
+            out[f'CustosColheitaPond_{rot_type}'] = pond_rot
+            if ref_type == 'REF_REF' and acrescimo_colheita:
+                numerator = vol7 * pond * vpl7 + vol_rot * pond_rot * vpl14 * (1 + acrescimo_colheita)
+            else:
+                numerator = vol7 * pond * vpl7 + vol_rot * pond_rot * vpl14
+            colheita = self._div(numerator, vol7 * vpl7 + vol_rot * vpl14)
+            out[f'CustosColheita_{ref_type}'] = colheita
+
+            denominator = vol7 * vpl7 + vol_rot * vpl14
+            out[f'CustosApoioColheita_{ref_type}'] = self._div(apoio * (vpl7 + vpl14), denominator)
+            out[f'CustosColheitaEstradaInterna_{ref_type}'] = self._div(est_interna * (vpl7 + vpl14), denominator)
+            out[f'CustosColheitaTotal_{ref_type}'] = (self._coalesce0(colheita)
+                                                      + self._coalesce0(out[f'CustosApoioColheita_{ref_type}'])
+                                                      + self._coalesce0(out[f'CustosColheitaEstradaInterna_{ref_type}']))
+            out[f'CustosTAXAADM_{ref_type}'] = self._div(adm_taxas * (vpl7 + vpl14), denominator)
+
+        # CustosTransporteGeral
+        dist_lp, dist_pfrod, dist_lfrod = num('DIST_LP'), num('DIST_PFRod'), num('DIST_LFRod')
+        dist_rod = np.where(dist_lfrod == 0, dist_lp + dist_pfrod, dist_lfrod)
+        distancia = sql_round((dist_rod + 2) / 5) * 5
+        sheet_columns, codes = zip(*self._regions('CustosTransRod'))
+        transporte = self._by_region(regiao, self._match('CustosTransRod', 'Distancia', list(sheet_columns),
+                                                         distancia, numeric=True), codes)
+        estrada = context.lookup('CustoEstExterna')
+        ferroviaria = np.full(n, np.nan)
+        for region_code, total_cost in self.db.combine_third_values(context.rows('CustoFerr'),
+                                                                    context.rows('CustoMovPatio')):
+            ferroviaria[regiao == region_code] = np.nan if total_cost is None else float(total_cost)
+        out.update({
+            'CustosTransporte': transporte,
+            'DistROD': dist_rod,
+            'CustoEstradaExterna': self._floats([estrada.get(value) for value in regiao]),
+            'CustoFerroviariaMovPatio': ferroviaria,
+        })
+
+        # CustosPostoFabrica
+        tra, trb = context.parametro(4), context.parametro(5)
+        baixas = [value for value, elev in context.rows('Elevacao') if elev == 'Região Baixa']
+        em_baixa = np.array([value is not None and value in baixas for value in regiao], dtype=bool)
+        for ref_type in ('REF_REG', 'REF_REF'):
+            soma = (self._coalesce0(out[f'CustoMADPE_{ref_type}'])
+                    + self._coalesce0(out[f'CustosColheitaTotal_{ref_type}'])
+                    + self._coalesce0(out['CustosTransporte'])
+                    + self._coalesce0(out['CustoEstradaExterna'])
+                    + self._coalesce0(out['CustoFerroviariaMovPatio'])
+                    + self._coalesce0(out[f'CustosTAXAADM_{ref_type}']))
+            out[f'CustosPostoFabrica_{ref_type}'] = np.where(em_baixa, soma * (100 - trb) / 100,
+                                                             soma * (100 - tra) / 100)
+        out['CustoMadAV'] = self._div(self._coalesce0(out['CustosPostoFabrica_REF_REF']),
+                                      out['CustosPostoFabrica_REF_REG'])
+
+        self._av(out, context, regiao, talhao, regime, area, idade, esp_ab, num('Fustes'), txt('DCR_MatGen'))
+        self._t700(out, talhao)
+
+        out['ManejoAPEX'] = np.where(out['AvFinalReforma'] > 0, 'Reforma', 'Regeneração').astype(object)
+        if remanescentes:
+            manejo_t700 = {}
+            for chave, manejo in zip(out['cod_chave'], out['ManejoAPEX']):
+                if chave is not None:
+                    manejo_t700.setdefault(chave, manejo)
+            final = [manejo_t700.get(ref) if remanescente == 'Remanescente' else manejo
+                     for remanescente, ref, manejo in zip(out['remanescente'], out['cod_chave_ref'], out['ManejoAPEX'])]
+        else:
+            final = list(out['ManejoAPEX'])
+        out['ManejoAPEX_Final'] = [value if value is not None else manejo
+                                   for value, manejo in zip(final, out['ManejoAPEX'])]
+
+        self._write(table_name, source_table, names, rows, columns, out)
+        print(f"Table '{table_name}' computed by the vectorized engine ({n} rows).")
+
+    def _lowest(self, table, key_column, value_column):
+        # 'ORDER BY key ASC LIMIT 1' over every row: NULL keys first, then numbers, text and blobs
+        def order(item):
+            rowid, (key, _) = item
+            if key is None:
+                return (0, 0, rowid)
+            if isinstance(key, (int, float)):
+                return (1, key, rowid)
+            if isinstance(key, str):
+                return (2, key.encode('utf-8'), rowid)
+            return (3, bytes(key), rowid)
+
+        rows = list(enumerate(self._rows(table, [key_column, value_column])))
+        if not rows:
+            return np.nan
+        value = min(rows, key=order)[1][1]
+        return np.nan if value is None else float(value)
+
+    def _colheita_pond(self, regiao, volume):
+        pond = np.full(len(regiao), np.nan)
+        for region, table in self.db.TABELAS_COLHEITA.items():
+            mask = regiao == region
+            if mask.any():
+                pond[mask] = self._last_below(table, 'PROD', 'POND', volume[mask])
+        return pond
+
+    def _av(self, out, context, regiao, talhao, regime, area, idade, esp_ab, fustes, matgen):
+        n = len(regiao)
+        fave = context.parametro(12) / 100
+        ra3, rb3, ra2, rb2 = (context.parametro(index) for index in (6, 7, 8, 9))
+        vol7_2rot, custo_mad_av = out['Vol7_2ROT'], out['CustoMadAV']
+
+        av_reforma = np.where((vol7_2rot == 0) | (custo_mad_av > fave), 0.0, area)
+        nao_avaliada = np.where(custo_mad_av == 0, area, 0.0)
+        regeneracao = np.where((vol7_2rot == 0) | (custo_mad_av <= fave), 0.0, area)
+
+        elevacao = context.rows('Elevacao')
+        reg_alta_baixa = None
+        if elevacao:
+            reg_alta_baixa = 'RB' if elevacao[0][1] == 'REGIÃO BAIXA' else 'RA'
+
+        # Multi-column UPDATEs read the values the row had before the statement (NULL on a new table)
+        arv_min_old = np.full(n, np.nan)
+        arv_min = arv_min_old.copy()
+        if reg_alta_baixa in ('RA', 'RB'):
+            menor, maior = (ra2, ra3) if reg_alta_baixa == 'RA' else (rb2, rb3)
+            arv_min = np.where(esp_ab < 9, menor, np.where(esp_ab >= 9, maior, arv_min_old))
+        fustes_reforma = np.where((fustes < arv_min_old) & (regeneracao > 0), area, 0.0)
+
+        clone_semente = ['Semente' if value in self.SEMENTES else 'Clone' for value in matgen]
+        clone_semente_old = np.zeros(n, dtype=bool)  # CloneSemente = 'Semente' on the old (NULL) value
+        cs_reforma = np.where((fustes_reforma == 0) & clone_semente_old, regeneracao, 0.0)
+        r2_reforma = np.where((cs_reforma == 0) & (fustes_reforma == 0) & (regime == 'R'), regeneracao, 0.0)
+
+        rt = self._match('RTMaterialGenetico', 'DCR_MatGen', ['RegAlta', 'RegBaixaEncosta', 'RegBaixaBaixada'], matgen)
+        # The lookup value is kept as stored (the sheet may hold 'SIM'/'NÃO' or numbers). The CASE that
+        # reads it has no affinity, so 'FatorBrotacaoMatGen = 0' only holds for a stored number equal to 0
+        fator_matgen = [None] * n
+        for i, (value, found) in enumerate(zip(talhao, rt)):
+            sub = sql_substr(value, 5, 2)
+            index = 1 if sub in ('BA', 'MA') else 2 if sub == 'PD' else 0
+            if found is not None:
+                fator_matgen[i] = found[index]
+        matgen_zero = np.array([isinstance(value, (int, float)) and value == 0 for value in fator_matgen], dtype=bool)
+
+        sem_outras = (fustes_reforma == 0) & (cs_reforma == 0) & (r2_reforma == 0)
+        mgnr = np.where((regeneracao > 0) & sem_outras & matgen_zero, area, 0.0)
+        maior15 = np.where((idade > 15) & sem_outras & (mgnr == 0), area, 0.0)
+
+        prod_min_lookup = context.lookup('ProdMin')
+        prod_min = self._floats([None if value is None else prod_min_lookup.get(sql_substr(value, 5, 2))
+                                 for value in talhao])
+        prod_min_old = np.full(n, np.nan)
+        baixa_prod = np.where((prod_min_old > out['Vol7']) & sem_outras & (mgnr == 0) & (maior15 == 0), area, 0.0)
+
+        semi = fustes_reforma + cs_reforma + r2_reforma + mgnr + maior15
+        out.update({
+            'AVAreaReforma': av_reforma,
+            'AvAreaNaoAvaliada': nao_avaliada,
+            'AvAreaRegeneracao': regeneracao,
+            'RegAltaBaixa': [reg_alta_baixa] * n,
+            'ArvMin': arv_min,
+            'AvFustesAreaReforma': fustes_reforma,
+            'CloneSemente': clone_semente,
+            'AvCSAreaReforma': cs_reforma,
+            'AvR2AreaReforma': r2_reforma,
+            'FatorBrotacaoMatGen': fator_matgen,
+            'AvMGNR': mgnr,
+            'AvMaior15AreaReforma': maior15,
+            'AvBaixaProd': baixa_prod,
+            'ProdMin': prod_min,
+            'AvAreaReformaSemi': semi,
+            'AvFinalNaoAvaliado': nao_avaliada,
+            'AvFinalAnalise': baixa_prod,
+            'AvFinalReforma': semi + av_reforma,
+            'AvFinalRegeneracao': regeneracao - semi - baixa_prod,
+        })
+
+    def _t700(self, out, talhao):
+        projeto, cod_talhao, chave, chave_ref, remanescente = [], [], [], [], []
+        for value in talhao:
+            traco = sql_instr(value, '-')
+            p = sql_substr(value, 1, 11)
+            t = sql_substr(value, traco + 1) if value is not None else None
+            c = p + t if value is not None else None
+            projeto.append(p)
+            cod_talhao.append(t)
+            chave.append(c)
+
+            primeiro = sql_substr(t, 1, 1)
+            ultimo = sql_substr(value, len(value), 1) if value is not None else None
+            r = 'Remanescente' if primeiro in ('7', '8') or ultimo in ('R', 'S') else 'Talhão'
+            remanescente.append(r)
+
+            ref = None
+            if r == 'Remanescente':
+                if primeiro in ('7', '8') and len(c) <= 14:
+                    ref = sql_substr(value, 1, 11) + '0' + sql_substr(value, traco + 2)
+                elif primeiro in ('7', '8') and len(c) > 14:
+                    ref = sql_substr(value, 1, 11) + '0' + sql_substr(value, traco + 2, len(value) - traco - 2)
+                elif ultimo in ('R', 'S'):
+                    ref = sql_substr(value, 1, 11) + sql_substr(value, traco + 1, len(value) - traco - 1)
+            chave_ref.append(ref)
+
+        out.update({'cod_projeto': projeto, 'cod_talhao': cod_talhao, 'cod_chave': chave,
+                    'cod_chave_ref': chave_ref, 'remanescente': remanescente})
+
+    @staticmethod
+    def _python(values):
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+            return [None if np.isnan(value) else value for value in values.tolist()]
+        return [None if value is None else value for value in list(values)]
+
+    def _write(self, table_name, source_table, names, rows, columns, out):
+        computed = {column.lower(): self._python(values) for column, values in out.items()}
+        planned = [column for column, _ in columns]
+        values = [computed[column.lower()] for column in planned]
+        placeholders = ', '.join('?' for _ in range(len(names) + len(planned)))
+        with self.db.connect() as conn:
+            cur = conn.cursor()
+            cur.execute(f"CREATE TABLE {table_name} AS SELECT * FROM {source_table} WHERE 0")
+            for column, column_type in columns:
+                cur.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}")
+            cur.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})",
+                            (row + tuple(extra) for row, extra in zip(rows, zip(*values))))
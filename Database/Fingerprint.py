@@ -0,0 +1,114 @@
+import hashlib
+
+from Database.Pool import ConnectionPool
+
+
+class FingerprintStore:
+    """
+    Keeps the fingerprint of the last successful execution of each pipeline step.
+
+    A step whose fingerprint is unchanged since the last run (same call, same external inputs, same
+    upstream fingerprints) produced the output that is already in the database, so the next run can
+    keep that output instead of recomputing it. The fingerprints live in the 'ApexEtapas' table and
+    are written inside the run's transaction, so they only change when the run commits.
+    """
+
+    TABLE = 'ApexEtapas'
+    BATCH = 5000
+
+    # Tables the pipeline only reads through their last row (see PipelineContext)
+    LAST_ROW = {'parametros'}
+
+    def __init__(self, db, last_rows=None):
+        """
+        :param db: Path to the SQLite database file.
+        :param last_rows: A dict {table: {column: value}} with the row the run reads in place of the
+                          last row of a LAST_ROW table (the parameters of a sweep scenario).
+        """
+        self.db = db
+        self.last_rows = {table.lower(): {column.lower(): value for column, value in row.items()}
+                          for table, row in (last_rows or {}).items()}
+        self._hashes = {}
+
+    def connect(self):
+        return ConnectionPool.for_path(self.db).writer()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
+
+    def load(self):
+        """
+        Return the fingerprints saved by the last successful run.
+
+        :return: A dict {step name: (fingerprint, output table)}.
+        """
+        with self.connect() as conn:
+            if not self.schema.has_table(conn, self.TABLE):
+                return {}
+            rows = conn.execute(f"SELECT Etapa, Fingerprint, Tabela FROM {self.TABLE}").fetchall()
+        return {step: (fingerprint, table) for step, fingerprint, table in rows}
+
+    def save(self, fingerprints, table):
+        """
+        Record the fingerprints of a run.
+
+        :param fingerprints: A dict {step name: fingerprint}.
+        :param table: The output table of the run (e.g. 'Apex_Manejo_3').
+        """
+        with self.connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    Etapa TEXT PRIMARY KEY,
+                    Fingerprint TEXT,
+                    Tabela TEXT
+                )
+            """)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} (Etapa, Fingerprint, Tabela) VALUES (?, ?, ?)",
+                [(step, fingerprint, table) for step, fingerprint in fingerprints.items()]
+            )
+
+    def content_hash(self, table, column=None, excluded=()):
+        """
+        Hash the content of a table (or of one of its columns), in rowid order.
+
+        Columns written by the pipeline itself are left out. A missing column falls back to the
+        whole table, and a missing table hashes as 'missing'. Only the last row of the tables in
+        LAST_ROW is hashed (or the row given in last_rows), so appending a row with the same values
+        keeps the hash.
+
+        :param table: The table name.
+        :param column: The column name, or None for the whole table.
+        :param excluded: Lowercase names of the columns to leave out.
+        :return: A hex digest.
+        """
+        key = (table.lower(), (column or '').lower(), frozenset(excluded))
+        if key in self._hashes:
+            return self._hashes[key]
+
+        with self.connect() as conn:
+            if not self.schema.has_table(conn, table):
+                self._hashes[key] = 'missing'
+                return 'missing'
+            if column and self.schema.has_column(conn, table, column):
+                columns = [column]
+            else:
+                columns = [name for name in self.schema.columns(conn, table) if name.lower() not in excluded]
+
+            digest = hashlib.sha256(repr(columns).encode())
+            if columns and table.lower() in self.last_rows:
+                # Hashed as the query below would return it, so the same values keep the same hash
+                row = self.last_rows[table.lower()]
+                digest.update(repr([tuple(row[name.lower()] for name in columns)]).encode())
+            elif columns:
+                rows = "ORDER BY rowid DESC LIMIT 1" if table.lower() in self.LAST_ROW else "ORDER BY rowid"
+                cur = conn.execute(f"SELECT {', '.join(columns)} FROM {table} {rows}")
+                while True:
+                    rows = cur.fetchmany(self.BATCH)
+                    if not rows:
+                        break
+                    digest.update(repr(rows).encode())
+
+        self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
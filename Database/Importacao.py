@@ -0,0 +1,56 @@
+from Database.Indices import IndexManager
+from Database.Regions import RegionSheets
+from Database.Talhoes import TalhaoDimension
+
+
+def importar_planilha(conn, schema, df, table_name):
+    """
+    Create a table from a sheet read by the interface, with an 'id' primary key.
+
+    The strings are uppercased and each column is declared with a pandas dtype as its type. Those
+    types come from ``df.dtypes`` after 'id' is inserted, so each column gets the dtype of the
+    column before it. The bases in use were imported that way, and the SQLite affinities follow
+    from it. The table then gets what the pipelines expect of an imported sheet: the indexes of
+    its lookup keys, the long-format copy of the sheets with one column per region and the talhão
+    codes of the Talhao dimension.
+
+    :param conn: The writer connection; the caller commits.
+    :param schema: The SchemaCatalog of the database.
+    :param df: The sheet.
+    :param table_name: The table to create.
+    """
+    # Convert all string elements in the DataFrame to uppercase
+    df = df.apply(lambda col: col.map(lambda x: x.upper() if isinstance(x, str) else x))
+
+    # Add a primary key column
+    df.insert(0, 'id', range(1, len(df) + 1))
+
+    # Write the DataFrame to a temporary table without a primary key
+    temp_table = f"temp_{table_name}"
+    df.to_sql(temp_table, conn, if_exists='replace', index=False)
+
+    # Get the column names and types from the DataFrame
+    columns = ', '.join([f'"{col}"' for col in df.columns])
+
+    # Create the final table with a primary key
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        CREATE TABLE {table_name} (
+            id INTEGER PRIMARY KEY,
+            {', '.join([f'"{col}" {dtype}' for col, dtype in zip(df.columns[1:], df.dtypes)])}
+        )
+    """)
+
+    # Insert data from the temporary table into the final table
+    cursor.execute(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {temp_table}")
+    cursor.execute(f"DROP TABLE {temp_table}")
+
+    # Index the lookup keys of the imported table, if it is one the pipeline reads
+    IndexManager(schema).provision(conn, [table_name])
+    # Sheets with one column per region also get their long-format copy
+    RegionSheets(schema).materialize(conn, [table_name])
+    # Talhão codes of the inventory and budget sheets are parsed into the Talhao dimension
+    sources = {table: columns for table, columns in TalhaoDimension.SOURCES.items()
+               if table.lower() == table_name.lower()}
+    if sources:
+        TalhaoDimension(schema).extend(conn, sources)
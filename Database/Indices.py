@@ -0,0 +1,99 @@
+import fnmatch
+import sqlite3
+
+
+class IndexManager:
+    """
+    Declares the indexes behind the join and lookup keys of the consistency and manejo steps.
+
+    The correlated subqueries of those steps run once per row of the output table, so without an
+    index each of them is a full scan of the lookup table. ``provision`` creates the declared indexes
+    that are missing, drops managed indexes that are no longer declared and refreshes the planner
+    statistics with ANALYZE. Table names may be fnmatch patterns (case-insensitive).
+    """
+
+    PREFIX = 'apex_idx_'
+
+    # Table (or pattern) -> list of indexed column tuples
+    INDEXES = {
+        'CurvaProdutividade': [('Idade',)],  # update_curva_and_vol7
+        'IndiceBrotacao': [('Idade',)],  # perdas
+        'CustosColheita??': [('PROD',)],  # CustosColheitaOP (BO, CO, GN, PO, SB, PI)
+        'CustosTransRod': [('Distancia',)],  # CustosTransporteGeral
+        'CurvaProdutividade_Longo': [('Regiao', 'Idade')],  # update_curva_and_vol7 (see RegionSheets)
+        'CustosTransRod_Longo': [('Regiao', 'Distancia')],  # CustosTransporteGeral (see RegionSheets)
+        'OutrosCustos': [('Regiao',)],  # CustosApoioColheita, CustosColheitaEstradaInterna, OutrosCustos
+        'Elevacao': [('Regiao',)],
+        'apex_temp_6': [('TalhaoAtual',)],  # Consist._update_with_apex_tmp_6
+        'ApexCenariosResultado': [('Cenario',)],  # Scenario sweep results
+        'DimTalhao': [('Regiao',), ('SubRegiao',), ('Projeto',), ('Lote',)],  # see TalhaoDimension
+    }
+
+    def __init__(self, schema):
+        """
+        :param schema: The SchemaCatalog of the database.
+        """
+        self.schema = schema
+
+    @classmethod
+    def index_name(cls, table, columns):
+        return f"{cls.PREFIX}{table}_{'_'.join(columns)}".lower()
+
+    def declared(self, conn, tables=None):
+        """
+        Return the declared indexes whose table and columns exist.
+
+        :param conn: The connection to inspect.
+        :param tables: Restrict the result to these tables (default: every table).
+        :return: A dict {index_name: (table, columns)}.
+        """
+        existing = self.schema.tables(conn)
+        if tables is not None:
+            wanted = {table.lower() for table in tables}
+            existing = [table for table in existing if table.lower() in wanted]
+
+        indexes = {}
+        for table in existing:
+            for pattern, column_sets in self.INDEXES.items():
+                if not fnmatch.fnmatch(table.lower(), pattern.lower()):
+                    continue
+                for columns in column_sets:
+                    if all(self.schema.has_column(conn, table, column) for column in columns):
+                        indexes[self.index_name(table, columns)] = (table, columns)
+        return indexes
+
+    def managed(self, conn):
+        """
+        Return the names of the indexes created by this manager that exist in the database.
+        """
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE ?", (f"{self.PREFIX}%",)
+        ).fetchall()
+        return {row[0].lower() for row in rows}
+
+    def provision(self, conn, tables=None):
+        """
+        Create the missing declared indexes, drop the stale ones and run ANALYZE on the indexed tables.
+
+        :param conn: The connection to use (a write connection).
+        :param tables: Restrict the work to these tables (default: every table).
+        :return: The list of indexes created.
+        """
+        declared = self.declared(conn, tables)
+        managed = self.managed(conn)
+        created = []
+        try:
+            for name, (table, columns) in declared.items():
+                if name not in managed:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+                    created.append(name)
+
+            if tables is None:
+                for name in managed - set(declared):
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+            for table in sorted({table for table, _ in declared.values()}):
+                conn.execute(f"ANALYZE {table}")
+        except sqlite3.Error as e:
+            print(f"An error occurred while provisioning indexes: {e}")
+        return created
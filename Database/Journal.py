@@ -0,0 +1,95 @@
+from Database.Pool import ConnectionPool
+
+
+class RunJournal:
+    """
+    Steps completed by the pipeline run in progress, so a run that dies halfway can be resumed.
+
+    In resumable mode each step commits on its own, and the step is written to the 'ApexJournal'
+    table in the same commit as its output: a step is in the journal if and only if its work is in
+    the database. The rows are deleted when the run finishes, so rows left in the journal always
+    belong to an interrupted run. Each row keeps the step fingerprint (see StepGraph.fingerprints),
+    which identifies the output the step produced from its inputs.
+    """
+
+    TABLE = 'ApexJournal'
+
+    def __init__(self, db):
+        """
+        :param db: Path to the SQLite database file.
+        """
+        self.db = db
+
+    def connect(self):
+        return ConnectionPool.for_path(self.db).writer()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
+
+    def create(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                Tabela TEXT,
+                Etapa TEXT,
+                Fingerprint TEXT,
+                Ordem INTEGER,
+                PRIMARY KEY (Tabela, Etapa)
+            )
+        """)
+
+    def pending(self):
+        """
+        Return the steps recorded by the interrupted runs.
+
+        :return: A dict {output table: {step name: fingerprint}}, empty when no run was interrupted.
+        """
+        with self.connect() as conn:
+            if not self.schema.has_table(conn, self.TABLE):
+                return {}
+            rows = conn.execute(f"SELECT Tabela, Etapa, Fingerprint FROM {self.TABLE} ORDER BY Ordem").fetchall()
+        runs = {}
+        for table, step, fingerprint in rows:
+            runs.setdefault(table, {})[step] = fingerprint
+        return runs
+
+    def finished(self, tables):
+        """
+        Leave out the output tables of the interrupted runs (and of the run in progress): their
+        committed steps are in the database, but the table is incomplete until the run finishes.
+
+        :param tables: Output table names.
+        :return: The tables without rows in the journal, in the same order.
+        """
+        with ConnectionPool.for_path(self.db).reader() as conn:
+            if not self.schema.has_table(conn, self.TABLE):
+                return list(tables)
+            pending = {row[0].lower() for row in conn.execute(f"SELECT DISTINCT Tabela FROM {self.TABLE}")}
+        return [table for table in tables if table.lower() not in pending]
+
+    def record(self, table, step, fingerprint):
+        """
+        Record a completed step. Call it inside the step's transaction, so both commit together.
+
+        :param table: The output table of the run.
+        :param step: The step name.
+        :param fingerprint: The step fingerprint.
+        """
+        with self.connect() as conn:
+            self.create(conn)
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {self.TABLE} (Tabela, Etapa, Fingerprint, Ordem)
+                VALUES (?, ?, ?, (SELECT COUNT(*) FROM {self.TABLE} WHERE Tabela = ?))
+            """, (table, step, fingerprint, table))
+
+    def clear(self, table=None):
+        """
+        Forget the steps of a run (default: of every run).
+        """
+        with self.connect() as conn:
+            if not self.schema.has_table(conn, self.TABLE):
+                return
+            if table is None:
+                conn.execute(f"DELETE FROM {self.TABLE}")
+            else:
+                conn.execute(f"DELETE FROM {self.TABLE} WHERE Tabela = ?", (table,))
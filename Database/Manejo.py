@@ -1,13 +1,84 @@
+import json
 import sqlite3
-import pandas as pd
+
+from Database.AsOf import AsOfIndex
+from Database.Colheita import PonderacaoColheita
+from Database.Context import PipelineContext
+from Database.Discount import DISCOUNTS
+from Database.Indices import IndexManager
+from Database.Pool import ConnectionPool
+from Database.Query import check_identifiers
+from Database.Regions import RegionSheets
+from Database.Silvicultura import VPLSilvicultura
+from Database.Talhoes import TalhaoDimension
 
 
 class Manejo:
+    # Region columns of 'CurvaProdutividade'/'CustosTransRod' and their codes in 'Regiao'
+    REGIOES = RegionSheets.CODIGOS
+
+    # 'custos_colheita' table used by each region
+    TABELAS_COLHEITA = {
+        'SA': 'CustosColheitaGN', 'VI': 'CustosColheitaGN',
+        'BO': 'CustosColheitaBO', 'IP': 'CustosColheitaBO',
+        'PO': 'CustosColheitaPO',
+        'CO': 'CustosColheitaCO',
+        'SB': 'CustosColheitaSB',
+        'PI': 'CustosColheitaPI'
+    }
+
+    # Columns of the output table kept for each scenario of a sweep
+    RESULTADO_CENARIO = ['Talhao', 'Regiao', 'Area', 'CustoMadAV', 'AvFinalReforma', 'AvFinalRegeneracao',
+                         'ManejoAPEX_Final']
+
     def __init__(self, db):
         self.db = db
+        self.context = None
 
     def connect(self):
-        return sqlite3.connect(self.db)
+        return ConnectionPool.for_path(self.db).writer()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
+
+    def begin_run(self, parametros=None):
+        """
+        Load 'Parametros' and the small lookup tables once for the whole pipeline run.
+
+        While the run context is active, every step reads them from memory instead of querying SQLite.
+
+        :param parametros: A dict {Parametros column: value} used by this run in place of the values
+                           of the last 'Parametros' row, which is left unchanged.
+        """
+        self.context = PipelineContext(self.db, parametros)
+        return self.context
+
+    def end_run(self):
+        """
+        Drop the run context, so later calls read the tables again.
+        """
+        self.context = None
+
+    def transaction(self):
+        """
+        Return a context manager that runs the enclosed steps in a single write transaction.
+        """
+        return self.connect().transaction()
+
+    def savepoint(self, name):
+        """
+        Return a context manager that wraps one pipeline step in a SAVEPOINT.
+
+        :param name: The savepoint name (a plain identifier).
+        """
+        return self.connect().savepoint(name)
+
+    def run_context(self):
+        """
+        Return the active run context, or a fresh one when a step is called outside a run.
+        """
+        return self.context if self.context is not None else PipelineContext(self.db)
 
     def create_table(self, column, base, column_type="FLOAT"):
         """
@@ -22,14 +93,12 @@ class Manejo:
         column_type : str, optional
             The data type of the new column (default is "FLOAT").
         """
+        check_identifiers(column, base, column_type)
         try:
             with self.connect() as conn:
                 cur = conn.cursor()
-                # Check if the column already exists
-                cur.execute(f"PRAGMA table_info({base})")
-                existing_columns = [column[1] for column in cur.fetchall()]
-
-                if column not in existing_columns:
+                # Check if the column already exists (answered from the schema catalog)
+                if not self.schema.has_column(conn, base, column):
                     # Add the new column if it doesn't exist
                     cur.execute(f"""
                         ALTER TABLE {base}
@@ -38,6 +107,41 @@ class Manejo:
         except sqlite3.Error as e:
             print(f"An error occurred while adding the column '{column}' to the table '{base}': {e}")
 
+    def provision_indexes(self, tables=None):
+        """
+        Create the indexes declared by IndexManager for the lookup tables and refresh their statistics.
+
+        :param tables: Restrict the work to these tables (default: every table, also dropping stale indexes).
+        """
+        with self.connect() as conn:
+            created = IndexManager(self.schema).provision(conn, tables)
+        if created:
+            print(f"Indexes created: {', '.join(created)}")
+
+    def provision_region_sheets(self, sheets=None):
+        """
+        Rebuild the long-format tables of the sheets that keep one column per region (see RegionSheets).
+
+        :param sheets: Restrict the work to these sheets (default: every declared sheet).
+        """
+        with self.connect() as conn:
+            written = RegionSheets(self.schema).materialize(conn, sheets)
+        if written:
+            print(f"Long-format tables created: {', '.join(written)}")
+
+    def provision_talhoes(self, tables=None, column='Talhao'):
+        """
+        Add the talhões of some tables to the Talhao dimension (see TalhaoDimension).
+
+        :param tables: The tables to read (default: the import tables in TalhaoDimension.SOURCES).
+        :param column: The talhão column of the tables.
+        """
+        sources = None if tables is None else {table: [column] for table in tables}
+        with self.connect() as conn:
+            added = TalhaoDimension(self.schema).extend(conn, sources)
+        if added:
+            print(f"Talhões added to the dimension: {added}")
+
     def drop_table(self, table_name):
         """
         Drop a table from the database if it exists.
@@ -64,10 +168,7 @@ class Manejo:
             A list of table names in the database.
         """
         with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cur.fetchall()
-        return [table[0] for table in tables]
+            return self.schema.tables(conn)
 
     def fetch_all(self, table, columns="*"):
         """
@@ -115,9 +216,7 @@ class Manejo:
                     return
 
                 # Fetch the column names of the target table to match the number of values
-                cursor.execute(f"PRAGMA table_info({target_table})")
-                columns_info = cursor.fetchall()
-                columns_count = len(columns_info)
+                columns_count = len(self.schema.columns(conn, target_table))
 
                 if len(last_row) != columns_count:
                     raise ValueError(f"The number of columns in '{source_table}' does not match '{target_table}'.")
@@ -137,6 +236,121 @@ class Manejo:
         except ValueError as ve:
             print(f"Value error: {ve}")
 
+    def save_scenario(self, table_name, parametros, efetivos=None):
+        """
+        Store the result of one sweep scenario in compact form.
+
+        The scenario and its area totals go to 'ApexCenarios', and the decision of each talhão (a few
+        columns instead of the whole output table) to 'ApexCenariosResultado'.
+
+        :param table_name: The output table of the scenario (e.g. 'Apex_Manejo_3').
+        :param parametros: The parameters that define the scenario, as a dict {column: value}.
+        :param efetivos: The whole 'Parametros' row the scenario ran with (the last row and the scenario
+                         values), as a dict {column: value}, so the scenario can be reproduced after
+                         'Parametros' changes.
+        :return: The scenario id.
+        """
+        check_identifiers(table_name, *self.RESULTADO_CENARIO)
+        columns = ', '.join(self.RESULTADO_CENARIO)
+        with self.connect() as conn:
+            cur = conn.cursor()
+            self._scenario_tables(conn)
+            reforma, regeneracao = cur.execute(f"""
+                SELECT
+                    TOTAL(CASE WHEN ManejoAPEX_Final = 'Reforma' THEN Area END),
+                    TOTAL(CASE WHEN ManejoAPEX_Final = 'Regeneração' THEN Area END)
+                FROM {table_name}
+            """).fetchone()
+            cur.execute(
+                "INSERT INTO ApexCenarios (Parametros, ParametrosEfetivos, AreaReforma, AreaRegeneracao) "
+                "VALUES (?, ?, ?, ?)",
+                (json.dumps(parametros, sort_keys=True),
+                 None if efetivos is None else json.dumps(efetivos, sort_keys=True), reforma, regeneracao)
+            )
+            cenario = cur.lastrowid
+            cur.execute(f"""
+                INSERT INTO ApexCenariosResultado (Cenario, {columns})
+                SELECT ?, {columns} FROM {table_name} ORDER BY rowid
+            """, (cenario,))
+            IndexManager(self.schema).provision(conn, ['ApexCenariosResultado'])
+
+        print(f"Scenario {cenario} stored from '{table_name}'.")
+        return cenario
+
+    def _scenario_tables(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ApexCenarios (
+                Cenario INTEGER PRIMARY KEY AUTOINCREMENT,
+                Parametros TEXT,
+                ParametrosEfetivos TEXT,
+                AreaReforma FLOAT,
+                AreaRegeneracao FLOAT
+            )
+        """)
+        # Tables stored before the full parameter row was kept
+        if not self.schema.has_column(conn, 'ApexCenarios', 'ParametrosEfetivos'):
+            conn.execute("ALTER TABLE ApexCenarios ADD COLUMN ParametrosEfetivos TEXT")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ApexCenariosResultado (
+                Cenario INTEGER,
+                Talhao TEXT,
+                Regiao TEXT,
+                Area FLOAT,
+                CustoMadAV FLOAT,
+                AvFinalReforma FLOAT,
+                AvFinalRegeneracao FLOAT,
+                ManejoAPEX_Final TEXT
+            )
+        """)
+
+    def last_scenario(self):
+        """
+        Return the id of the last stored scenario, 0 when there is none.
+        """
+        with self.connect() as conn:
+            if not self.schema.has_table(conn, 'ApexCenarios'):
+                return 0
+            return conn.execute("SELECT COALESCE(MAX(Cenario), 0) FROM ApexCenarios").fetchone()[0]
+
+    def import_scenarios(self, path, desde=0):
+        """
+        Copy the scenarios stored in another database (the copy a sweep process ran on) into this one.
+
+        The scenarios get new ids, in the order they were stored.
+
+        :param path: Path to the other database.
+        :param desde: Only the scenarios with a higher id are copied.
+        :return: The number of scenarios copied.
+        """
+        columns = ', '.join(self.RESULTADO_CENARIO)
+        with sqlite3.connect(path) as origem:
+            try:
+                cenarios = origem.execute(
+                    "SELECT Cenario, Parametros, ParametrosEfetivos, AreaReforma, AreaRegeneracao FROM ApexCenarios "
+                    "WHERE Cenario > ? ORDER BY Cenario", (desde,)).fetchall()
+            except sqlite3.OperationalError:
+                cenarios = []
+            resultados = {cenario: origem.execute(
+                f"SELECT {columns} FROM ApexCenariosResultado WHERE Cenario = ? ORDER BY rowid", (cenario,)).fetchall()
+                for cenario, *_ in cenarios}
+        origem.close()
+        if not cenarios:
+            return 0
+
+        with self.connect() as conn:
+            cur = conn.cursor()
+            self._scenario_tables(conn)
+            for cenario, *row in cenarios:
+                cur.execute("INSERT INTO ApexCenarios (Parametros, ParametrosEfetivos, AreaReforma, AreaRegeneracao) "
+                            "VALUES (?, ?, ?, ?)", row)
+                novo = cur.lastrowid
+                cur.executemany(
+                    f"INSERT INTO ApexCenariosResultado (Cenario, {columns}) "
+                    f"VALUES (?, {', '.join('?' for _ in self.RESULTADO_CENARIO)})",
+                    ((novo, *values) for values in resultados[cenario]))
+            IndexManager(self.schema).provision(conn, ['ApexCenariosResultado'])
+        return len(cenarios)
+
     def fetch_one(self, column, table, condition_column, condition_value):
         """
         Fetch a single value from a specified column in the table based on a condition.
@@ -191,13 +405,7 @@ class Manejo:
         """
         try:
             with self.connect() as conn:
-                cursor = conn.cursor()
-                # Execute the PRAGMA command to get column information
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns_info = cursor.fetchall()
-                # Extract the column names from the information
-                column_names = [column[1] for column in columns_info]
-                return column_names
+                return self.schema.columns(conn, table_name)
         except Exception as e:
             print(f"Erro ao listar colunas da tabela '{table_name}': {e}")
             return []
@@ -220,6 +428,7 @@ class Manejo:
         sqlite3.Error:
             If an error occurs during the creation of the new table.
         """
+        check_identifiers(source_table, new_table, *(columns or []))
         columns_str = ', '.join(columns) if columns else '*'
 
         create_table_query = f"""
@@ -235,6 +444,51 @@ class Manejo:
         except sqlite3.Error as e:
             print(f"An error occurred while creating the table '{new_table}': {e}")
 
+    def create_output_table(self, source_table, new_table, columns, reuse_table=None, reuse_columns=()):
+        """
+        Create a new table from an existing table, already holding every column the pipeline will add.
+
+        The planned columns are added while the table is still empty, so the copied rows are written
+        once with their final width instead of growing with each ALTER TABLE of the steps. With
+        'reuse_table', the rows are copied from a previous output table built from the same source,
+        keeping the values of 'reuse_columns' (the columns of the steps that are not run again).
+
+        Parameters:
+        ----------
+        source_table : str
+            The name of the source table from which data will be copied.
+        new_table : str
+            The name of the new table to create.
+        columns : list of tuple
+            The planned (column, type) pairs, as returned by OutputPlanner.columns.
+        reuse_table : str, optional
+            A previous output table with the same rows (default is None).
+        reuse_columns : list of str, optional
+            The planned columns whose values are copied from 'reuse_table'.
+        """
+        check_identifiers(source_table, new_table, reuse_table, *reuse_columns,
+                          *(name for planned in columns for name in planned))
+        try:
+            with self.connect() as conn:
+                cur = conn.cursor()
+                pages_before = cur.execute("PRAGMA page_count").fetchone()[0]
+                cur.execute(f"CREATE TABLE {new_table} AS SELECT * FROM {source_table} WHERE 0")
+                for column, column_type in columns:
+                    if not self.schema.has_column(conn, new_table, column):
+                        cur.execute(f"ALTER TABLE {new_table} ADD COLUMN {column} {column_type}")
+                source_columns = ', '.join(self.schema.columns(conn, source_table))
+                if reuse_table:
+                    copied = ', '.join([source_columns, *reuse_columns])
+                    cur.execute(f"INSERT INTO {new_table} ({copied}) SELECT {copied} FROM {reuse_table} ORDER BY rowid")
+                    print(f"{len(reuse_columns)} columns reused from '{reuse_table}'.")
+                else:
+                    cur.execute(f"INSERT INTO {new_table} ({source_columns}) SELECT {source_columns} FROM {source_table}")
+                pages_after = cur.execute("PRAGMA page_count").fetchone()[0]
+                print(f"Table '{new_table}' created with {len(columns)} planned columns "
+                      f"({pages_after - pages_before} pages written).")
+        except sqlite3.Error as e:
+            print(f"An error occurred while creating the table '{new_table}': {e}")
+
     def create_table_with_repeated_rows(self, source_table, new_table, max_row_id):
         """
         Create a new table by repeating the rows of the source table until a certain row ID.
@@ -253,8 +507,7 @@ class Manejo:
                 cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
 
                 # Step 2: Retrieve column names and types from the source table, excluding the primary key
-                cursor.execute(f"PRAGMA table_info({source_table})")
-                columns_info = cursor.fetchall()
+                columns_info = self.schema.table_info(conn, source_table)
 
                 column_definitions = []
                 columns_for_select = []
@@ -371,10 +624,7 @@ class Manejo:
                 cursor = conn.cursor()
 
                 # Check if the new table already exists
-                cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{new_table_name}';")
-                result = cursor.fetchone()
-
-                if result:
+                if self.schema.has_table(conn, new_table_name):
                     print(f"Table '{new_table_name}' already exists.")
                 else:
                     # Create the new table with the schema from the existing table
@@ -397,6 +647,7 @@ class Manejo:
         :param regiao_columns: A list of region columns to sum.
         :param row_x: The row number (starting from 1) until which to sum the values.
         """
+        check_identifiers(source_table, new_table, *regiao_columns)
         try:
             with self.connect() as conn:
                 cursor = conn.cursor()
@@ -416,32 +667,22 @@ class Manejo:
                 """
                 cursor.execute(create_table_sql)
 
-                # Step 3: Calculate sums for each Regiao
-                for regiao in regiao_columns:
-                    # Sum up to row_x
-                    cursor.execute(f"""
-                        SELECT SUM({regiao}) 
-                        FROM {source_table} 
-                        WHERE ROWID <= ?
-                    """, (row_x,))
-                    sum_r1 = cursor.fetchone()[0] or 0
-
-                    # Sum from row_x+1 to the end
-                    cursor.execute(f"""
-                        SELECT SUM({regiao}) 
-                        FROM {source_table} 
-                        WHERE ROWID > ?
-                    """, (row_x,))
-                    sum_r2 = cursor.fetchone()[0] or 0
-
-                    total_sum = sum_r1 + sum_r2
-
-                    # Step 4: Insert the calculated sums into the new table
-                    insert_sql = f"""
-                        INSERT INTO {new_table} (Regiao, r1, r2, Total)
-                        VALUES (?, ?, ?, ?)
-                    """
-                    cursor.execute(insert_sql, (regiao, sum_r1, sum_r2, total_sum))
+                # Step 3: Calculate the sums up to row_x and from row_x+1 to the end for every Regiao in one scan
+                sums = ', '.join(f"SUM(CASE WHEN ROWID <= :x THEN {regiao} END), SUM(CASE WHEN ROWID > :x THEN {regiao} END)"
+                                 for regiao in regiao_columns)
+                values = cursor.execute(f"SELECT {sums} FROM {source_table}", {'x': row_x}).fetchone() \
+                    if regiao_columns else ()
+
+                # Step 4: Insert the calculated sums into the new table
+                rows = []
+                for i, regiao in enumerate(regiao_columns):
+                    sum_r1 = values[2 * i] or 0
+                    sum_r2 = values[2 * i + 1] or 0
+                    rows.append((regiao, sum_r1, sum_r2, sum_r1 + sum_r2))
+                cursor.executemany(f"""
+                    INSERT INTO {new_table} (Regiao, r1, r2, Total)
+                    VALUES (?, ?, ?, ?)
+                """, rows)
 
                 conn.commit()
 
@@ -450,7 +691,26 @@ class Manejo:
         except Exception as e:
             print(f"Erro ao criar a tabela '{new_table}': {e}")
 
+    @staticmethod
+    def esp_ab(value, rowid=None):
+        """
+        Convert an 'ESP' spacing such as '3,00 X 2,50' into its area (m²), defaulting to 9.0.
+
+        :param value: The 'ESP' value.
+        :param rowid: The row being converted, used in the error message.
+        :return: The area rounded to 1 decimal place.
+        """
+        if not value or value.lower() in ('', 'INDEFINIDO'):
+            return 9.0
+        try:
+            num1, num2 = map(lambda x: float(x.replace(',', '.')), value.split(' X '))
+            return round(num1 * num2, 1)
+        except ValueError as e:
+            print(f"Error processing value '{value}' for rowid {rowid}: {e}")
+            return 9.0
+
     def ESPAreaBasal(self, table_name):
+        check_identifiers(table_name)
         self.create_table('EspAB', table_name)
         self.create_table('QTDArvIdeal', table_name)
         with self.connect() as conn:
@@ -461,19 +721,7 @@ class Manejo:
             rows = cur.fetchall()
 
             # Prepare data for bulk update
-            update_data = []
-            for rowid, value in rows:
-                if not value or value.lower() in ('', 'INDEFINIDO'):
-                    result = 9.0
-                else:
-                    try:
-                        num1, num2 = map(lambda x: float(x.replace(',', '.')), value.split(' X '))
-                        result = round(num1 * num2, 1)
-                    except ValueError as e:
-                        print(f"Error processing value '{value}' for rowid {rowid}: {e}")
-                        result = 9.0
-
-                update_data.append((result, rowid))
+            update_data = [(self.esp_ab(value, rowid), rowid) for rowid, value in rows]
 
             # Update 'esp_ab' column in bulk
             cur.executemany(f"UPDATE {table_name} SET EspAB = ? WHERE rowid = ?", update_data)
@@ -493,6 +741,9 @@ class Manejo:
         :param order_by_column: The column to order by to determine the last row (e.g., an auto-incremented primary key).
         :return: The last row of the table as a tuple, or None if the table is empty.
         """
+        if self.context is not None and table_name == 'Parametros' and not order_by_column:
+            return self.context.parametros
+
         with self.connect() as conn:
             cursor = conn.cursor()
             if order_by_column:
@@ -525,51 +776,46 @@ class Manejo:
             print(f"Erro ao selecionar valores da coluna '{column_name}' da tabela '{table_name}': {e}")
             return []
 
+    def Anos(self, ref_, col_):
+        """
+        Return the year column of a cost table, read only once per run while a run context is active.
+        """
+        if self.context is None:
+            return self.select_column_values(ref_, col_)
+        key = (ref_.lower(), col_.lower())
+        if key not in self.context.anos:
+            self.context.anos[key] = self.select_column_values(ref_, col_)
+        return self.context.anos[key]
+
     def TaxaVPL(self, ref_, col_):
         juros = (float(self.Parameters('Parametros')[11]))/100
-        ano_taxa = []
-        for i in self.select_column_values(ref_, col_):
-            taxa = 1 / (1 + juros) ** float(i)
-            ano_taxa.append(taxa)
-        return ano_taxa
-
-    def CustosSilviculturaVPL(self, table_ref, new_table_name, col_):
-        # Retrieve the 'ANO' column name and values
-        ano_col = self.list_columns(table_ref)[2]
-        ano_col_values = self.select_column_values(table_ref, ano_col)
-
-        # Retrieve the other column names (regions)
-        cols = self.list_columns(table_ref)[3:]
+        return DISCOUNTS.factors(juros, self.Anos(ref_, col_))
 
-        # Calculate the TaxaVPL values
-        taxas = self.TaxaVPL(table_ref, col_)
-
-        # List to store all results
-        all_results = []
-
-        # Loop through each region, calculate the VPL results and store them
-        for regiao in cols:
-            vals = self.select_column_values(table_ref, regiao)
-            result_values = [taxa * base_value for taxa, base_value in zip(taxas, vals)]
-            all_results.append(result_values)
-
-        # Combine 'ano_col_values' with 'all_results' into a DataFrame
-        data = {ano_col: ano_col_values}
-        for col, results in zip(cols, all_results):
-            data[col] = results
+    def HorizontesVPL(self, ref_, col_):
+        """
+        Return the discount factors of year 7 and of the last year (vpl7, vpl14) used by the cost steps.
+        """
+        juros = (float(self.Parameters('Parametros')[11]))/100
+        return DISCOUNTS.horizons(juros, self.Anos(ref_, col_))
 
-        # Create the DataFrame
-        df = pd.DataFrame(data)
+    def CustosSilviculturaVPL(self, table_ref, new_table_name, col_, total_table=None, limites=(7,)):
+        """
+        Create the VPL table of a silviculture cost table and its r1/r2/Total summary per region.
 
-        # Name of the new table
-        new_table_name = new_table_name
+        Both come from one (years x regions) matrix, see VPLSilvicultura.
 
-        # Insert the DataFrame into the database as a new table
+        :param table_ref: The cost table (e.g. 'CustosSilvicultura_REF_REG').
+        :param new_table_name: The VPL table to create.
+        :param col_: The year column.
+        :param total_table: The summary table to create (default: '<new_table_name>_Total').
+        :param limites: The last row of each rotation segment but the last one (default: year 7).
+        :return: The NULL costs counted as 0, {region column: years}, or None if the tables were not created.
+        """
+        total_table = f"{new_table_name}_Total" if total_table is None else total_table
         try:
-            with self.connect() as conn:
-                # Save the DataFrame to the SQL database
-                df.to_sql(new_table_name, conn, if_exists='replace', index=False)
-                print(f"Tabela '{new_table_name}' criada com sucesso na base de dados.")
+            nulos = VPLSilvicultura(self).calcular(table_ref, new_table_name, total_table, col_, limites)
+            print(f"Tabelas '{new_table_name}' e '{total_table}' criadas com sucesso na base de dados.")
+            return nulos
         except Exception as e:
             print(f"Erro ao criar a tabela '{new_table_name}': {e}")
 
@@ -629,7 +875,7 @@ class Manejo:
             ]
 
             for frente, regioes in updates:
-                regiao_conditions = " OR ".join([f"ClassesInclinacao.REGIAO = '{regiao}'" for regiao in regioes])
+                regiao_placeholders = ', '.join('?' for _ in regioes)
 
                 for column, calculation in update_queries:
                     query = f'''
@@ -637,11 +883,11 @@ class Manejo:
                         SET {column} = (
                             SELECT {calculation}
                             FROM ClassesInclinacao
-                            WHERE {regiao_conditions}
+                            WHERE ClassesInclinacao.REGIAO IN ({regiao_placeholders})
                         )
-                        WHERE ClassesInclinacaoResumo.FRENTE = '{frente}'
+                        WHERE ClassesInclinacaoResumo.FRENTE = ?
                     '''
-                    cur.execute(query)
+                    cur.execute(query, [*regioes, frente])
 
             # Update the TOTAL column by summing GW_CE and PD
             cur.execute('''
@@ -651,89 +897,26 @@ class Manejo:
 
             conn.commit()
 
+        if self.context is not None:
+            self.context.reload('ClassesInclinacaoResumo')
+
     def CustosColheita(self, is_cnb=False):
         """
         Calculate the weighted (ponderado) costs for various 'custos_colheita' tables and update the tables accordingly.
         If 'is_cnb' is True, it calculates values specifically for the 'custos_colheita_cnb' table.
 
+        Every table is weighted at once by PonderacaoColheita and written back with one bulk update.
+
         Parameters:
         ----------
         is_cnb : bool, optional
             If True, calculates values for 'custos_colheita_cnb' by aggregating data from other tables (default is False).
         """
-
-        tables = ['CustosColheitaBO', 'CustosColheitaCO', 'CustosColheitaGN', 'CustosColheitaPO',
-                  'CustosColheitaSB', 'CustosColheitaPI']
-
+        ponderacao = PonderacaoColheita(self)
         if is_cnb:
-            memoria_vmi, memoria_pd, memoria_gw = [], [], []
-            for table in tables:
-                qry = table[-2:]
-                area_frente = self.fetch_one('Area', 'ClassesInclinacaoResumo', 'FRENTE', qry)
-
-                vmi_list = self.fetch_all_one_column(table, 'VMI')
-                pd_list = self.fetch_all_one_column(table, 'PD')
-                gw_list = self.fetch_all_one_column(table, 'GW')
-
-                memoria_vmi.append([x[0] * area_frente for x in vmi_list])
-                memoria_pd.append([x[0] * area_frente for x in pd_list])
-                memoria_gw.append([x[0] * area_frente for x in gw_list])
-
-            area_cnb = self.fetch_one('Area', 'ClassesInclinacaoResumo', 'FRENTE', 'CNB')
-            summed_list_vmi = [sum(values) / area_cnb for values in zip(*memoria_vmi)]
-            summed_list_pd = [sum(values) / area_cnb for values in zip(*memoria_pd)]
-            summed_list_gw = [sum(values) / area_cnb for values in zip(*memoria_gw)]
-
-            with self.connect() as conn:
-                cur = conn.cursor()
-                cur.execute("CREATE TABLE IF NOT EXISTS CustosColheitaCNB AS SELECT * FROM CustosColheitaBOIP")
-                for idx, (new_vmi, new_pd, new_gw) in enumerate(zip(summed_list_vmi, summed_list_pd, summed_list_gw)):
-                    cur.execute(f"UPDATE CustosColheitaCNB SET VMI = ?, PD = ?, GW = ? WHERE id = ?",
-                                (new_vmi, new_pd, new_gw, idx + 1))
-
-            self._calcular_ponderado('CustosColheitaCNB', 'cnb')
+            ponderacao.cnb()
         else:
-            for table in tables:
-                qry = table[-2:]
-                self._calcular_ponderado(table, qry)
-
-    def _calcular_ponderado(self, table, frente):
-        """
-        Calculate and update the weighted (ponderado) costs for a specific 'custos_colheita' table.
-
-        Parameters:
-        ----------
-        table : str
-            The name of the 'custos_colheita' table to update.
-        frente : str
-            The 'FRENTE' value used to fetch weighting factors from 'apoio_inclinacao'.
-        """
-
-        p_pd_frente = self.fetch_one('PD', 'ClassesInclinacaoResumo', 'FRENTE', frente)
-        p_gw_ce_frente = self.fetch_one('GW_CE', 'ClassesInclinacaoResumo', 'FRENTE', frente)
-
-        # Handle NoneType for p_pd_frente and p_gw_ce_frente
-        p_pd_frente = p_pd_frente if p_pd_frente is not None else 0
-        p_gw_ce_frente = p_gw_ce_frente if p_gw_ce_frente is not None else 0
-
-        pd_list = self.fetch_all_one_column(table, 'PD')
-        gw_list = self.fetch_all_one_column(table, 'GW')
-
-        final_pd = [x * p_pd_frente if x is not None else 0 for x in pd_list]
-        final_gw = [x * p_gw_ce_frente if x is not None else 0 for x in gw_list]
-        ponderado_pd_gw = [pd + gw for pd, gw in zip(final_pd, final_gw)]
-
-        with self.connect() as conn:
-            cur = conn.cursor()
-
-            # Check if the 'POND' column already exists
-            cur.execute(f"PRAGMA table_info({table})")
-            columns = [col[1] for col in cur.fetchall()]
-            if 'POND' not in columns:
-                cur.execute(f"ALTER TABLE {table} ADD COLUMN POND FLOAT")
-
-            for idx, pond in enumerate(ponderado_pd_gw):
-                cur.execute(f"UPDATE {table} SET POND = ? WHERE id = ?", (pond, idx + 1))
+            ponderacao.ponderar()
 
     def update_curva_and_vol7(self, table_name):
         """
@@ -750,36 +933,25 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Create necessary columns if they don't exist
         self.create_table('Curva', table_name)
         self.create_table('Fator', table_name)
         self.create_table('Vol7', table_name)
 
-        # Mapping between regions in 'CurvaProdutividade' and the abbreviations in 'table_name.Regiao'
-        region_map = {
-            'Sabinopolis': 'SA',
-            'Cocais': 'CO',
-            'Piracicaba': 'PI',
-            'SantaBarbara': 'SB',
-            'BeloOriente': 'BO',
-            'Ipaba': 'IP',
-            'Pompeu': 'PO',
-            'Virginopolis': 'VI'
-        }
-
         with self.connect() as conn:
             cur = conn.cursor()
 
-            # Update the 'Curva' column
-            for region, abbreviation in region_map.items():
-                cur.execute(f"""
-                    UPDATE {table_name}
-                    SET Curva = (
-                        SELECT {region} FROM CurvaProdutividade
-                        WHERE CurvaProdutividade.Idade = {table_name}.IdadeClasse
-                    )
-                    WHERE Regiao = '{abbreviation}' AND Curva IS NULL
-                """)
+            # Update the 'Curva' column from the long-format copy of 'CurvaProdutividade', all regions at once
+            cur.execute(f"""
+                UPDATE {table_name}
+                SET Curva = (
+                    SELECT Valor FROM CurvaProdutividade_Longo
+                    WHERE CurvaProdutividade_Longo.Regiao = {table_name}.Regiao
+                    AND CurvaProdutividade_Longo.Idade = {table_name}.IdadeClasse
+                )
+                WHERE Curva IS NULL
+            """)
 
             # Set 'Curva' to a default value of 130.00 if still NULL
             cur.execute(f"""
@@ -818,6 +990,7 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Create necessary columns if they don't exist
         self.create_table('FatoresBrotacao', table_name)
         self.create_table('FatoresTalhadia', table_name)
@@ -868,10 +1041,10 @@ class Manejo:
             cur.execute(f"""
                 UPDATE {table_name}
                 SET FatoresTalhadia = CASE
-                    WHEN Regime = 'R' THEN (FatoresBrotacao / 100) * ({perda} / 100) * ({r2} / 100) * ({col} / 100)
-                    ELSE (FatoresBrotacao / 100) * ({perda} / 100) * ({col} / 100)
+                    WHEN Regime = 'R' THEN (FatoresBrotacao / 100) * (:perda / 100) * (:r2 / 100) * (:col / 100)
+                    ELSE (FatoresBrotacao / 100) * (:perda / 100) * (:col / 100)
                 END
-            """)
+            """, {'perda': perda, 'r2': r2, 'col': col})
 
             # Update vol7_2c
             cur.execute(f"""
@@ -882,8 +1055,8 @@ class Manejo:
             # Update vol7_1c
             cur.execute(f"""
                 UPDATE {table_name}
-                SET Vol7_1ROT = Vol7 * {1 + (value4 / 100)}
-            """)
+                SET Vol7_1ROT = Vol7 * ?
+            """, (1 + (value4 / 100),))
 
         print(f"Updates for '{table_name}' completed: FatoresBrotacao, FatoresTalhadia, Vol7_2ROT, Vol7_1ROT.")
 
@@ -907,6 +1080,7 @@ class Manejo:
         vol_column_2 : str
             The name of the second volume column (e.g., 'Vol7_2ROT' or 'Vol7_1C').
         """
+        check_identifiers(table_name, ref_vpl_table, total_table, new_column_name, vol_column_1, vol_column_2)
         # Ensure the target column exists
         self.create_table(new_column_name, table_name)
 
@@ -914,8 +1088,7 @@ class Manejo:
             cur = conn.cursor()
 
             # Fetch the required 'taxavpl' values in a single query
-            taxas = self.TaxaVPL(ref_vpl_table, 'ANO')
-            vpl7, vpl14 = float(taxas[7]), float(taxas[-1])
+            vpl7, vpl14 = self.HorizontesVPL(ref_vpl_table, 'ANO')
 
             # Prepare and execute the update statement
             cur.execute(f"""
@@ -924,8 +1097,8 @@ class Manejo:
                     SELECT TOTAL
                     FROM {total_table}
                     WHERE {total_table}.Regiao = {table_name}.Regiao
-                ) / ({vpl7} * {vol_column_1} + {vpl14} * {vol_column_2})
-            """)
+                ) / (:vpl7 * {vol_column_1} + :vpl14 * {vol_column_2})
+            """, {'vpl7': vpl7, 'vpl14': vpl14})
 
         print(f"Column '{new_column_name}' in table '{table_name}' has been updated.")
 
@@ -938,20 +1111,20 @@ class Manejo:
         :param cols: A list of columns in 'table_name' to update.
         :param row_id: The identifier for the specific row in 'table_name' to update.
         """
+        check_identifiers(table_name, *cols)
+        custo_terra = self.run_context().lookup('CustoTerra')
+
         with self.connect() as conn:
             cur = conn.cursor()
 
             for col in cols:
+                # A region without a 'CustoTerra' row yields NULL, as the former subquery did
                 cur.execute(
                     f"""
                     UPDATE {table_name}
-                    SET {col} = {col} + (
-                        SELECT CustoTerra.Custo
-                        FROM CustoTerra
-                        WHERE CustoTerra.Regiao = ?
-                    )
+                    SET {col} = {col} + ?
                     WHERE rowid = ? AND {col} IS NOT NULL
-                    """, (col, row_id)
+                    """, (custo_terra.get(col), row_id)
                 )
 
             conn.commit()
@@ -972,52 +1145,37 @@ class Manejo:
         acrescimo_colheita : float, optional
             The additional increase for 'REF_REF' calculations (default is None).
         """
+        check_identifiers(table_name, suffixes=(ref_type, rot_type))
         # Ensure the target columns exist
         self.create_table(f'CustosColheitaPond', table_name)
         self.create_table(f'CustosColheitaPond_{rot_type}', table_name)
         self.create_table(f'CustosColheita_{ref_type}', table_name)
 
-        # Map regions to their corresponding 'custos_colheita' tables
-        region_to_table_map = {
-            'SA': 'CustosColheitaGN', 'VI': 'CustosColheitaGN',
-            'BO': 'CustosColheitaBO', 'IP': 'CustosColheitaBO',
-            'PO': 'CustosColheitaPO',
-            'CO': 'CustosColheitaCO',
-            'SB': 'CustosColheitaSB',
-            'PI': 'CustosColheitaPI'
-        }
-
         with self.connect() as conn:
             cur = conn.cursor()
 
             # Fetch the 'taxavpl' values from the nominal table for rowid 8 and 14
-            taxas = self.TaxaVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
-            vpl7, vpl14 = float(taxas[7]), float(taxas[-1])
-
-            # Update 'CustosColheitaPond' based on the mapping
-            for regiao, colheita_table in region_to_table_map.items():
-                cur.execute(f"""
-                    UPDATE {table_name}
-                    SET CustosColheitaPond = (
-                        SELECT POND 
-                        FROM {colheita_table} 
-                        WHERE PROD <= Vol7 
-                        ORDER BY PROD DESC LIMIT 1
-                    )
-                    WHERE Regiao = '{regiao}'
-                """)
-
-            # Update 'CustosColheitaPond_2ROT' or 'CustosColheitaPond_1ROT' similarly
-            for regiao, colheita_table in region_to_table_map.items():
+            vpl7, vpl14 = self.HorizontesVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
+
+            # One PROD -> POND as-of index per region, from its 'custos_colheita' table, in a single TEMP table
+            by_table, indexes = {}, {}
+            for regiao, colheita_table in self.TABELAS_COLHEITA.items():
+                if colheita_table not in by_table:
+                    by_table[colheita_table] = AsOfIndex.from_table(conn, colheita_table, 'PROD', 'POND', self.schema)
+                indexes[regiao] = by_table[colheita_table]
+            AsOfIndex.create_table(conn, 'AsOfColheita', indexes)
+
+            # Update 'CustosColheitaPond' and 'CustosColheitaPond_2ROT' or 'CustosColheitaPond_1ROT', all regions at once
+            for column, volume in (('CustosColheitaPond', 'Vol7'), (f'CustosColheitaPond_{rot_type}', f'Vol7_{rot_type}')):
                 cur.execute(f"""
                     UPDATE {table_name}
-                    SET CustosColheitaPond_{rot_type}= (
-                        SELECT POND 
-                        FROM {colheita_table} 
-                        WHERE PROD <= Vol7_{rot_type} 
-                        ORDER BY PROD DESC LIMIT 1
+                    SET {column} = (
+                        SELECT Valor
+                        FROM temp.AsOfColheita
+                        WHERE Grupo = {table_name}.Regiao AND Chave <= {table_name}.{volume}
+                        ORDER BY Chave DESC LIMIT 1
                     )
-                    WHERE Regiao = '{regiao}'
+                    WHERE Regiao IN (SELECT Grupo FROM temp.AsOfColheita)
                 """)
 
             # Calculate and update 'CustosColheita'
@@ -1025,19 +1183,19 @@ class Manejo:
                 cur.execute(f"""
                     UPDATE {table_name}
                     SET CustosColheita_{ref_type} = (
-                        Vol7 * CustosColheitaPond * {vpl7} + 
-                        Vol7_{rot_type} * CustosColheitaPond_{rot_type} * {vpl14} * 
-                        (1 + {acrescimo_colheita})
-                    ) / (Vol7 * {vpl7} + Vol7_{rot_type} * {vpl14})
-                """)
+                        Vol7 * CustosColheitaPond * :vpl7 + 
+                        Vol7_{rot_type} * CustosColheitaPond_{rot_type} * :vpl14 * 
+                        (1 + :acrescimo_colheita)
+                    ) / (Vol7 * :vpl7 + Vol7_{rot_type} * :vpl14)
+                """, {'vpl7': vpl7, 'vpl14': vpl14, 'acrescimo_colheita': acrescimo_colheita})
             else:
                 cur.execute(f"""
                     UPDATE {table_name}
                     SET CustosColheita_{ref_type} = (
-                        Vol7 * CustosColheitaPond * {vpl7} + 
-                        Vol7_{rot_type} * CustosColheitaPond_{rot_type} * {vpl14}
-                    ) / (Vol7 * {vpl7} + Vol7_{rot_type} * {vpl14})
-                """)
+                        Vol7 * CustosColheitaPond * :vpl7 + 
+                        Vol7_{rot_type} * CustosColheitaPond_{rot_type} * :vpl14
+                    ) / (Vol7 * :vpl7 + Vol7_{rot_type} * :vpl14)
+                """, {'vpl7': vpl7, 'vpl14': vpl14})
 
         print(
             f"Columns 'CustosColheitaPond_{ref_type}', 'CustosColheitaPond_{rot_type}_{ref_type}', and 'CustosColheita_{ref_type}' in table '{table_name}' have been updated.")
@@ -1052,12 +1210,12 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name, suffixes=(ref_type, rot_type))
         # Ensure the target column exists
         self.create_table(f'CustosApoioColheita_{ref_type}', table_name)
 
         # Fetch the 'taxavpl' values from the nominal table for rowid 8 and 14
-        taxas = self.TaxaVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
-        vpl7, vpl14 = float(taxas[7]), float(taxas[-1])
+        vpl7, vpl14 = self.HorizontesVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
 
         with self.connect() as conn:
             cur = conn.cursor()
@@ -1066,12 +1224,12 @@ class Manejo:
             cur.execute(f"""
                 UPDATE {table_name}
                 SET CustosApoioColheita_{ref_type} = (
-                    SELECT (ApoioColheita * ({vpl7} + {vpl14})) / NULLIF(Vol7 * {vpl7} + Vol7_{rot_type} * {vpl14}, 0)
+                    SELECT (ApoioColheita * (:vpl7 + :vpl14)) / NULLIF(Vol7 * :vpl7 + Vol7_{rot_type} * :vpl14, 0)
                     FROM OutrosCustos
                     WHERE OutrosCustos.Regiao = {table_name}.Regiao
                     LIMIT 1
                 )
-            """)
+            """, {'vpl7': vpl7, 'vpl14': vpl14})
 
         print(f"Column 'CustosApoioColheita_{ref_type}' in table '{table_name}' has been updated.")
 
@@ -1085,12 +1243,12 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name, suffixes=(ref_type, rot_type))
         # Ensure the target column exists
         self.create_table(f'CustosColheitaEstradaInterna_{ref_type}', table_name)
 
         # Fetch the 'taxavpl' values from the nominal table for rowid 8 and 14
-        taxas = self.TaxaVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
-        vpl7, vpl14 = float(taxas[7]), float(taxas[-1])
+        vpl7, vpl14 = self.HorizontesVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
 
         with self.connect() as conn:
             cur = conn.cursor()
@@ -1099,12 +1257,12 @@ class Manejo:
             cur.execute(f"""
                 UPDATE {table_name}
                 SET CustosColheitaEstradaInterna_{ref_type} = (
-                    SELECT (EstInterna * ({vpl7} + {vpl14})) / NULLIF(Vol7 * {vpl7} + Vol7_{rot_type} * {vpl14}, 0)
+                    SELECT (EstInterna * (:vpl7 + :vpl14)) / NULLIF(Vol7 * :vpl7 + Vol7_{rot_type} * :vpl14, 0)
                     FROM OutrosCustos
                     WHERE OutrosCustos.Regiao = {table_name}.Regiao
                     LIMIT 1
                 )
-            """)
+            """, {'vpl7': vpl7, 'vpl14': vpl14})
 
         print(f"Column 'CustosColheitaEstradaInterna_{ref_type}' in table '{table_name}' has been updated.")
 
@@ -1118,6 +1276,7 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name, suffixes=(ref_type,))
         # Ensure the target column exists
         self.create_table(f'CustosColheitaTotal_{ref_type}', table_name)
 
@@ -1169,12 +1328,15 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Ensure necessary columns exist
         self.create_table('CustosTransporte', table_name)
         self.create_table('DistROD', table_name)
         self.create_table('CustoEstradaExterna', table_name)
         self.create_table('CustoFerroviariaMovPatio', table_name)
 
+        context = self.run_context()
+
         with self.connect() as conn:
             cur = conn.cursor()
 
@@ -1187,44 +1349,27 @@ class Manejo:
                 END
             """)
 
-            # Mapping between region names and their corresponding codes
-            region_map = {
-                'Sabinopolis': 'SA',
-                'Cocais': 'CO',
-                'Piracicaba': 'PI',
-                'SantaBarbara': 'SB',
-                'BeloOriente': 'BO',
-                'Ipaba': 'IP',
-                'Pompeu': 'PO',
-                'Virginopolis': 'VI'
-            }
-
-            # Update 'CustosTransporte' based on road distance
-            for region_name, region_code in region_map.items():
-                cur.execute(f"""
-                    UPDATE {table_name}
-                    SET CustosTransporte = (
-                        SELECT {region_name} FROM CustosTransRod
-                        WHERE CustosTransRod.Distancia = ROUND(({table_name}.DistROD + 2) / 5) * 5
-                    )
-                    WHERE Regiao = '{region_code}' AND CustosTransporte IS NULL
-                """)
-
-            # Update 'CustoEstradaExterna' based on region
+            # Update 'CustosTransporte' based on road distance, from the long-format copy of 'CustosTransRod'
             cur.execute(f"""
                 UPDATE {table_name}
-                SET CustoEstradaExterna = (
-                    SELECT Custo FROM CustoEstExterna
-                    WHERE CustoEstExterna.Regiao = {table_name}.Regiao
+                SET CustosTransporte = (
+                    SELECT Valor FROM CustosTransRod_Longo
+                    WHERE CustosTransRod_Longo.Regiao = {table_name}.Regiao
+                    AND CustosTransRod_Longo.Distancia = ROUND(({table_name}.DistROD + 2) / 5) * 5
                 )
+                WHERE CustosTransporte IS NULL
             """)
 
-            # Sum costs from 'CustoFerr' and 'MovPatio' tables and update the target table
-            cur.execute("SELECT Regiao, Custo FROM CustoFerr")
-            custos_ferr_vals = cur.fetchall()
+            # Update 'CustoEstradaExterna' based on region
+            custo_sql, custo_params = context.case_map('Regiao', context.lookup('CustoEstExterna'))
+            cur.execute(f"""
+                UPDATE {table_name}
+                SET CustoEstradaExterna = {custo_sql}
+            """, custo_params)
 
-            cur.execute("SELECT Regiao, Custo FROM CustoMovPatio")
-            movpatio_vals = cur.fetchall()
+            # Sum costs from 'CustoFerr' and 'MovPatio' tables and update the target table
+            custos_ferr_vals = context.rows('CustoFerr')
+            movpatio_vals = context.rows('CustoMovPatio')
 
             combined_vals = self.combine_third_values(custos_ferr_vals, movpatio_vals)
 
@@ -1248,6 +1393,7 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name, suffixes=(ref_type, rot_type))
         # Ensure the target column exists
         self.create_table(f'CustosTAXAADM_{ref_type}', table_name)
 
@@ -1255,8 +1401,7 @@ class Manejo:
             cur = conn.cursor()
 
             # Fetch the required 'taxavpl' values in a single query
-            taxas = self.TaxaVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
-            vpl7, vpl14 = float(taxas[7]), float(taxas[-1])
+            vpl7, vpl14 = self.HorizontesVPL(f'CustosSilvicultura_{ref_type}_VPL', 'ANO')
 
             # Prepare and execute the update statement
             cur.execute(f"""
@@ -1265,8 +1410,8 @@ class Manejo:
                     SELECT (ADM + Taxas) 
                     FROM OutrosCustos 
                     WHERE OutrosCustos.Regiao = {table_name}.Regiao
-                ) * ({vpl7} + {vpl14}) / NULLIF(Vol7 * {vpl7} + Vol7_{rot_type} * {vpl14}, 0)
-            """)
+                ) * (:vpl7 + :vpl14) / NULLIF(Vol7 * :vpl7 + Vol7_{rot_type} * :vpl14, 0)
+            """, {'vpl7': vpl7, 'vpl14': vpl14})
 
         print(f"Column 'CustosTAXAADM_{ref_type}' in table '{table_name}' has been updated.")
 
@@ -1279,7 +1424,10 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name, suffixes=(ref_type,))
         self.create_table(f'CustosPostoFabrica_{ref_type}', table_name)
+        context = self.run_context()
+        regioes_baixas = [regiao for regiao, elev in context.rows('Elevacao') if elev == 'Região Baixa']
         with self.connect() as conn:
             cur = conn.cursor()
 
@@ -1292,19 +1440,14 @@ class Manejo:
                 UPDATE {table_name}
                 SET CustosPostoFabrica_{ref_type} = 
                     CASE 
-                        WHEN EXISTS (
-                            SELECT 1 
-                            FROM ELEVACAO 
-                            WHERE ELEVACAO.Regiao = {table_name}.Regiao 
-                            AND ELEVACAO.Elev = 'Região Baixa'
-                        ) THEN (
+                        WHEN Regiao IN ({', '.join(f':baixa{i}' for i in range(len(regioes_baixas)))}) THEN (
                             COALESCE(CustoMADPE_{ref_type}, 0) + 
                             COALESCE(CustosColheitaTotal_{ref_type}, 0) + 
                             COALESCE(CustosTransporte, 0) + 
                             COALESCE(CustoEstradaExterna, 0) + 
                             COALESCE(CustoFerroviariaMovPatio, 0) + 
                             COALESCE(CustosTAXAADM_{ref_type}, 0)
-                        ) * (100 - {TRB}) / 100
+                        ) * (100 - :TRB) / 100
                         ELSE (
                             COALESCE(CustoMADPE_{ref_type}, 0) + 
                             COALESCE(CustosColheitaTotal_{ref_type}, 0) + 
@@ -1312,9 +1455,9 @@ class Manejo:
                             COALESCE(CustoEstradaExterna, 0) + 
                             COALESCE(CustoFerroviariaMovPatio, 0) + 
                             COALESCE(CustosTAXAADM_{ref_type}, 0)
-                        ) * (100 - {TRA}) / 100
+                        ) * (100 - :TRA) / 100
                     END
-            """)
+            """, {'TRA': TRA, 'TRB': TRB, **{f'baixa{i}': regiao for i, regiao in enumerate(regioes_baixas)}})
 
         print(f"Column 'CustosPostoFabrica_{ref_type}' in table '{table_name}' has been updated.")
 
@@ -1328,6 +1471,7 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Ensure the target column exists
         self.create_table('CustoMadAV', table_name)
 
@@ -1356,7 +1500,9 @@ class Manejo:
             A list of dictionaries, each containing:
             - 'columns': List of column names to ensure exist in the table.
             - 'query': The SQL query to execute for the update.
+            - 'params' (optional): Values bound to the query placeholders.
         """
+        check_identifiers(table_name)
         # Ensure the target columns exist
         for update in updates:
             for column in update['columns']:
@@ -1365,7 +1511,7 @@ class Manejo:
         with self.connect() as conn:
             cur = conn.cursor()
             for update in updates:
-                cur.execute(update['query'])
+                cur.execute(update['query'], update.get('params', []))
 
         print(f"Table '{table_name}' has been updated with the specified operations.")
 
@@ -1373,180 +1519,157 @@ class Manejo:
         """
         Perform the entire economic evaluation and update the table with the necessary columns.
 
+        The rules are evaluated in a single UPDATE: a chain of subqueries computes each Av* column
+        from the row and from the columns computed before it (each level runs once per row), and the
+        table is scanned and written once. The rules that used to share a multi-column UPDATE still
+        read the value their target had before the evaluation ('<column>_old'), as they did then.
+
         Parameters:
         ----------
         table_name : str
             The name of the table to update.
         """
-        fave = (float(self.Parameters('Parametros')[12])) / 100
-        ra3 = float(self.Parameters('Parametros')[6])
-        rb3 = float(self.Parameters('Parametros')[7])
-        ra2 = float(self.Parameters('Parametros')[8])
-        rb2 = float(self.Parameters('Parametros')[9])
+        check_identifiers(table_name)
+        params = {
+            'fave': (float(self.Parameters('Parametros')[12])) / 100,
+            'ra3': float(self.Parameters('Parametros')[6]),
+            'rb3': float(self.Parameters('Parametros')[7]),
+            'ra2': float(self.Parameters('Parametros')[8]),
+            'rb2': float(self.Parameters('Parametros')[9]),
+        }
 
-        updates = [
-            {
-                'columns': ['AVAreaReforma'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AVAreaReforma = CASE 
-                        WHEN Vol7_2ROT = 0 OR CustoMadAV > {fave} THEN 0
-                        ELSE Area
-                    END
-                """
-            },
-            {
-                'columns': ['AvAreaNaoAvaliada'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvAreaNaoAvaliada = CASE
-                        WHEN CustoMadAV = 0 THEN Area
-                        ELSE 0
-                    END
-                """
-            },
-            {
-                'columns': ['AvAreaRegeneracao'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvAreaRegeneracao = CASE
-                        WHEN Vol7_2ROT = 0 OR CustoMadAV <= {fave} THEN 0
-                        ELSE Area
-                    END
-                """
-            },
+        context = self.run_context()
+        # The former subquery matched Elevacao.Regiao against itself, so it always took the first Elevacao row
+        elevacao = context.rows('Elevacao')
+        params['reg_alta_baixa'] = None
+        if elevacao:
+            params['reg_alta_baixa'] = 'RB' if elevacao[0][1] == 'REGIÃO BAIXA' else 'RA'
+        # The sub-region of each talhão is read as an integer code from the Talhao dimension
+        dimension = TalhaoDimension(self.schema)
+        with self.connect() as conn:
+            dimension.extend(conn, {table_name: ['Talhao']})
+            sub_regioes = dimension.codes(conn, 'SubRegiao')
+        baixa_encosta = ', '.join(str(sub_regioes[sub]) for sub in ('BA', 'MA') if sub in sub_regioes)
+        baixada = ', '.join(str(sub_regioes[sub]) for sub in ('PD',) if sub in sub_regioes)
+        prod_min = {sub_regioes[sub]: value for sub, value in context.lookup('ProdMin').items() if sub in sub_regioes}
+        prod_min_sql, prod_min_params = context.case_map('dim.SubRegiao', prod_min, name='prod_min')
+        params.update(prod_min_params)
+
+        # Input columns, the old values read by the former multi-column UPDATEs and the lookups of the row
+        inputs = f"""
+            {table_name}.rowid AS rid, Area, Idade, {table_name}.Regime, {table_name}.Talhao, Fustes, DCR_MatGen, EspAB,
+            Vol7, Vol7_2ROT, CustoMadAV, ArvMin AS ArvMin_old, CloneSemente AS CloneSemente_old, ProdMin AS ProdMin_old,
+            CASE
+                WHEN dim.SubRegiao IN ({baixa_encosta}) THEN (
+                    SELECT RegBaixaEncosta
+                    FROM RTMaterialGenetico
+                    WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
+                )
+                WHEN dim.SubRegiao IN ({baixada}) THEN (
+                    SELECT RegBaixaBaixada
+                    FROM RTMaterialGenetico
+                    WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
+                )
+                ELSE (
+                    SELECT RegAlta
+                    FROM RTMaterialGenetico
+                    WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
+                )
+            END AS FatorBrotacaoMatGen,
+            {prod_min_sql} AS ProdMin
+        """
+
+        # Rules by level: each one reads the inputs and the columns of the levels before it
+        levels = [
             {
-                'columns': ['RegAltaBaixa'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET RegAltaBaixa = (
-                        SELECT CASE 
-                            WHEN Elevacao.Elev = 'REGIÃO BAIXA' THEN 'RB' 
-                            ELSE 'RA' 
-                        END
-                        FROM Elevacao
-                        WHERE Regiao = Elevacao.regiao
-                    )
-                """
+                'AVAreaReforma': "CASE WHEN Vol7_2ROT = 0 OR CustoMadAV > :fave THEN 0 ELSE Area END",
+                'AvAreaNaoAvaliada': "CASE WHEN CustoMadAV = 0 THEN Area ELSE 0 END",
+                'AvAreaRegeneracao': "CASE WHEN Vol7_2ROT = 0 OR CustoMadAV <= :fave THEN 0 ELSE Area END",
+                'RegAltaBaixa': ":reg_alta_baixa",
+                'ArvMin': """CASE
+                        WHEN :reg_alta_baixa = 'RA' AND EspAB < 9 THEN :ra2
+                        WHEN :reg_alta_baixa = 'RB' AND EspAB < 9 THEN :rb2
+                        WHEN :reg_alta_baixa = 'RA' AND EspAB >= 9 THEN :ra3
+                        WHEN :reg_alta_baixa = 'RB' AND EspAB >= 9 THEN :rb3
+                        ELSE ArvMin_old
+                    END""",
+                'CloneSemente': """CASE
+                        WHEN DCR_MatGen IN ('SEM0001', 'E-GRAND', 'E-RESIN', 'PINUS', 'E-GLOBU', 'E-UROPH', 'E-TOREL', 'E-SALIG') THEN 'Semente'
+                        ELSE 'Clone'
+                    END""",
             },
             {
-                'columns': ['ArvMin', 'AvFustesAreaReforma'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET ArvMin = CASE
-                        WHEN RegAltaBaixa = 'RA' AND EspAB < 9 THEN {ra2}
-                        WHEN RegAltaBaixa = 'RB' AND EspAB < 9 THEN {rb2}
-                        WHEN RegAltaBaixa = 'RA' AND EspAB >= 9 THEN {ra3}
-                        WHEN RegAltaBaixa = 'RB' AND EspAB >= 9 THEN {rb3}
-                        ELSE ArvMin
-                    END,
-                    AvFustesAreaReforma = CASE
-                        WHEN Fustes < ArvMin AND AvAreaRegeneracao > 0 THEN Area
-                        ELSE 0
-                    END
-                """
+                'AvFustesAreaReforma': "CASE WHEN Fustes < ArvMin_old AND AvAreaRegeneracao > 0 THEN Area ELSE 0 END",
             },
             {
-                'columns': ['CloneSemente', 'AvCSAreaReforma'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET CloneSemente = CASE
-                        WHEN DCR_MatGen IN ('SEM0001', 'E-GRAND', 'E-RESIN', 'PINUS', 'E-GLOBU', 'E-UROPH', 'E-TOREL', 'E-SALIG') THEN 'Semente'
-                        ELSE 'Clone'
-                    END,
-                    AvCSAreaReforma = CASE
-                        WHEN AvFustesAreaReforma = 0 AND CloneSemente = 'Semente' THEN AvAreaRegeneracao
+                'AvCSAreaReforma': """CASE
+                        WHEN AvFustesAreaReforma = 0 AND CloneSemente_old = 'Semente' THEN AvAreaRegeneracao
                         ELSE 0
-                    END
-                """
+                    END""",
             },
             {
-                'columns': ['AvR2AreaReforma'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvR2AreaReforma = CASE
+                'AvR2AreaReforma': """CASE
                         WHEN AvCSAreaReforma = 0 AND AvFustesAreaReforma = 0 AND Regime = 'R' THEN AvAreaRegeneracao
                         ELSE 0
-                    END
-                """
-            },
-            {
-                'columns': ['FatorBrotacaoMatGen'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET FatorBrotacaoMatGen = CASE
-                        WHEN SUBSTR(Talhao, 5, 2) IN ('BA', 'MA') THEN (
-                            SELECT RegBaixaEncosta
-                            FROM RTMaterialGenetico
-                            WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
-                        )
-                        WHEN SUBSTR(Talhao, 5, 2) = 'PD' THEN (
-                            SELECT RegBaixaBaixada
-                            FROM RTMaterialGenetico
-                            WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
-                        )
-                        ELSE (
-                            SELECT RegAlta
-                            FROM RTMaterialGenetico
-                            WHERE RTMaterialGenetico.DCR_MatGen = {table_name}.DCR_MatGen
-                        )
-                    END
-                """
+                    END""",
             },
             {
-                'columns': ['AvMGNR'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvMGNR = CASE
+                'AvMGNR': """CASE
                         WHEN AvAreaRegeneracao > 0 AND AvFustesAreaReforma = 0 AND AvCSAreaReforma = 0 AND AvR2AreaReforma = 0 AND FatorBrotacaoMatGen = 0
                         THEN Area
                         ELSE 0
-                    END
-                """
+                    END""",
             },
             {
-                'columns': ['AvMaior15AreaReforma'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvMaior15AreaReforma = CASE
+                'AvMaior15AreaReforma': """CASE
                         WHEN Idade > 15 AND AvFustesAreaReforma = 0 AND AvCSAreaReforma = 0 AND AvR2AreaReforma = 0 AND AvMGNR = 0
                         THEN Area
                         ELSE 0
-                    END
-                """
+                    END""",
             },
             {
-                'columns': ['AvBaixaProd', 'ProdMin'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET ProdMin = (
-                        SELECT ProdMin 
-                        FROM ProdMin 
-                        WHERE ProdMin.Regiao = SUBSTR({table_name}.Talhao, 5, 2)
-                    ),
-                    AvBaixaProd = CASE
-                        WHEN ProdMin > Vol7 AND AvFustesAreaReforma = 0 AND AvCSAreaReforma = 0 AND AvR2AreaReforma = 0 AND AvMGNR = 0 AND AvMaior15AreaReforma = 0
+                'AvBaixaProd': """CASE
+                        WHEN ProdMin_old > Vol7 AND AvFustesAreaReforma = 0 AND AvCSAreaReforma = 0 AND AvR2AreaReforma = 0 AND AvMGNR = 0 AND AvMaior15AreaReforma = 0
                         THEN Area
                         ELSE 0
-                    END
-                """
+                    END""",
             },
             {
-                'columns': ['AvAreaReformaSemi'],
-                'query': f"""
-                    UPDATE {table_name}
-                    SET AvAreaReformaSemi = AvFustesAreaReforma + AvCSAreaReforma + AvR2AreaReforma + AvMGNR + AvMaior15AreaReforma
-                """
+                'AvAreaReformaSemi': "AvFustesAreaReforma + AvCSAreaReforma + AvR2AreaReforma + AvMGNR + AvMaior15AreaReforma",
             },
             {
-                'columns': ['AvFinalNaoAvaliado', 'AvFinalAnalise', 'AvFinalReforma', 'AvFinalRegeneracao'],
+                'AvFinalNaoAvaliado': "AvAreaNaoAvaliada",
+                'AvFinalAnalise': "AvBaixaProd",
+                'AvFinalReforma': "AvAreaReformaSemi + AVAreaReforma",
+                'AvFinalRegeneracao': "AvAreaRegeneracao - AvAreaReformaSemi - AvBaixaProd",
+            },
+        ]
+
+        # 'OFFSET 0' keeps each level a separate subquery, so its rules are evaluated once per row
+        # instead of being copied into every rule of the next levels
+        query = f"""
+            SELECT {inputs}
+            FROM {table_name} LEFT JOIN {TalhaoDimension.TABLE} AS dim ON dim.Talhao = {table_name}.Talhao
+        """
+        for level in levels:
+            rules = ', '.join(f"{expression} AS {column}" for column, expression in level.items())
+            query = f"SELECT *, {rules} FROM ({query} LIMIT -1 OFFSET 0)"
+
+        # In the order the former UPDATEs created them
+        columns = ['AVAreaReforma', 'AvAreaNaoAvaliada', 'AvAreaRegeneracao', 'RegAltaBaixa', 'ArvMin',
+                   'AvFustesAreaReforma', 'CloneSemente', 'AvCSAreaReforma', 'AvR2AreaReforma', 'FatorBrotacaoMatGen',
+                   'AvMGNR', 'AvMaior15AreaReforma', 'AvBaixaProd', 'ProdMin', 'AvAreaReformaSemi', 'AvFinalNaoAvaliado',
+                   'AvFinalAnalise', 'AvFinalReforma', 'AvFinalRegeneracao']
+        updates = [
+            {
+                'columns': columns,
                 'query': f"""
                     UPDATE {table_name}
-                    SET AvFinalNaoAvaliado = AvAreaNaoAvaliada,
-                        AvFinalAnalise = AvBaixaProd,
-                        AvFinalReforma = AvAreaReformaSemi + AvAreaReforma,
-                        AvFinalRegeneracao = AvAreaRegeneracao - AvAreaReformaSemi - AvBaixaProd
-                """
+                    SET {', '.join(f"{column} = av.{column}" for column in columns)}
+                    FROM ({query}) AS av
+                    WHERE {table_name}.rowid = av.rid
+                """,
+                'params': params
             }
         ]
 
@@ -1556,65 +1679,35 @@ class Manejo:
     def t700(self, table_name):
         """
         Update the specified table with the T700-related columns, including 'cod_projeto', 'cod_talhao',
-        'cod_chave', 'cod_chave_ref', and 'remanescente'. The function processes these columns based on the
-        structure of 'talhao_novo' and other conditions.
+        'cod_chave', 'cod_chave_ref', and 'remanescente'. The keys are derived from the structure of the
+        talhão code once per talhão, in the Talhao dimension, and copied to the table with a single UPDATE.
 
         Parameters:
         ----------
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Ensure the target columns exist
         columns_to_create = ['cod_projeto', 'cod_talhao', 'cod_chave', 'cod_chave_ref', 'remanescente']
         for column in columns_to_create:
             self.create_table(column, table_name, 'TEXT')
 
+        dimension = TalhaoDimension(self.schema)
         with self.connect() as conn:
-            cur = conn.cursor()
-
-            # Update 'cod_projeto', 'cod_talhao', and 'cod_chave'
-            cur.execute(f"""
-                UPDATE {table_name}
-                SET cod_projeto = SUBSTR(Talhao, 1, 11),
-                    cod_talhao = SUBSTR(Talhao, INSTR(Talhao, '-') + 1),
-                    cod_chave = SUBSTR(Talhao, 1, 11) || SUBSTR(Talhao, INSTR(Talhao, '-') + 1)
-            """)
-
-            # Update 'remanescente'
-            cur.execute(f"""
-                UPDATE {table_name}
-                SET remanescente = CASE 
-                    WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') THEN 'Remanescente'
-                    WHEN SUBSTR(Talhao, LENGTH(Talhao), 1) IN ('R', 'S') THEN 'Remanescente'
-                    ELSE 'Talhão'
-                END
-            """)
-
-            # Update 'cod_chave_ref'
-            cur.execute(f"""
-                UPDATE {table_name}
-                SET cod_chave_ref = CASE
-                    WHEN remanescente = 'Remanescente' THEN
-                        CASE
-                            WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') AND LENGTH(cod_chave) <= 14 THEN
-                                SUBSTR(Talhao, 1, 11) || '0' || SUBSTR(Talhao, INSTR(Talhao, '-') + 2)
-                            WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') AND LENGTH(cod_chave) > 14 THEN
-                                SUBSTR(Talhao, 1, 11) || '0' || SUBSTR(Talhao, INSTR(Talhao, '-') + 2, LENGTH(Talhao) - INSTR(Talhao, '-') - 2)
-                            WHEN SUBSTR(Talhao, LENGTH(Talhao), 1) IN ('R', 'S') THEN
-                                SUBSTR(Talhao, 1, 11) || SUBSTR(Talhao, INSTR(Talhao, '-') + 1, LENGTH(Talhao) - INSTR(Talhao, '-') - 1)
-                            ELSE NULL
-                        END
-                    ELSE NULL
-                END
-            """)
+            dimension.extend(conn, {table_name: ['Talhao']})
+            dimension.attach(conn, table_name, 'Talhao', {column: column for column in TalhaoDimension.T700})
 
         print(f"Table '{table_name}' has been updated with T700-related columns.")
 
     def t700_organizador(self, table_name1, table_name2=None):
         """
         Update the 'manejo_final_apex' column in 'table_name1' based on the 'remanescente' status
-        and the corresponding 'manejo_apex' value in 'table_name2'. If no match is found,
-        the original 'manejo_apex' value from 'table_name1' is retained.
+        and the 'manejo_apex' of the talhão it refers to ('cod_chave_ref') in 'table_name2'. If no match
+        is found, the original 'manejo_apex' value from 'table_name1' is retained.
+
+        The references are resolved with a single join against the first row of each 'cod_chave' of
+        'table_name2', which is usually 'table_name1' itself.
 
         If 'table_name2' is not provided, the function will directly copy 'manejo_apex' to 'manejo_final_apex'.
 
@@ -1623,41 +1716,35 @@ class Manejo:
         table_name1 : str
             The name of the main table to update.
         table_name2 : str, optional
-            The name of the secondary table from which to fetch the 'manejo_apex' value (default is None).
+            The name of the table from which to fetch the 'manejo_apex' value (default is None).
         """
+        check_identifiers(table_name1, table_name2)
         # Ensure the target column exists
         self.create_table('ManejoAPEX_Final', table_name1, 'TEXT')
 
-        if table_name2:
-            # If table_name2 is provided, update based on the remanescente status and cod_chave_ref
-            update_query = f"""
-                UPDATE {table_name1}
-                SET ManejoAPEX_Final = CASE
-                    WHEN remanescente = 'Remanescente' THEN (
-                        SELECT ManejoAPEX 
-                        FROM {table_name2} AS t2 
-                        WHERE t2.cod_chave = {table_name1}.cod_chave_ref
-                    )
-                    ELSE ManejoAPEX
-                END
-            """
-        else:
-            # If table_name2 is not provided, just copy manejo_apex to manejo_final_apex
-            update_query = f"""
-                UPDATE {table_name1}
-                SET ManejoAPEX_Final = ManejoAPEX
-            """
-
         with self.connect() as conn:
             cur = conn.cursor()
-            cur.execute(update_query)
-
-            # Ensure that 'manejo_final_apex' is not NULL
             cur.execute(f"""
                 UPDATE {table_name1}
-                SET ManejoAPEX_Final = COALESCE(ManejoAPEX_Final, ManejoAPEX)
+                SET ManejoAPEX_Final = ManejoAPEX
             """)
 
+            if table_name2:
+                # The former correlated subquery took the first row of 'table_name2' with the key
+                cur.execute(f"""
+                    UPDATE {table_name1}
+                    SET ManejoAPEX_Final = ref.ManejoAPEX
+                    FROM (
+                        SELECT cod_chave, ManejoAPEX, MIN(rowid)
+                        FROM {table_name2}
+                        WHERE cod_chave IS NOT NULL
+                        GROUP BY cod_chave
+                    ) AS ref
+                    WHERE {table_name1}.remanescente = 'Remanescente'
+                      AND ref.cod_chave = {table_name1}.cod_chave_ref
+                      AND ref.ManejoAPEX IS NOT NULL
+                """)
+
         print(f"'ManejoAPEX_Final' column in table '{table_name1}' has been updated.")
 
     def APEX(self, table_name):
@@ -1669,6 +1756,7 @@ class Manejo:
         table_name : str
             The name of the table to update.
         """
+        check_identifiers(table_name)
         # Ensure the target column exists
         self.create_table('ManejoAPEX', table_name)
 
@@ -1688,6 +1776,7 @@ class Manejo:
 
     def Pipeline(self):
         print("Starting Pipeline")
+        self.begin_run()
         self.create_table_with_repeated_rows('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REF', 7)
         self.update_column_based_on_another_table('CustosSilvicultura_REF_REF', 'ANO', 'CustosSilvicultura_REF_REG',
                                                   'ANO', 'id')
@@ -1695,15 +1784,14 @@ class Manejo:
         cols_to_update = ['BO', 'IP', 'PO', 'CO', 'PI', 'SB', 'SA', 'VI']
         self.CustoTerra('CustosSilvicultura_REF_REF', cols_to_update, 8)
 
-        self.CustosSilviculturaVPL('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REG_VPL', 'ANO')
-        self.CustosSilviculturaVPL('CustosSilvicultura_REF_REF', 'CustosSilvicultura_REF_REF_VPL', 'ANO')
-
-        cols = self.list_columns('CustosSilvicultura_REF_REG')[3:]
-        self.create_summary_table_by_regiao('CustosSilvicultura_REF_REG_VPL', 'CustosSilvicultura_REF_REG_VPL_Total', cols, 7)
-        self.create_summary_table_by_regiao('CustosSilvicultura_REF_REF_VPL', 'CustosSilvicultura_REF_REF_VPL_Total',
-                                            cols, 7)
+        self.CustosSilviculturaVPL('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REG_VPL', 'ANO',
+                                   'CustosSilvicultura_REF_REG_VPL_Total', 7)
+        self.CustosSilviculturaVPL('CustosSilvicultura_REF_REF', 'CustosSilvicultura_REF_REF_VPL', 'ANO',
+                                   'CustosSilvicultura_REF_REF_VPL_Total', 7)
         self.ResInclinacao()
         self.CustosColheita()
+        self.provision_region_sheets()
+        self.provision_talhoes(['apex_base_1'])
 
         n = len([x for x in self.list_tables() if x.startswith('Apex_Manejo')])
         goal = f'Apex_Manejo_{n+1}'
@@ -1793,16 +1881,15 @@ class Manejo:
         self.t700(goal)
         self.APEX(goal)
         # if self.rem:
-        t_700 = f'Manejo_Apex_t700_{n + 1}'
-        self.create_table_from_another(goal, t_700, ['Talhao', 'ManejoAPEX'])
-        self.t700(t_700)
-        self.t700_organizador(goal, t_700)
+        self.t700_organizador(goal, goal)
         # else:
         self.t700_organizador(goal, None)
+        self.end_run()
 
 
-db = Manejo(r'C:\Users\Leonardo\PycharmProjects\testes\Base_Testes_Valid_v02.db')
-tables = [x for x in db.list_tables() if x.startswith('Manejo_Apex')]
-for t in tables:
-    print(t)
-    db.drop_table(t)
+if __name__ == '__main__':
+    db = Manejo(r'C:\Users\Leonardo\PycharmProjects\testes\Base_Testes_Valid_v02.db')
+    tables = [x for x in db.list_tables() if x.startswith('Manejo_Apex')]
+    for t in tables:
+        print(t)
+        db.drop_table(t)
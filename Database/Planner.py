@@ -0,0 +1,206 @@
+import inspect
+import itertools
+import string
+
+
+class OutputPlanner:
+    """
+    Declares the columns that each manejo step adds to its target table.
+
+    With the whole plan known up front, ``Apex_Manejo_N`` is created once with its final schema
+    (see ``Manejo.create_output_table``), instead of growing through one ALTER TABLE per column
+    while its rows are rewritten by every step. Column names may use the step arguments as
+    placeholders, e.g. ``'CustosColheita_{ref_type}'``.
+    """
+
+    # Step (Manejo method name) -> (argument holding the target table, [(column, type), ...])
+    STEP_OUTPUTS = {
+        'ESPAreaBasal': ('table_name', [('EspAB', 'FLOAT'), ('QTDArvIdeal', 'FLOAT')]),
+        'update_curva_and_vol7': ('table_name', [('Curva', 'FLOAT'), ('Fator', 'FLOAT'), ('Vol7', 'FLOAT')]),
+        'perdas': ('table_name', [('FatoresBrotacao', 'FLOAT'), ('FatoresTalhadia', 'FLOAT'),
+                                  ('Vol7_2ROT', 'FLOAT'), ('Vol7_1ROT', 'FLOAT')]),
+        'CustoMADPE': ('table_name', [('{new_column_name}', 'FLOAT')]),
+        'CustosColheitaOP': ('table_name', [('CustosColheitaPond', 'FLOAT'), ('CustosColheitaPond_{rot_type}', 'FLOAT'),
+                                            ('CustosColheita_{ref_type}', 'FLOAT')]),
+        'CustosApoioColheita': ('table_name', [('CustosApoioColheita_{ref_type}', 'FLOAT')]),
+        'CustosColheitaEstradaInterna': ('table_name', [('CustosColheitaEstradaInterna_{ref_type}', 'FLOAT')]),
+        'CustosColheitaTotal': ('table_name', [('CustosColheitaTotal_{ref_type}', 'FLOAT')]),
+        'CustosTransporteGeral': ('table_name', [('CustosTransporte', 'FLOAT'), ('DistROD', 'FLOAT'),
+                                                 ('CustoEstradaExterna', 'FLOAT'), ('CustoFerroviariaMovPatio', 'FLOAT')]),
+        'OutrosCustos': ('table_name', [('CustosTAXAADM_{ref_type}', 'FLOAT')]),
+        'CustosPostoFabrica': ('table_name', [('CustosPostoFabrica_{ref_type}', 'FLOAT')]),
+        'CustoMadAV': ('table_name', [('CustoMadAV', 'FLOAT')]),
+        'AVPipeline': ('table_name', [('AVAreaReforma', 'FLOAT'), ('AvAreaNaoAvaliada', 'FLOAT'),
+                                      ('AvAreaRegeneracao', 'FLOAT'), ('RegAltaBaixa', 'FLOAT'), ('ArvMin', 'FLOAT'),
+                                      ('AvFustesAreaReforma', 'FLOAT'), ('CloneSemente', 'FLOAT'),
+                                      ('AvCSAreaReforma', 'FLOAT'), ('AvR2AreaReforma', 'FLOAT'),
+                                      ('FatorBrotacaoMatGen', 'FLOAT'), ('AvMGNR', 'FLOAT'),
+                                      ('AvMaior15AreaReforma', 'FLOAT'), ('AvBaixaProd', 'FLOAT'), ('ProdMin', 'FLOAT'),
+                                      ('AvAreaReformaSemi', 'FLOAT'), ('AvFinalNaoAvaliado', 'FLOAT'),
+                                      ('AvFinalAnalise', 'FLOAT'), ('AvFinalReforma', 'FLOAT'),
+                                      ('AvFinalRegeneracao', 'FLOAT')]),
+        't700': ('table_name', [('cod_projeto', 'TEXT'), ('cod_talhao', 'TEXT'), ('cod_chave', 'TEXT'),
+                                ('cod_chave_ref', 'TEXT'), ('remanescente', 'TEXT')]),
+        'APEX': ('table_name', [('ManejoAPEX', 'FLOAT')]),
+        't700_organizador': ('table_name1', [('ManejoAPEX_Final', 'TEXT')]),
+    }
+
+    # Step -> resources read, as 'Table' or 'Table.Column' (lists in the arguments expand to one
+    # resource per item; a None argument drops the resource)
+    STEP_INPUTS = {
+        'create_table_with_repeated_rows': ['{source_table}'],
+        'update_column_based_on_another_table': ['{source_table}.{source_column}', '{target_table}.{primary_key}'],
+        'CustoTerra': ['{table_name}.{cols}', 'CustoTerra'],
+        'CustosSilviculturaVPL': ['{table_ref}', 'Parametros.Juros'],
+        'create_summary_table_by_regiao': ['{source_table}'],
+        'ResInclinacao': ['ClassesInclinacao'],
+        'CustosColheita': ['ClassesInclinacaoResumo', 'CustosColheitaBO', 'CustosColheitaCO', 'CustosColheitaGN',
+                           'CustosColheitaPO', 'CustosColheitaSB', 'CustosColheitaPI'],
+        'create_output_table': ['{source_table}'],
+        'provision_indexes': ['{tables}'],
+        'provision_region_sheets': ['{sheets}'],
+        'provision_talhoes': ['{tables}.{column}'],
+        'ESPAreaBasal': ['{table_name}.ESP'],
+        'update_curva_and_vol7': ['{table_name}.Regiao', '{table_name}.IdadeClasse', '{table_name}.Idade',
+                                  '{table_name}.VTCC', 'CurvaProdutividade_Longo'],
+        'perdas': ['{table_name}.Idade', '{table_name}.Regime', '{table_name}.Vol7', 'IndiceBrotacao',
+                   'Parametros.GanhoGenetico', 'Parametros.PerdaGenetica', 'Parametros.R2', 'Parametros.MecColheita'],
+        'CustoMADPE': ['{table_name}.Regiao', '{table_name}.{vol_column_1}', '{table_name}.{vol_column_2}',
+                       '{ref_vpl_table}', '{total_table}', 'Parametros.Juros'],
+        'CustosColheitaOP': ['{table_name}.Regiao', '{table_name}.Vol7', '{table_name}.Vol7_{rot_type}',
+                             'CustosColheitaBO.POND', 'CustosColheitaCO.POND', 'CustosColheitaGN.POND',
+                             'CustosColheitaPO.POND', 'CustosColheitaSB.POND', 'CustosColheitaPI.POND',
+                             'CustosSilvicultura_{ref_type}_VPL', 'Parametros.Juros'],
+        'CustosApoioColheita': ['{table_name}.Regiao', '{table_name}.Vol7', '{table_name}.Vol7_{rot_type}',
+                                'OutrosCustos', 'CustosSilvicultura_{ref_type}_VPL', 'Parametros.Juros'],
+        'CustosColheitaEstradaInterna': ['{table_name}.Regiao', '{table_name}.Vol7', '{table_name}.Vol7_{rot_type}',
+                                         'OutrosCustos', 'CustosSilvicultura_{ref_type}_VPL', 'Parametros.Juros'],
+        'CustosColheitaTotal': ['{table_name}.CustosColheita_{ref_type}', '{table_name}.CustosApoioColheita_{ref_type}',
+                                '{table_name}.CustosColheitaEstradaInterna_{ref_type}'],
+        'CustosTransporteGeral': ['{table_name}.Regiao', '{table_name}.DIST_LP', '{table_name}.DIST_PFRod',
+                                  '{table_name}.DIST_LFRod', 'CustosTransRod_Longo', 'CustoEstExterna', 'CustoFerr',
+                                  'CustoMovPatio'],
+        'OutrosCustos': ['{table_name}.Regiao', '{table_name}.Vol7', '{table_name}.Vol7_{rot_type}',
+                         'OutrosCustos', 'CustosSilvicultura_{ref_type}_VPL', 'Parametros.Juros'],
+        'CustosPostoFabrica': ['{table_name}.Regiao', '{table_name}.CustoMADPE_{ref_type}',
+                               '{table_name}.CustosColheitaTotal_{ref_type}', '{table_name}.CustosTransporte',
+                               '{table_name}.CustoEstradaExterna', '{table_name}.CustoFerroviariaMovPatio',
+                               '{table_name}.CustosTAXAADM_{ref_type}', 'Elevacao', 'Parametros.TalhadiaRA',
+                               'Parametros.TalhadiaRB'],
+        'CustoMadAV': ['{table_name}.CustosPostoFabrica_REF_REF', '{table_name}.CustosPostoFabrica_REF_REG'],
+        'AVPipeline': ['{table_name}.Area', '{table_name}.Idade', '{table_name}.Regime', '{table_name}.Talhao',
+                       '{table_name}.Fustes', '{table_name}.DCR_MatGen', '{table_name}.EspAB', '{table_name}.Vol7',
+                       '{table_name}.Vol7_2ROT', '{table_name}.CustoMadAV', 'RTMaterialGenetico', 'Elevacao',
+                       'ProdMin', 'DimTalhao', 'DimTalhaoCodigo', 'Parametros.RA3', 'Parametros.RB3',
+                       'Parametros.RA2', 'Parametros.RB2', 'Parametros.AvaliacaoEco'],
+        't700': ['{table_name}.Talhao', 'DimTalhao'],
+        'APEX': ['{table_name}.AvFinalReforma'],
+        'create_table_from_another': ['{source_table}.{columns}'],
+        't700_organizador': ['{table_name1}.remanescente', '{table_name1}.cod_chave_ref', '{table_name1}.ManejoAPEX',
+                             '{table_name2}.cod_chave', '{table_name2}.ManejoAPEX'],
+        'create_table_from_existing_schema': ['{existing_table_name}'],
+        'insert_last_row_into_table': ['{source_table}'],
+        'VectorEngine.run': ['{source_table}', 'CurvaProdutividade', 'IndiceBrotacao', 'CustosColheitaBO.POND',
+                             'CustosColheitaCO.POND', 'CustosColheitaGN.POND', 'CustosColheitaPO.POND',
+                             'CustosColheitaSB.POND', 'CustosColheitaPI.POND', 'CustosSilvicultura_REF_REG_VPL',
+                             'CustosSilvicultura_REF_REF_VPL', 'CustosSilvicultura_REF_REG_VPL_Total',
+                             'CustosSilvicultura_REF_REF_VPL_Total', 'OutrosCustos', 'CustosTransRod',
+                             'CustoEstExterna', 'CustoFerr', 'CustoMovPatio', 'Elevacao', 'RTMaterialGenetico',
+                             'ProdMin', 'Parametros'],
+    }
+
+    # Steps that append rows, so running them again is never the same as keeping their last result
+    NOT_REUSABLE = {'insert_last_row_into_table'}
+
+    # Step -> resources written besides the STEP_OUTPUTS columns
+    STEP_WRITES = {
+        'create_table_with_repeated_rows': ['{new_table}'],
+        'update_column_based_on_another_table': ['{target_table}.{target_column}'],
+        'CustoTerra': ['{table_name}.{cols}'],
+        'CustosSilviculturaVPL': ['{new_table_name}', '{total_table}'],
+        'create_summary_table_by_regiao': ['{new_table}'],
+        'ResInclinacao': ['ClassesInclinacaoResumo'],
+        'CustosColheita': ['CustosColheitaBO.POND', 'CustosColheitaCO.POND', 'CustosColheitaGN.POND',
+                           'CustosColheitaPO.POND', 'CustosColheitaSB.POND', 'CustosColheitaPI.POND'],
+        'create_output_table': ['{new_table}'],
+        'provision_region_sheets': ['{sheets}_Longo'],
+        'provision_talhoes': ['DimTalhao', 'DimTalhaoCodigo'],
+        'create_table_from_another': ['{new_table}'],
+        'create_table_from_existing_schema': ['{new_table_name}'],
+        'insert_last_row_into_table': ['{target_table}'],
+        'VectorEngine.run': ['{table_name}'],
+    }
+
+    @staticmethod
+    def _declared(table, func):
+        return table.get(func.__qualname__, table.get(func.__name__, []))
+
+    @staticmethod
+    def _expand(templates, values):
+        resources = set()
+        for template in templates:
+            fields = [field for _, field, _, _ in string.Formatter().parse(template) if field]
+            options = []
+            for field in fields:
+                value = values[field]
+                options.append(list(value) if isinstance(value, (list, tuple)) else [value])
+            for combination in itertools.product(*options):
+                if any(value is None for value in combination):
+                    continue
+                resources.add(template.format(**dict(zip(fields, combination))).lower())
+        return resources
+
+    @classmethod
+    def step_io(cls, func, args):
+        """
+        Return the resources a step call reads and writes.
+
+        :param func: The step function.
+        :param args: The positional arguments of the call.
+        :return: A tuple (reads, writes) of sets of lowercase 'table' or 'table.column' names.
+        """
+        bound = inspect.signature(func).bind(*args)
+        bound.apply_defaults()
+        values = bound.arguments
+
+        reads = cls._expand(cls._declared(cls.STEP_INPUTS, func), values)
+        writes = cls._expand(cls._declared(cls.STEP_WRITES, func), values)
+        target, columns = cls.step_columns(func, args)
+        writes.update(f"{target}.{column}".lower() for column, _ in columns)
+        return reads, writes
+
+    @classmethod
+    def step_columns(cls, func, args):
+        """
+        Return the table and the columns produced by one step call.
+
+        :param func: The Manejo method of the step.
+        :param args: The positional arguments of the call.
+        :return: A tuple (table, [(column, type), ...]), or (None, []) if the step adds no columns.
+        """
+        output = cls.STEP_OUTPUTS.get(func.__name__)
+        if output is None:
+            return None, []
+        table_arg, columns = output
+        bound = inspect.signature(func).bind(*args)
+        bound.apply_defaults()
+        values = bound.arguments
+        return values[table_arg], [(column.format(**values), column_type) for column, column_type in columns]
+
+    @classmethod
+    def columns(cls, steps, table):
+        """
+        Return every column that the steps add to a table, in the order they are first produced.
+
+        :param steps: A list of (name, function, args) tuples.
+        :param table: The target table (e.g. 'Apex_Manejo_3').
+        :return: A list of (column, type) tuples, without duplicates.
+        """
+        planned = {}
+        for _, func, args in steps:
+            target, columns = cls.step_columns(func, args)
+            if target is None or target.lower() != table.lower():
+                continue
+            for column, column_type in columns:
+                planned.setdefault(column.lower(), (column, column_type))
+        return list(planned.values())
@@ -0,0 +1,262 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from Database.Schema import SchemaCatalog
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Long-lived sqlite3 connection shared by every Database/Manejo/Consist instance pointing to the same file.
+
+    Using it as a context manager (``with self.connect() as conn``) keeps the same semantics as a fresh
+    sqlite3 connection: the work is committed on a clean exit and rolled back on error. Nested blocks in the
+    same thread only commit when the outermost block exits, and other threads wait for the block to finish.
+
+    Inside ``transaction()`` every commit is deferred to the end of the block, and a rollback only undoes
+    the work since the innermost ``savepoint()``, so the steps of a run keep their own commit/rollback calls.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.deferred = False
+        self.savepoints = []
+        self.schema = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.depth -= 1
+            if self.depth == 0:
+                if exc_type is None:
+                    self.commit()
+                else:
+                    self.rollback()
+        finally:
+            self.lock.release()
+        return False
+
+    def commit(self):
+        if self.deferred:
+            return
+        super().commit()
+
+    def rollback(self):
+        if self.deferred:
+            if self.savepoints:
+                self.execute(f"ROLLBACK TO {self.savepoints[-1]}")
+                self._invalidate_schema()
+            return
+        super().rollback()
+        self._invalidate_schema()
+
+    def _invalidate_schema(self):
+        # A rollback may revert DDL, and SQLite would then reuse the schema versions already cached
+        if self.schema is not None:
+            self.schema.invalidate()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block in a single write transaction, committed once when the block exits cleanly.
+
+        Nested calls join the outer transaction. Readers on other connections keep seeing the
+        last committed state until the end of the block.
+
+        The writer lock is held for the whole block, not per statement: any statement issued on this
+        connection by another thread would join the open transaction, and be committed or rolled back
+        with it. Writes from other threads (drop_table, save_scenario...) therefore wait until the block
+        ends, which for a run without resuming (ManejoRunner) is the whole run. Reads are not affected,
+        they go through ``ConnectionPool.reader()``.
+        """
+        with self:
+            if self.deferred:
+                yield self
+                return
+            super().commit()  # Flush any implicit transaction left open by the sqlite3 module
+            self.execute("BEGIN")
+            self.deferred = True
+            try:
+                yield self
+            except BaseException:
+                self.deferred = False
+                self.savepoints.clear()
+                self.rollback()
+                raise
+            self.deferred = False
+            self.savepoints.clear()
+            super().commit()
+
+    @contextmanager
+    def savepoint(self, name):
+        """
+        Run a block inside a SAVEPOINT, released on success and rolled back on error.
+
+        Outside ``transaction()`` the block gets a transaction of its own.
+
+        :param name: The savepoint name (a plain identifier).
+        """
+        if not name.isidentifier():
+            raise ValueError(f"Invalid savepoint name: {name!r}")
+        with self.transaction():
+            self.execute(f"SAVEPOINT {name}")
+            self.savepoints.append(name)
+            try:
+                yield self
+            except BaseException:
+                self.savepoints.pop()
+                self.execute(f"ROLLBACK TO {name}")
+                self.execute(f"RELEASE {name}")
+                self._invalidate_schema()
+                raise
+            self.savepoints.pop()
+            self.execute(f"RELEASE {name}")
+
+
+class _ReaderLease:
+    """
+    Context manager that borrows a reader connection from the pool and gives it back on exit.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire_reader()
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.release_reader(self.conn)
+        self.conn = None
+        return False
+
+
+class ConnectionPool:
+    """
+    Keeps one writer connection and a small pool of reader connections per database path.
+
+    Every connection is configured once with WAL journaling and a large page cache, so the short
+    statements issued by the pipeline and by the dashboard no longer pay for opening the file and
+    rebuilding the cache each time.
+    """
+
+    PRAGMAS = {
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,  # 64 MiB
+        'mmap_size': 268435456,  # 256 MiB
+        'temp_store': 'MEMORY',
+    }
+    MAX_READERS = 4
+
+    _pools = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.in_memory = db in ('', ':memory:')
+        self._writer = None
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self.schema = SchemaCatalog()
+
+    @classmethod
+    def for_path(cls, db):
+        """
+        Return the pool shared by every object that points to the database at ``db``.
+
+        :param db: Path to the SQLite database file.
+        :return: The ConnectionPool for that path.
+        """
+        key = db if db in ('', ':memory:') else os.path.abspath(db)
+        with cls._registry_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(db)
+                cls._pools[key] = pool
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """
+        Close every pooled connection (called automatically at interpreter exit).
+        """
+        with cls._registry_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def _open(self, readonly=False):
+        conn = sqlite3.connect(self.db, factory=PooledConnection, check_same_thread=False, cached_statements=256)
+        if not self.in_memory and not readonly:
+            conn.execute("PRAGMA journal_mode=WAL")
+        for pragma, value in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        conn.schema = self.schema
+        return conn
+
+    def writer(self):
+        """
+        Return the single writer connection for this database, opening it on first use.
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = self._open()
+            return self._writer
+
+    def reader(self):
+        """
+        Return a context manager that lends a read-only connection from the pool.
+
+        In-memory databases cannot be shared between connections, so the writer is used instead.
+        """
+        if self.in_memory:
+            return self.writer()
+        self.writer()  # Make sure the file exists and is in WAL mode before opening readers
+        return _ReaderLease(self)
+
+    def acquire_reader(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.MAX_READERS:
+                self._opened += 1
+                return self._open(readonly=True)
+        return self._idle.get()
+
+    def release_reader(self, conn):
+        if conn is not None:
+            self._idle.put(conn)
+
+    def close(self):
+        """
+        Close the writer and every idle reader of this pool.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+atexit.register(ConnectionPool.close_all)
@@ -0,0 +1,25 @@
+import re
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+SUFFIX = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def check_identifiers(*names, suffixes=()):
+    """
+    Make sure the table and column names substituted into SQL text are plain identifiers.
+
+    Values always go through bound parameters; only names validated here are formatted into the
+    statements, so each statement text stays constant and sqlite3 can reuse its compiled form.
+
+    :param names: The names to check (None is ignored, e.g. an optional table).
+    :param suffixes: Fragments appended to column names, such as 'REF_REG' or '2ROT'.
+    :raises ValueError: If a name is not a plain identifier.
+    """
+    for name in names:
+        if name is None:
+            continue
+        if not isinstance(name, str) or not IDENTIFIER.match(name):
+            raise ValueError(f"Invalid SQL identifier: {name!r}")
+    for suffix in suffixes:
+        if not isinstance(suffix, str) or not SUFFIX.match(suffix):
+            raise ValueError(f"Invalid SQL identifier suffix: {suffix!r}")
@@ -0,0 +1,304 @@
+import argparse
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from Database.Indices import IndexManager
+from Database.Pool import ConnectionPool
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.])[+-]?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.])")
+EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+CREATE_AS = re.compile(r'^\s*CREATE\s+(?:TEMP\w*\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+AS\s+', re.IGNORECASE)
+SOURCE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+([\w.]+)(?:\s+(?:AS\s+)?(?!WHERE|SET|ON|JOIN|LEFT|INNER|ORDER|GROUP|'
+                    r'LIMIT|USING|VALUES|SELECT)(\w+))?', re.IGNORECASE)
+NODE = re.compile(r'^(?:SCAN|SEARCH) (\S+)')
+ASSIGNED = re.compile(r'(?:\bSET\s+|,\s*)(\w+)\s*=(?!=)', re.IGNORECASE)
+ORDER = re.compile(r'\b(?:ORDER|GROUP)\s+BY\s+(.+?)(?=\bLIMIT\b|\bHAVING\b|\)|$)', re.IGNORECASE | re.DOTALL)
+
+
+class QueryPlanAuditor:
+    """
+    Diagnostic mode that reads the query plan of every statement a pipeline step issues.
+
+    While a step runs inside ``etapa``, the writer connection traces its statements (with the
+    parameters bound, as sqlite3 expands them). When the step ends, each distinct statement (the
+    same text up to its literals) is passed once to ``EXPLAIN QUERY PLAN`` and its plan is checked
+    for the patterns behind the slow steps:
+
+    - a SCAN of a table inside a correlated subquery, which runs once per row of the outer table;
+    - an AUTOMATIC index, which SQLite builds (and drops) on every execution of the statement;
+    - a TEMP B-TREE, a sort for ORDER BY, GROUP BY or DISTINCT that no index delivers.
+
+    Each finding comes with the index that would answer it, guessed from the plan and the columns
+    the statement compares or sorts. ``save`` writes the findings of the run to 'QueryPlanAudit'
+    and ``relatorio`` to a text file. Statements on temporary tables dropped by the step itself can
+    no longer be explained and are reported as such. Only the writer connection is traced.
+
+    Run ``python -m Database.QueryPlan <base.db>`` to audit both pipelines on a copy of a database.
+    """
+
+    TABLE = 'QueryPlanAudit'
+
+    # Distinct statements explained per step
+    LIMITE = 2000
+
+    def __init__(self, db):
+        """
+        :param db: Path to the SQLite database file.
+        """
+        self.db = db
+        self.consultas = []
+        self.inicio = datetime.now().isoformat(timespec='seconds')
+
+    def connect(self):
+        return ConnectionPool.for_path(self.db).writer()
+
+    @property
+    def schema(self):
+        return ConnectionPool.for_path(self.db).schema
+
+    @staticmethod
+    def normalize(sql):
+        """
+        Return the text of a statement with its literals replaced by '?', so repeated calls match.
+        """
+        return ' '.join(LITERAL.sub('?', sql).split())
+
+    @contextmanager
+    def etapa(self, name):
+        """
+        Trace the statements of the enclosed step and explain them when it ends.
+
+        :param name: The step name.
+        """
+        conn = self.connect()
+        statements = {}
+
+        def trace(sql):
+            # Called by SQLite before each statement runs: the connection cannot be used here
+            key = self.normalize(sql)
+            if key in statements:
+                statements[key][1] += 1
+            elif len(statements) < self.LIMITE:
+                statements[key] = [sql, 1]
+
+        conn.set_trace_callback(trace)
+        try:
+            yield
+        finally:
+            conn.set_trace_callback(None)
+            with conn:
+                for sql, count in statements.values():
+                    if EXPLAINABLE.match(sql) or CREATE_AS.match(sql):
+                        self.consultas.append(self.explain(conn, name, sql, count))
+
+    def explain(self, conn, step, sql, count):
+        """
+        Explain one statement and check its plan.
+
+        :return: A dict with the step, the statement, its number of executions, the plan and the findings.
+        """
+        consulta = {'Etapa': step, 'Consulta': sql, 'Execucoes': count, 'Plano': None, 'Alertas': []}
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {CREATE_AS.sub('', sql)}").fetchall()
+        except sqlite3.Error as e:
+            consulta['Plano'] = f"(não explicável: {e})"
+            return consulta
+
+        nodes = {node_id: (parent, detail) for node_id, parent, _, detail in rows}
+        consulta['Plano'] = '\n'.join(detail for _, _, _, detail in rows)
+        aliases = self.aliases(sql)
+        for node_id, (parent, detail) in nodes.items():
+            correlated = self.correlated(nodes, node_id)
+            if detail.startswith('SCAN ') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail and correlated:
+                alerta = 'SCAN em subconsulta correlacionada'
+                table, alias, columns = self.target(conn, sql, aliases, detail, correlated=True)
+            elif 'AUTOMATIC' in detail:
+                alerta = 'Índice automático'
+                table, alias, _ = self.target(conn, sql, aliases, detail)
+                columns = re.findall(r'(\w+)[=<>]', detail[detail.find('('):])
+            elif detail.startswith('USE TEMP B-TREE'):
+                alerta = f"Ordenação em B-tree temporária ({detail.rpartition(' FOR ')[2]})"
+                sibling = next((d for i, (p, d) in nodes.items() if p == parent and NODE.match(d)), '')
+                table, alias, columns = self.target(conn, sql, aliases, sibling, correlated=bool(correlated),
+                                                    ordered=True)
+            else:
+                continue
+            consulta['Alertas'].append((f"{alerta}: {detail}", self.suggest(conn, table, columns)))
+        return consulta
+
+    @staticmethod
+    def correlated(nodes, node_id):
+        """
+        Return the correlated subquery a plan node belongs to, or None.
+        """
+        parent = nodes[node_id][0]
+        while parent in nodes:
+            if nodes[parent][1].startswith('CORRELATED'):
+                return nodes[parent][1]
+            parent = nodes[parent][0]
+        return None
+
+    @staticmethod
+    def aliases(sql):
+        """
+        Return {alias or table name (lowercase): table} for the tables a statement reads or writes.
+        """
+        aliases = {}
+        for table, alias in SOURCE.findall(sql):
+            table = table.rpartition('.')[2]
+            aliases.setdefault(table.lower(), table)
+            if alias:
+                aliases.setdefault(alias.lower(), table)
+        return aliases
+
+    def target(self, conn, sql, aliases, detail, correlated=False, ordered=False):
+        """
+        Return the table of a plan node and the columns an index on it should start with.
+
+        The columns are the ones of the table the statement compares with '=' (or IN), then the ones
+        it compares with a range, then, for a sort, the ORDER/GROUP BY columns. Unqualified names
+        count when they are columns of the table.
+
+        :return: A tuple (table or None, alias, list of columns).
+        """
+        match = NODE.match(detail)
+        if not match:
+            return None, None, []
+        alias = match.group(1)
+        table = aliases.get(alias.lower())
+        if table is None or not self.schema.has_table(conn, table):
+            return table, alias, []
+        known = {column.lower(): column for column in self.schema.columns(conn, table)}
+
+        def owned(qualifier, column):
+            if qualifier:
+                return qualifier.lower() == alias.lower() and column.lower() in known
+            return column.lower() in known and (correlated or len(aliases) == 1)
+
+        # The columns an UPDATE assigns are not compared
+        assigned = {name.lower() for name in ASSIGNED.findall(sql)} if re.match(r'\s*UPDATE\b', sql, re.I) else set()
+        equal, ranges = [], []
+        for qualifier, column, operator in re.findall(r'(?:(\w+)\.)?(\w+)\s*(==|=|<=|>=|<|>|\bIN\b)', sql, re.IGNORECASE):
+            if owned(qualifier, column) and (qualifier or column.lower() not in assigned):
+                name = known[column.lower()]
+                bucket = equal if operator in ('=', '==') or operator.upper() == 'IN' else ranges
+                if name not in equal and name not in ranges:
+                    bucket.append(name)
+        # A sort outside a correlated subquery only needs the index to deliver the order
+        columns = equal + ranges[:1] if correlated or not ordered else []
+        if ordered:
+            for clause in ORDER.findall(sql):
+                for term in clause.split(','):
+                    qualifier, _, column = term.strip().split(' ')[0].rpartition('.')
+                    if owned(qualifier, column) and known[column.lower()] not in columns:
+                        columns.append(known[column.lower()])
+        return table, alias, columns
+
+    def suggest(self, conn, table, columns):
+        """
+        Return the index to create for a finding, or what to do when it already exists.
+        """
+        if not table or not columns:
+            return None
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? COLLATE NOCASE",
+                                    (table,)).fetchall():
+            indexed = [row[2] for row in conn.execute(f'PRAGMA index_info("{name}")').fetchall()]
+            if [c.lower() for c in indexed[:len(columns)]] == [c.lower() for c in columns]:
+                return f"O índice '{name}' já cobre ({', '.join(columns)}): atualize as estatísticas com ANALYZE"
+        return (f"CREATE INDEX {IndexManager.index_name(table, columns)} ON {table} ({', '.join(columns)}) "
+                f"-- ou declare {tuple(columns)} em IndexManager.INDEXES['{table}']")
+
+    def save(self):
+        """
+        Write the statements explained so far as one run of 'QueryPlanAudit', one row per finding
+        (or one row for a statement without findings).
+
+        :return: The run number (Execucao).
+        """
+        with self.connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    Execucao INTEGER,
+                    Inicio TEXT,
+                    Etapa TEXT,
+                    Consulta TEXT,
+                    Execucoes INTEGER,
+                    Plano TEXT,
+                    Alerta TEXT,
+                    Sugestao TEXT
+                )
+            """)
+            execucao = conn.execute(f"SELECT COALESCE(MAX(Execucao), 0) + 1 FROM {self.TABLE}").fetchone()[0]
+            conn.executemany(
+                f"INSERT INTO {self.TABLE} (Execucao, Inicio, Etapa, Consulta, Execucoes, Plano, Alerta, Sugestao) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(execucao, self.inicio, c['Etapa'], c['Consulta'], c['Execucoes'], c['Plano'], alerta, sugestao)
+                 for c in self.consultas for alerta, sugestao in (c['Alertas'] or [(None, None)])]
+            )
+        return execucao
+
+    def relatorio(self, path):
+        """
+        Write the findings of the run to a text file, by step, followed by the distinct suggestions.
+
+        :param path: The report file.
+        """
+        alertas = [c for c in self.consultas if c['Alertas']]
+        sugestoes = sorted({s for c in alertas for _, s in c['Alertas'] if s})
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Auditoria de planos de consulta - {self.db} - {self.inicio}\n")
+            f.write(f"{len(self.consultas)} consultas distintas, {len(alertas)} com alertas\n")
+            for c in alertas:
+                f.write(f"\n[{c['Etapa']}] executada {c['Execucoes']}x\n{c['Consulta'].strip()}\n")
+                f.write(''.join(f"  plano: {line}\n" for line in c['Plano'].splitlines()))
+                for alerta, sugestao in c['Alertas']:
+                    f.write(f"  ALERTA: {alerta}\n")
+                    if sugestao:
+                        f.write(f"  SUGESTÃO: {sugestao}\n")
+            f.write("\nSugestões:\n" + ''.join(f"  {s}\n" for s in sugestoes))
+
+
+def auditar(base, rem=True, vetorizado=False, saida=None):
+    """
+    Run Consist.pipeline and the APEX pipeline with the auditor on a copy of a database.
+
+    The database itself is never written: it is copied with the SQLite backup API (consistent
+    even while the application has it open) to '<base>.auditoria.db', which keeps the results and
+    the 'QueryPlanAudit' table.
+
+    :param base: Path to the database to audit.
+    :param rem: Whether the run organizes the remanescentes (the T700 checkbox).
+    :param vetorizado: Whether to run the vectorized engine instead of the SQL steps.
+    :param saida: The report file (default: '<base>.auditoria.txt').
+    :return: The path of the report.
+    """
+    from Database.Consistencia import Consist
+    from Threads.Runner import ManejoRunner
+
+    copia = f"{os.path.splitext(base)[0]}.auditoria.db"
+    saida = saida or f"{os.path.splitext(base)[0]}.auditoria.txt"
+    for path in (copia, f"{copia}-wal", f"{copia}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    with sqlite3.connect(base) as origem, sqlite3.connect(copia) as destino:
+        origem.backup(destino)
+
+    auditor = QueryPlanAuditor(copia)
+    Consist(copia).pipeline(auditoria=auditor)
+    ManejoRunner(copia, rem, vetorizado=vetorizado, auditoria=auditor).simulate(progress=False)
+    auditor.save()
+    auditor.relatorio(saida)
+    return saida
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Audit the query plans of the pipelines on a copy of a database.")
+    parser.add_argument('base', help="The SQLite database to audit (it is not modified).")
+    parser.add_argument('--saida', help="The report file (default: <base>.auditoria.txt).")
+    parser.add_argument('--sem-remanescentes', action='store_true', help="Do not organize the remanescentes.")
+    parser.add_argument('--vetorizado', action='store_true', help="Run the vectorized engine.")
+    args = parser.parse_args()
+    print(f"Relatório: {auditar(args.base, not args.sem_remanescentes, args.vetorizado, args.saida)}")
@@ -0,0 +1,95 @@
+from Database.Indices import IndexManager
+from Database.Query import check_identifiers
+
+
+class RegionSheets:
+    """
+    Long-format copies of the lookup sheets that keep one column per region.
+
+    'CurvaProdutividade' and 'CustosTransRod' are imported with a key column and one value column per
+    region, so reading them for every talhão used to take one correlated UPDATE per region column.
+    ``materialize`` writes each of them as a '<sheet>_Longo' table with one row per (Regiao, key),
+    indexed on both, so a lookup is a single join on the talhão's region whatever the number of
+    regions. The region columns are read from the sheet itself: a new region only needs a new
+    column, named after its code in 'Regiao' or after one of the names in CODIGOS.
+    """
+
+    SUFFIX = '_Longo'
+
+    # Region columns named after the region instead of its code in 'Regiao'
+    CODIGOS = {
+        'Sabinopolis': 'SA',
+        'Cocais': 'CO',
+        'Piracicaba': 'PI',
+        'SantaBarbara': 'SB',
+        'BeloOriente': 'BO',
+        'Ipaba': 'IP',
+        'Pompeu': 'PO',
+        'Virginopolis': 'VI'
+    }
+
+    # Sheet -> key column; every other column but 'id' is a region
+    SHEETS = {
+        'CurvaProdutividade': 'Idade',  # update_curva_and_vol7
+        'CustosTransRod': 'Distancia',  # CustosTransporteGeral
+    }
+
+    def __init__(self, schema):
+        """
+        :param schema: The SchemaCatalog of the database.
+        """
+        self.schema = schema
+
+    @classmethod
+    def long_table(cls, sheet):
+        return f"{sheet}{cls.SUFFIX}"
+
+    def regions(self, conn, sheet):
+        """
+        Return the region columns of a sheet and their codes in 'Regiao'.
+
+        :param conn: The connection to inspect.
+        :param sheet: The sheet name (a key of SHEETS).
+        :return: A list of (column, code) tuples, in the column order of the sheet.
+        """
+        key = self.SHEETS[sheet].lower()
+        return [(column, self.CODIGOS.get(column, column)) for column in self.schema.columns(conn, sheet)
+                if column.lower() not in ('id', key)]
+
+    def materialize(self, conn, sheets=None):
+        """
+        (Re)build the long-format table of each sheet and index it on (Regiao, key).
+
+        Values keep their storage class and the key column keeps its declared type, so comparisons
+        against the long table behave as they did against the sheet. Rows are written in the rowid
+        order of the sheet, so ties on a key still resolve to the first row of the sheet.
+
+        :param conn: The connection to write through.
+        :param sheets: Restrict the work to these sheets (default: every declared sheet).
+        :return: The names of the long-format tables written.
+        """
+        wanted = {sheet.lower() for sheet in sheets} if sheets is not None else None
+        written = []
+        for sheet, key in self.SHEETS.items():
+            if wanted is not None and sheet.lower() not in wanted:
+                continue
+            if not self.schema.has_table(conn, sheet) or not self.schema.has_column(conn, sheet, key):
+                continue
+
+            long_table = self.long_table(sheet)
+            check_identifiers(sheet, key, long_table)
+            key_type = next(row[2] for row in self.schema.table_info(conn, sheet) if row[1].lower() == key.lower())
+            conn.execute(f"DROP TABLE IF EXISTS {long_table}")
+            key_type = f'"{key_type}"' if key_type else ''
+            conn.execute(f"CREATE TABLE {long_table} (Regiao TEXT, Linha INTEGER, {key} {key_type}, Valor)")
+            for column, code in self.regions(conn, sheet):
+                check_identifiers(column)
+                conn.execute(f"""
+                    INSERT INTO {long_table} (Regiao, Linha, {key}, Valor)
+                    SELECT ?, rowid, {key}, {column} FROM {sheet} ORDER BY rowid
+                """, (code,))
+            written.append(long_table)
+
+        if written:
+            IndexManager(self.schema).provision(conn, written)
+        return written
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+
+class SchemaCatalog:
+    """
+    In-process cache of the tables and columns of one database, keyed on ``PRAGMA schema_version``.
+
+    SQLite bumps the schema version on every CREATE/ALTER/DROP, whichever connection issues it, so a
+    single cheap PRAGMA is enough to know whether the cached snapshot is still valid. Table and column
+    names are matched case-insensitively, like SQLite itself does.
+    """
+
+    MAX_SNAPSHOTS = 4
+
+    def __init__(self):
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _snapshot(self, conn):
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        with self._lock:
+            snapshot = self._snapshots.get(version)
+            if snapshot is not None:
+                self._snapshots.move_to_end(version)
+                return snapshot
+
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+        snapshot = {'tables': [row[0] for row in rows], 'info': {}}
+        with self._lock:
+            self._snapshots[version] = snapshot
+            while len(self._snapshots) > self.MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidate(self):
+        """
+        Forget every cached snapshot (e.g. after a rollback reverted some DDL).
+        """
+        with self._lock:
+            self._snapshots.clear()
+
+    def tables(self, conn):
+        """
+        List all table names in the database.
+
+        :param conn: Connection used to check the schema version (its uncommitted DDL is visible).
+        :return: A list of table names, in sqlite_master order.
+        """
+        return list(self._snapshot(conn)['tables'])
+
+    def has_table(self, conn, table_name):
+        """
+        Check whether a table exists.
+
+        :param conn: Connection used to check the schema version.
+        :param table_name: The table name (case-insensitive).
+        :return: True if the table exists.
+        """
+        lowered = table_name.lower()
+        return any(name.lower() == lowered for name in self._snapshot(conn)['tables'])
+
+    def table_info(self, conn, table_name):
+        """
+        Return the ``PRAGMA table_info`` rows of a table, reading them only once per schema version.
+
+        :param conn: Connection used to check the schema version.
+        :param table_name: The table name.
+        :return: A list of (cid, name, type, notnull, dflt_value, pk) tuples, empty if the table does not exist.
+        """
+        snapshot = self._snapshot(conn)
+        key = table_name.lower()
+        info = snapshot['info'].get(key)
+        if info is None:
+            info = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+            snapshot['info'][key] = info
+        return list(info)
+
+    def columns(self, conn, table_name):
+        """
+        List the column names of a table.
+
+        :param conn: Connection used to check the schema version.
+        :param table_name: The table name.
+        :return: A list of column names.
+        """
+        return [column[1] for column in self.table_info(conn, table_name)]
+
+    def has_column(self, conn, table_name, column_name):
+        """
+        Check whether a column exists in a table.
+
+        :param conn: Connection used to check the schema version.
+        :param table_name: The table name.
+        :param column_name: The column name (case-insensitive).
+        :return: True if the column exists.
+        """
+        lowered = column_name.lower()
+        return any(column[1].lower() == lowered for column in self.table_info(conn, table_name))
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from Database.Query import check_identifiers
+
+
+class VPLSilvicultura:
+    """
+    Discounted silviculture costs (VPL) of a 'CustosSilvicultura_*' table and their summary per region.
+
+    The cost table holds one row per year and one column per region. ``calcular`` reads it once as a
+    (years x regions) matrix, multiplies it by the discount vector of the years and reduces the
+    discounted matrix over the rotation segments, so the '<table>_VPL' table and the r1/r2/Total
+    summary come from the same matrix and are written through one connection. The segments are
+    given by their last rows (``limites``): the default (7,) is the year-7 cut, r1 = rows 1 to 7
+    and r2 = rows 8 to the end.
+    """
+
+    def __init__(self, manejo):
+        """
+        :param manejo: The Manejo instance (connections, schema and run context).
+        """
+        self.db = manejo
+
+    @staticmethod
+    def segmentos(limites, n):
+        """
+        Return the (start, stop) row slices of the segments ending at each limit, plus the last one.
+
+        :param limites: An int or an increasing sequence of row numbers (starting from 1).
+        :param n: The number of rows.
+        """
+        limites = [limites] if isinstance(limites, int) else list(limites)
+        if any(b <= a for a, b in zip(limites, limites[1:])):
+            raise ValueError(f"Limites de rotação fora de ordem: {limites}")
+        bounds = [0] + [min(max(limite, 0), n) for limite in limites] + [n]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def matriz(self, conn, table_ref):
+        """
+        Read the year column and the region columns of a cost table.
+
+        :return: A tuple (year column, region columns, years, float matrix with NaN for NULL).
+        """
+        columns = self.db.schema.columns(conn, table_ref)
+        ano_col, cols = columns[2], columns[3:]
+        check_identifiers(table_ref, ano_col, *cols)
+        rows = conn.execute(f"SELECT {ano_col}, {', '.join(cols)} FROM {table_ref} ORDER BY rowid").fetchall()
+        anos = [row[0] for row in rows]
+        matrix = np.array([[np.nan if value is None else value for value in row[1:]] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(cols))
+        return ano_col, cols, anos, matrix
+
+    @classmethod
+    def resumo(cls, vpl, limites):
+        """
+        Sum each region column of the discounted matrix over every segment (NULL counts as 0, see
+        ``nulos``).
+
+        :return: A (regions x segments) matrix and the Total of each region.
+        """
+        vpl = np.where(np.isnan(vpl), 0.0, vpl)
+        somas = np.column_stack([vpl[start:stop].sum(axis=0) for start, stop in cls.segmentos(limites, len(vpl))])
+        return somas, somas.sum(axis=1)
+
+    @staticmethod
+    def nulos(matrix, cols, anos):
+        """
+        Find the NULL costs of the matrix (e.g. a region missing from 'CustoTerra').
+
+        :return: A dict {region column: list of years with a NULL cost}, empty when there is none.
+        """
+        faltando = np.isnan(matrix)
+        return {col: [anos[i] for i in np.flatnonzero(faltando[:, j])] for j, col in enumerate(cols)
+                if faltando[:, j].any()}
+
+    def calcular(self, table_ref, new_table_name, total_table, col_, limites=(7,)):
+        """
+        Write the VPL table of a cost table and its summary per region.
+
+        :param table_ref: The cost table (id, Fase, year column, one column per region).
+        :param new_table_name: The VPL table to (re)create.
+        :param total_table: The summary table to (re)create, one row per region with r1..rN and Total.
+        :param col_: The year column used for the discount factors.
+        :param limites: The last row of each rotation segment but the last one.
+        :return: The NULL costs, which were counted as 0, as returned by ``nulos``.
+        """
+        check_identifiers(new_table_name, total_table)
+        taxas = self.db.TaxaVPL(table_ref, col_)
+
+        with self.db.connect() as conn:
+            ano_col, cols, anos, matrix = self.matriz(conn, table_ref)
+            n = min(len(anos), len(taxas))
+            nulos = self.nulos(matrix[:n], cols, anos)
+            if nulos:
+                print(f"Aviso: custos nulos em '{table_ref}' contados como 0: " +
+                      "; ".join(f"{col} ({', '.join(str(ano) for ano in anos_nulos)})" for col, anos_nulos in nulos.items()))
+            vpl = matrix[:n] * np.asarray(taxas[:n])[:, None]
+            somas, totais = self.resumo(vpl, limites)
+
+            df = pd.DataFrame(vpl, columns=cols)
+            df.insert(0, ano_col, anos[:n])
+            df.to_sql(new_table_name, conn, if_exists='replace', index=False)
+
+            segmentos = [f"r{i + 1}" for i in range(somas.shape[1])]
+            conn.execute(f"DROP TABLE IF EXISTS {total_table}")
+            conn.execute(f"""
+                CREATE TABLE {total_table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    Regiao TEXT,
+                    {', '.join(f'{name} REAL' for name in segmentos)},
+                    Total REAL
+                )
+            """)
+            conn.executemany(
+                f"INSERT INTO {total_table} (Regiao, {', '.join(segmentos)}, Total) "
+                f"VALUES ({', '.join('?' * (len(segmentos) + 2))})",
+                [(regiao, *somas[i].tolist(), float(totais[i])) for i, regiao in enumerate(cols)]
+            )
+        return nulos
@@ -0,0 +1,220 @@
+from Database.Indices import IndexManager
+from Database.Query import check_identifiers
+
+
+class TalhaoDimension:
+    """
+    Parsed components of the talhão codes, stored once per talhão as integer codes.
+
+    A talhão code such as 'GNSABA01234R-056' carries its unit, region, sub-region, project, lot and
+    regime at fixed positions, and the consistency, summary and evaluation steps used to slice them
+    with ``SUBSTR(Talhao, ...)`` on every row of every query, which no index can answer.
+    ``extend`` parses each new talhão once into 'DimTalhao' (one row per talhão, one integer code
+    per component, indexed, and its T700 keys) and the text of each code into 'DimTalhaoCodigo'.
+    Codes are never renumbered, so a talhão keeps its codes as new ones are added.
+    """
+
+    TABLE = 'DimTalhao'
+    CODES = 'DimTalhaoCodigo'
+
+    # Component -> (start, length) of the SUBSTR that used to extract it
+    COMPONENTS = {
+        'Unidade': (1, 2),
+        'Regiao': (3, 2),
+        'SubRegiao': (5, 2),
+        'Projeto': (1, 11),
+        'Lote': (1, 14),
+        'Regime': (12, 1),
+    }
+
+    # Rotation derived from the regime letter, as Consist.pipeline computed it
+    ROTACAO = "CASE WHEN SUBSTR({talhao}, 12, 1) = 'R' THEN 1 ELSE 2 END"
+
+    # T700 keys of the talhão (see Manejo.t700), derived once per talhão and stored as text
+    T700 = ['cod_projeto', 'cod_talhao', 'cod_chave', 'cod_chave_ref', 'remanescente']
+
+    # Values the replaced per-row expressions gave to the rows without a talhão
+    SEM_TALHAO = {'Rotacao': 2, 'remanescente': 'Talhão'}
+
+    # Table -> columns holding talhão codes, read when the dimension is built at import
+    SOURCES = {
+        'IFPC': ['Talhao'],
+        'IFC': ['Talhao'],
+        'Orcamento': ['TalhaoAtual', 'TalhaoReferencia'],
+        'CadastroFlorestal': ['Talhao'],
+    }
+
+    def __init__(self, schema):
+        """
+        :param schema: The SchemaCatalog of the database.
+        """
+        self.schema = schema
+
+    @classmethod
+    def component(cls, start, length):
+        """
+        Return the component extracted by ``SUBSTR(Talhao, start, length)``, or None if it is not stored.
+        """
+        return next((name for name, span in cls.COMPONENTS.items() if span == (start, length)), None)
+
+    def create(self, conn):
+        """
+        Create the dimension tables if they do not exist.
+        """
+        components = ', '.join(f"{name} INTEGER" for name in self.COMPONENTS)
+        t700 = ', '.join(f"{name} TEXT" for name in self.T700)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                     f"(Talhao TEXT PRIMARY KEY, {components}, Rotacao INTEGER, {t700})")
+        # Dimensions built before the T700 keys were cached get them on their next extension
+        for name in self.T700:
+            if not self.schema.has_column(conn, self.TABLE, name):
+                conn.execute(f"ALTER TABLE {self.TABLE} ADD COLUMN {name} TEXT")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.CODES} "
+                     f"(Dimensao TEXT, Codigo INTEGER, Valor TEXT, PRIMARY KEY (Dimensao, Codigo), "
+                     f"UNIQUE (Dimensao, Valor))")
+
+    def extend(self, conn, sources=None):
+        """
+        Parse the talhões of the source tables that are not in the dimension yet.
+
+        :param conn: The connection to write through.
+        :param sources: A dict {table: [talhão columns]} (default: SOURCES). Missing tables and
+                        columns are skipped.
+        :return: The number of talhões added.
+        """
+        sources = self.SOURCES if sources is None else sources
+        self.create(conn)
+        conn.execute("DROP TABLE IF EXISTS temp.TalhoesNovos")
+        conn.execute("CREATE TEMP TABLE TalhoesNovos (Talhao TEXT PRIMARY KEY)")
+        for table, columns in sources.items():
+            if not self.schema.has_table(conn, table):
+                continue
+            for column in columns:
+                if not self.schema.has_column(conn, table, column):
+                    continue
+                check_identifiers(table, column)
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO temp.TalhoesNovos (Talhao)
+                    SELECT DISTINCT {column} FROM {table}
+                    WHERE {column} IS NOT NULL AND {column} NOT IN (SELECT Talhao FROM {self.TABLE})
+                """)
+
+        added = conn.execute("SELECT COUNT(*) FROM temp.TalhoesNovos").fetchone()[0]
+        if added:
+            # New values of each component get the codes after the last one in use
+            for name, (start, length) in self.COMPONENTS.items():
+                conn.execute(f"""
+                    INSERT INTO {self.CODES} (Dimensao, Codigo, Valor)
+                    SELECT :dimensao,
+                           (SELECT COALESCE(MAX(Codigo), 0) FROM {self.CODES} WHERE Dimensao = :dimensao)
+                           + ROW_NUMBER() OVER (ORDER BY Valor),
+                           Valor
+                    FROM (SELECT DISTINCT SUBSTR(Talhao, {start}, {length}) AS Valor FROM temp.TalhoesNovos)
+                    WHERE Valor NOT IN (SELECT Valor FROM {self.CODES} WHERE Dimensao = :dimensao)
+                """, {'dimensao': name})
+
+            # Each code is read through the (Dimensao, Valor) key of the code table
+            codes = ', '.join(
+                f"(SELECT Codigo FROM {self.CODES} WHERE Dimensao = '{name}' AND Valor = SUBSTR(Talhao, {start}, {length}))"
+                for name, (start, length) in self.COMPONENTS.items()
+            )
+            conn.execute(f"""
+                INSERT INTO {self.TABLE} (Talhao, {', '.join(self.COMPONENTS)}, Rotacao)
+                SELECT Talhao, {codes}, {self.ROTACAO.format(talhao='Talhao')}
+                FROM temp.TalhoesNovos
+            """)
+            IndexManager(self.schema).provision(conn, [self.TABLE])
+        conn.execute("DROP TABLE temp.TalhoesNovos")
+        self._derive_t700(conn)
+        return added
+
+    def _derive_t700(self, conn):
+        """
+        Derive the T700 keys of the talhões that do not have them yet, in a single UPDATE.
+
+        Each level of the query reads the keys of the level before it, with the expressions the
+        per-table UPDATEs of Manejo.t700 used.
+        """
+        keys = f"""
+            SELECT Talhao,
+                   SUBSTR(Talhao, 1, 11) AS cod_projeto,
+                   SUBSTR(Talhao, INSTR(Talhao, '-') + 1) AS cod_talhao,
+                   SUBSTR(Talhao, 1, 11) || SUBSTR(Talhao, INSTR(Talhao, '-') + 1) AS cod_chave
+            FROM {self.TABLE}
+            WHERE cod_chave IS NULL
+        """
+        keys = f"""
+            SELECT *,
+                   CASE
+                       WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') THEN 'Remanescente'
+                       WHEN SUBSTR(Talhao, LENGTH(Talhao), 1) IN ('R', 'S') THEN 'Remanescente'
+                       ELSE 'Talhão'
+                   END AS remanescente
+            FROM ({keys})
+        """
+        keys = f"""
+            SELECT *,
+                   CASE
+                       WHEN remanescente = 'Remanescente' THEN
+                           CASE
+                               WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') AND LENGTH(cod_chave) <= 14 THEN
+                                   SUBSTR(Talhao, 1, 11) || '0' || SUBSTR(Talhao, INSTR(Talhao, '-') + 2)
+                               WHEN SUBSTR(cod_talhao, 1, 1) IN ('7', '8') AND LENGTH(cod_chave) > 14 THEN
+                                   SUBSTR(Talhao, 1, 11) || '0' || SUBSTR(Talhao, INSTR(Talhao, '-') + 2, LENGTH(Talhao) - INSTR(Talhao, '-') - 2)
+                               WHEN SUBSTR(Talhao, LENGTH(Talhao), 1) IN ('R', 'S') THEN
+                                   SUBSTR(Talhao, 1, 11) || SUBSTR(Talhao, INSTR(Talhao, '-') + 1, LENGTH(Talhao) - INSTR(Talhao, '-') - 1)
+                               ELSE NULL
+                           END
+                       ELSE NULL
+                   END AS cod_chave_ref
+            FROM ({keys})
+        """
+        conn.execute(f"""
+            UPDATE {self.TABLE}
+            SET {', '.join(f"{name} = k.{name}" for name in self.T700)}
+            FROM ({keys}) AS k
+            WHERE {self.TABLE}.Talhao = k.Talhao
+        """)
+
+    def codes(self, conn, component):
+        """
+        Return the codes of a component as a dict {value: code}.
+        """
+        if not self.schema.has_table(conn, self.CODES):
+            return {}
+        rows = conn.execute(f"SELECT Valor, Codigo FROM {self.CODES} WHERE Dimensao = ?", (component,)).fetchall()
+        return dict(rows)
+
+    def attach(self, conn, table, talhao_column, columns):
+        """
+        Copy components or T700 keys of the talhões to columns of a table, in a single UPDATE joined on the talhão.
+
+        The talhões of the table must be in the dimension (see ``extend``). Rows without a talhão
+        keep their values, except for the columns in SEM_TALHAO, which get the value the expression
+        they replace gave them.
+
+        :param conn: The connection to write through.
+        :param table: The table to update (the columns must exist).
+        :param talhao_column: The column of the table holding the talhão code.
+        :param columns: A dict {target column: component, 'Rotacao' or T700 key}.
+        """
+        check_identifiers(table, talhao_column, *columns)
+        selected = []
+        for target, name in columns.items():
+            check_identifiers(name)
+            if name in self.COMPONENTS:
+                selected.append(f"(SELECT Valor FROM {self.CODES} WHERE Dimensao = '{name}' AND Codigo = d.{name}) "
+                                f"AS {target}")
+            else:
+                selected.append(f"d.{name} AS {target}")
+
+        conn.execute(f"""
+            UPDATE {table}
+            SET {', '.join(f"{target} = v.{target}" for target in columns)}
+            FROM (SELECT d.Talhao, {', '.join(selected)} FROM {self.TABLE} AS d) AS v
+            WHERE {table}.{talhao_column} = v.Talhao
+        """)
+        for target, name in columns.items():
+            if name in self.SEM_TALHAO:
+                conn.execute(f"UPDATE {table} SET {target} = ? WHERE {talhao_column} IS NULL",
+                             (self.SEM_TALHAO[name],))
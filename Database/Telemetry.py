@@ -0,0 +1,204 @@
+import ctypes
+import os
+import sqlite3
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from Database.Pool import ConnectionPool
+
+
+class PipelineTelemetry:
+    """
+    Per-step measurements of a pipeline run (APEX or Consist.pipeline), saved to 'PipelineRunStats'.
+
+    Each step wrapped in ``etapa`` records:
+
+    - Tempo / TempoCPU: wall time and CPU time of the calling thread, in seconds;
+    - LinhasEscritas: rows inserted, updated or deleted through the writer connection;
+    - InstrucoesSQL: SQLite virtual machine instructions run on the writer connection (counted in
+      blocks of PASSO), which grow with the rows the statements scan. The sqlite3 module does not
+      expose the row counters of a statement, so this stands for the rows read;
+    - PaginasLidas / PaginasEscritas: storage I/O of the process over the step, in database pages.
+      SQLite does not expose its pager counters through the sqlite3 module either, so they come
+      from the operating system (/proc/self/io on Linux, GetProcessIoCounters on Windows) and are
+      NULL elsewhere;
+    - MemoriaPico: peak memory allocated by Python during the step, in bytes (tracemalloc).
+
+    The rows of a run are written once at the end (``save``), also when the run fails, so a failed
+    run still shows where its time went.
+    """
+
+    TABLE = 'PipelineRunStats'
+
+    # Instructions between two calls of the progress handler
+    PASSO = 1000
+
+    COLUMNS = ['Tempo', 'TempoCPU', 'LinhasEscritas', 'InstrucoesSQL', 'PaginasLidas', 'PaginasEscritas',
+               'MemoriaPico']
+
+    def __init__(self, db, pipeline, callback=None, memoria=False):
+        """
+        :param db: Path to the SQLite database file.
+        :param pipeline: The name the run is saved under (e.g. 'APEX', 'Consist').
+        :param callback: Called with the dict of each step as soon as it finishes (e.g. a Qt signal's emit).
+        :param memoria: Whether to trace the peak Python memory of the steps (MemoriaPico is NULL
+                        otherwise). Tracing slows the Python-heavy steps down, up to twice as slow.
+        """
+        self.db = db
+        self.pipeline = pipeline
+        self.callback = callback
+        self.memoria = memoria
+        self.etapas = []
+        self.inicio = datetime.now().isoformat(timespec='seconds')
+        self._page_size = None
+
+    def connect(self):
+        return ConnectionPool.for_path(self.db).writer()
+
+    @staticmethod
+    def io_bytes():
+        """
+        Return the bytes (read, written) by the process so far, or None if the system does not tell.
+        """
+        if os.path.exists('/proc/self/io'):
+            with open('/proc/self/io') as f:
+                counters = dict(line.split(':') for line in f if ':' in line)
+            return int(counters['read_bytes']), int(counters['write_bytes'])
+        if os.name == 'nt':
+            class IO_COUNTERS(ctypes.Structure):
+                _fields_ = [(name, ctypes.c_ulonglong) for name in (
+                    'ReadOperationCount', 'WriteOperationCount', 'OtherOperationCount',
+                    'ReadTransferCount', 'WriteTransferCount', 'OtherTransferCount')]
+
+            counters = IO_COUNTERS()
+            kernel32 = ctypes.windll.kernel32
+            if kernel32.GetProcessIoCounters(kernel32.GetCurrentProcess(), ctypes.byref(counters)):
+                return counters.ReadTransferCount, counters.WriteTransferCount
+        return None
+
+    @contextmanager
+    def etapa(self, name):
+        """
+        Measure the enclosed step. The step's own errors propagate unchanged.
+
+        :param name: The step name.
+        """
+        conn = self.connect()
+        if self._page_size is None:
+            with conn:
+                self._page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+
+        instrucoes = [0]
+
+        def contar():
+            instrucoes[0] += self.PASSO
+            return 0
+
+        tracing = self.memoria and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        elif self.memoria:
+            tracemalloc.reset_peak()
+        changes = conn.total_changes
+        io = self.io_bytes()
+        cpu, wall = time.thread_time(), time.perf_counter()
+        conn.set_progress_handler(contar, self.PASSO)
+        try:
+            yield
+        finally:
+            conn.set_progress_handler(None, self.PASSO)
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            io_fim = self.io_bytes()
+            pico = tracemalloc.get_traced_memory()[1] if self.memoria else None
+            if tracing:
+                tracemalloc.stop()
+
+            stats = {
+                'Etapa': name,
+                'Tempo': wall,
+                'TempoCPU': cpu,
+                'LinhasEscritas': conn.total_changes - changes,
+                'InstrucoesSQL': instrucoes[0],
+                'PaginasLidas': (io_fim[0] - io[0]) // self._page_size if io and io_fim else None,
+                'PaginasEscritas': (io_fim[1] - io[1]) // self._page_size if io and io_fim else None,
+                'MemoriaPico': pico,
+            }
+            self.etapas.append(stats)
+            if self.callback is not None:
+                self.callback(stats)
+
+    @classmethod
+    def ultima(cls, db):
+        """
+        Return the number of the last run saved in 'PipelineRunStats' of ``db``, or 0 if there is none.
+        """
+        pool = ConnectionPool.for_path(db)
+        with pool.reader() as conn:
+            if not pool.schema.has_table(conn, cls.TABLE):
+                return 0
+            return conn.execute(f"SELECT COALESCE(MAX(Execucao), 0) FROM {cls.TABLE}").fetchone()[0]
+
+    @classmethod
+    def carregar(cls, db, desde=0):
+        """
+        Read back the runs saved in 'PipelineRunStats' of ``db`` after run ``desde``, e.g. to save them
+        in another base.
+
+        :return: A list of PipelineTelemetry, one per run in order, with the steps in ``etapas``.
+        """
+        pool = ConnectionPool.for_path(db)
+        with pool.reader() as conn:
+            if not pool.schema.has_table(conn, cls.TABLE):
+                return []
+            rows = conn.execute(
+                f"SELECT Execucao, Pipeline, Inicio, Etapa, {', '.join(cls.COLUMNS)} FROM {cls.TABLE} "
+                f"WHERE Execucao > ? ORDER BY Execucao, Ordem", (desde,)
+            ).fetchall()
+        execucoes = {}
+        for execucao, pipeline, inicio, etapa, *values in rows:
+            if execucao not in execucoes:
+                execucoes[execucao] = cls(db, pipeline)
+                execucoes[execucao].inicio = inicio
+            execucoes[execucao].etapas.append({'Etapa': etapa, **dict(zip(cls.COLUMNS, values))})
+        return list(execucoes.values())
+
+    def save(self):
+        """
+        Write the steps measured so far as one run of 'PipelineRunStats'.
+
+        :return: The run number (Execucao), or None if no step was measured.
+        """
+        if not self.etapas:
+            return None
+        try:
+            with self.connect() as conn:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                        Execucao INTEGER,
+                        Pipeline TEXT,
+                        Inicio TEXT,
+                        Ordem INTEGER,
+                        Etapa TEXT,
+                        Tempo FLOAT,
+                        TempoCPU FLOAT,
+                        LinhasEscritas INTEGER,
+                        InstrucoesSQL INTEGER,
+                        PaginasLidas INTEGER,
+                        PaginasEscritas INTEGER,
+                        MemoriaPico INTEGER
+                    )
+                """)
+                execucao = conn.execute(f"SELECT COALESCE(MAX(Execucao), 0) + 1 FROM {self.TABLE}").fetchone()[0]
+                conn.executemany(
+                    f"INSERT INTO {self.TABLE} (Execucao, Pipeline, Inicio, Ordem, Etapa, {', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(self.COLUMNS) + 5))})",
+                    [(execucao, self.pipeline, self.inicio, ordem, stats['Etapa'], *(stats[c] for c in self.COLUMNS))
+                     for ordem, stats in enumerate(self.etapas, start=1)]
+                )
+        except sqlite3.Error as e:
+            print(f"Erro ao salvar as medições em '{self.TABLE}': {e}")
+            return None
+        self.etapas = []
+        return execucao
@@ -71,12 +71,12 @@ class OpenDataBase:
         # Create the database file by connecting to it
         db = Database(base_path)
         db.connect()
-        self.parent.apex_comp_1.addItems([x for x in db.list_apexes() if x.startswith('Apex_Manejo')])
-        self.parent.apex_comp_2.addItems([x for x in db.list_apexes() if x.startswith('Apex_Manejo')])
+        tables = db.list_manejo_tables()
+        self.parent.apex_comp_1.addItems(tables)
+        self.parent.apex_comp_2.addItems(tables)
         db.create_tabs_for_apex_manejo_tables(self.parent.utility_functions.add_new_tab)
 
-        tables = [x for x in db.list_apexes() if x.startswith('Apex_Manejo')]
-        if len([x for x in db.list_apexes() if x.startswith('Apex_Manejo')]) > 0:
+        if len(tables) > 0:
             db = Consist(base_path)
             values = []
             for t in tables:
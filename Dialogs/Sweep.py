@@ -0,0 +1,100 @@
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QPushButton, QLineEdit, QLabel, QFormLayout, QCheckBox
+
+from Database.Manejo import Manejo
+from Threads.Worker import Varredura
+
+
+class SweepDialog(QDialog):
+    """
+    Asks for the values of each 'Parametros' column to sweep.
+
+    Every field starts with the current value; a comma-separated list (e.g. '8, 9, 10') adds that
+    column to the grid, and the sweep runs every combination of the listed values.
+    """
+
+    def __init__(self, columns, values, parent=None):
+        super(SweepDialog, self).__init__(parent)
+        self.setWindowTitle("Varredura de Parâmetros")
+        self.setWindowIcon(QIcon(':/svg/Style=outline123123.svg'))
+        self.setStyleSheet("background-color: #F1F2F6;")
+        self.layout = QVBoxLayout(self)
+
+        self.labelInfo = QLabel("Separe os valores por vírgula para incluir o parâmetro na varredura.", self)
+        self.labelInfo.setStyleSheet("font-family: 'Poppins';font-size: 12px;")
+        self.layout.addWidget(self.labelInfo)
+
+        self.form = QFormLayout()
+        self.fields = {}
+        for column, value in zip(columns, values):
+            field = QLineEdit(str(value), self)
+            field.setStyleSheet("background-color: #FFFFFF;font-family: 'Poppins';font-size: 12px;")
+            self.form.addRow(column, field)
+            self.fields[column] = field
+        self.layout.addLayout(self.form)
+
+        self.checkManter = QCheckBox("Manter as tabelas de todos os cenários", self)
+        self.checkManter.setStyleSheet("font-family: 'Poppins';font-size: 12px;")
+        self.layout.addWidget(self.checkManter)
+
+        self.buttonOk = QPushButton("OK", self)
+        self.buttonCancel = QPushButton("Cancelar", self)
+        # Set font family for the buttons using stylesheet
+        button_style = """
+                QPushButton {
+                    font-family: 'Poppins';
+                    font-size: 12px;
+                    background-color: #878672;
+                    border-radius: 4px;
+                    padding: 6px 5px;
+                }
+                QPushButton:hover {
+                    font-family: 'Poppins';
+                    font-size: 12px;
+                    background-color: #16271C;
+                    color: white;
+                    border-radius: 4px;
+                    padding: 6px 5px;
+                }
+                """
+
+        self.buttonOk.setStyleSheet(button_style)
+        self.buttonCancel.setStyleSheet(button_style)
+
+        self.buttonOk.clicked.connect(self.accept)
+        self.buttonCancel.clicked.connect(self.reject)
+
+        self.layout.addWidget(self.buttonOk)
+        self.layout.addWidget(self.buttonCancel)
+
+    def getGrid(self):
+        """
+        Return the swept columns (those with more than one value) and their values, as a dict {column: list of floats}.
+
+        :raises ValueError: If a field is not a number or a list of numbers.
+        """
+        grid = {}
+        for column, field in self.fields.items():
+            values = [float(x) for x in field.text().split(',') if x.strip()]
+            if len(values) > 1:
+                grid[column] = values
+        return grid
+
+    @staticmethod
+    def askScenarios(db, parent=None):
+        """
+        Show the dialog for a database.
+
+        :param db: Path to the SQLite database file.
+        :return: A tuple (scenarios, keep tables), or None if the dialog was cancelled or nothing was swept.
+        """
+        manejo = Manejo(db)
+        columns = manejo.list_columns('Parametros')[1:]
+        values = manejo.Parameters('Parametros')[1:]
+
+        dialog = SweepDialog(columns, values, parent)
+        if dialog.exec_() == QDialog.Accepted:
+            grid = dialog.getGrid()
+            if grid:
+                return Varredura.grade(grid), dialog.checkManter.isChecked()
+        return None
@@ -7,7 +7,8 @@ from PyQt5 import QtCore
 from Database.Consistencia import Consist
 from Database.Database import Database
 from Recursos.custom_widget import CustomMenu, CustomMenuItem
-from Threads.Worker import APEX
+from Dialogs.Sweep import SweepDialog
+from Threads.Worker import APEX, Varredura
 
 
 class UiSetup:
@@ -151,6 +152,7 @@ class UiSetup:
         self.add_custom_menu_item('Novo', self.main_window.create_db.criar_base, self.main_window.menu_projeto)
         self.add_custom_menu_item('Abrir', self.main_window.open_db.open_base, self.main_window.menu_projeto)
         self.add_custom_menu_item('Compactar', lambda: self.main_window.utility_functions.database_vacumm(), self.main_window.menu_projeto)
+        self.add_custom_menu_item('Varredura', self.open_sweep, self.main_window.menu_projeto)
         self.main_window.main_button_projeto.clicked.connect(
             lambda: self.main_window.utility_functions.show_menu(self.main_window.main_button_projeto, self.main_window.menu_projeto)
         )
@@ -349,12 +351,45 @@ class UiSetup:
         self.main_window.progressBar.setValue(0)
 
         self.main_window.thread = QtCore.QThread()
-        self.main_window.worker = APEX(self.main_window.progressBar, self.main_window.label_base.text(), self.main_window.t700.isChecked())
+        # Resumable: a run stopped by an error or by closing the app goes on from its last step next time
+        self.main_window.worker = APEX(self.main_window.progressBar, self.main_window.label_base.text(), self.main_window.t700.isChecked(),
+                                       retomar=True)
         self.main_window.worker.moveToThread(self.main_window.thread)
         self.main_window.thread.started.connect(self.main_window.worker.run)
         self.main_window.worker.barra_att.connect(self.update_progress)
         self.main_window.worker.bar_max.connect(self.set_progress_bar_max)
         self.main_window.worker.fim.connect(self.finalizado_simulacao_manejo)
+        self.main_window.worker.etapa_stats.connect(self.log_etapa)
+        self.main_window.thread.start()
+
+    def open_sweep(self):
+        """
+        Ask for a grid of 'Parametros' values and start the scenario sweep.
+        """
+        try:
+            result = SweepDialog.askScenarios(self.main_window.label_base.text(), self.main_window)
+        except ValueError as e:
+            print(f"Invalid sweep values: {e}")
+            return
+        if result:
+            self.start_sweep(*result)
+
+    def start_sweep(self, cenarios, manter_tabelas=False):
+        if self.main_window.thread and self.main_window.thread.isRunning():
+            self.main_window.thread.quit()
+            self.main_window.thread.wait()
+        self.main_window.progressBar.setValue(0)
+
+        self.main_window.thread = QtCore.QThread()
+        self.main_window.worker = Varredura(self.main_window.progressBar, self.main_window.label_base.text(),
+                                            self.main_window.t700.isChecked(), cenarios,
+                                            manter_tabelas=manter_tabelas)
+        self.main_window.worker.moveToThread(self.main_window.thread)
+        self.main_window.thread.started.connect(self.main_window.worker.run)
+        self.main_window.worker.barra_att.connect(self.update_progress)
+        self.main_window.worker.bar_max.connect(self.set_progress_bar_max)
+        self.main_window.worker.fim.connect(self.finalizado_simulacao_manejo)
+        self.main_window.worker.etapa_stats.connect(self.log_etapa)
         self.main_window.thread.start()
 
     def update_progress(self, value):
@@ -363,10 +398,16 @@ class UiSetup:
     def set_progress_bar_max(self, max_value):
         self.main_window.progressBar.setMaximum(max_value)
 
+    def log_etapa(self, stats):
+        # Same line as Threads/Headless.py; the full measurements are kept in 'PipelineRunStats'
+        print(f"[APEX] {stats['Etapa']}: {stats['Tempo']:.2f} s")
+
     def finalizado_simulacao_manejo(self):
         self.main_window.progressBar.setValue(0)
         db = Database(self.main_window.label_base.text())
-        n = [x for x in db.list_tables() if x.startswith('Apex_Manejo')]
+        n = db.list_manejo_tables()
+        if not n:
+            return
         goal = n[-1]
         self.main_window.utility_functions.add_new_tab(goal)
         self.main_window.apex_comp_1.clear()
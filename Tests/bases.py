@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Benchmarks.Etapas import comparar
+from Benchmarks.Sintetico import gerar, remover
+from Database.Consistencia import Consist
+from Database.Importacao import importar_planilha
+from Database.Pool import ConnectionPool
+
+
+class BaseSintetica(unittest.TestCase):
+    """
+    Test case over small synthetic bases (see Benchmarks/Sintetico.py) in a temporary folder.
+    """
+
+    TALHOES = 300
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for arquivo in os.listdir(self.pasta):
+            if arquivo.endswith('.db'):
+                remover(os.path.join(self.pasta, arquivo))
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def preparar(self, db):
+        """
+        Change the generated tables of a base before the consistency pipeline runs.
+        """
+
+    def base(self, nome='base.db', seed=1):
+        """
+        Generate a base, apply preparar and run the consistency pipeline on it.
+
+        :return: The path of the base.
+        """
+        db = os.path.join(self.pasta, nome)
+        gerar(db, self.TALHOES, seed)
+        self.preparar(db)
+        Consist(db).pipeline()
+        return db
+
+    def substituir(self, db, table_name, df):
+        """
+        Replace a table of a base with a DataFrame, imported as the interface imports the sheets.
+        """
+        pool = ConnectionPool.for_path(db)
+        with pool.writer() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+            importar_planilha(conn, pool.schema, df, table_name)
+
+    def assertTabelasIguais(self, esperado, obtido, tabelas):
+        """
+        Assert that the tables (or 'table.column' resources) hold the same values in both bases.
+        """
+        diferencas = comparar(esperado, obtido, tabelas)
+        self.assertEqual(diferencas, [], f"Diferenças: {diferencas}")
@@ -0,0 +1,61 @@
+import sqlite3
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from Database.Colheita import PonderacaoColheita
+from Database.Manejo import Manejo
+from Tests.bases import BaseSintetica
+
+
+class TestCustosColheitaCNB(BaseSintetica):
+    """
+    'CustosColheitaCNB' is the area-weighted mean of the fronts, weighted into POND with the 'CNB' weights.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.base()
+        self.manejo = Manejo(self.db)
+        self.manejo.ResInclinacao()
+        self.manejo.CustosColheita()
+
+    def ler(self, query):
+        with sqlite3.connect(self.db) as conn:
+            df = pd.read_sql(query, conn)
+        conn.close()
+        return df
+
+    def esperado(self):
+        resumo = self.ler("SELECT * FROM ClassesInclinacaoResumo").set_index('FRENTE')
+        frentes = [self.ler(f"SELECT PROD, VMI, PD, GW FROM {table} ORDER BY rowid")
+                   for table in PonderacaoColheita.FRENTES.values()]
+        n = min(len(frente) for frente in frentes)
+        soma = sum(frente.iloc[:n].reset_index(drop=True) * resumo.loc[nome, 'AREA']
+                   for nome, frente in zip(PonderacaoColheita.FRENTES, frentes))
+        cnb = soma / resumo.loc['CNB', 'AREA']
+        pd_cnb = resumo.loc['CNB', 'PD'] if pd.notna(resumo.loc['CNB', 'PD']) else 0
+        gw_cnb = resumo.loc['CNB', 'GW_CE'] if pd.notna(resumo.loc['CNB', 'GW_CE']) else 0
+        cnb['POND'] = cnb['PD'] * pd_cnb + cnb['GW'] * gw_cnb
+        return cnb
+
+    def test_cnb(self):
+        self.manejo.CustosColheita(is_cnb=True)
+        obtido = self.ler(f"SELECT PROD, VMI, PD, GW, POND FROM {PonderacaoColheita.CNB} ORDER BY id")
+        esperado = self.esperado()
+        self.assertGreater(len(obtido), 0)
+        self.assertEqual(len(obtido), len(esperado))
+        for column in obtido.columns:
+            np.testing.assert_allclose(obtido[column].to_numpy(float), esperado[column].to_numpy(float),
+                                       rtol=1e-9, err_msg=column)
+
+    def test_cnb_refeito(self):
+        self.manejo.CustosColheita(is_cnb=True)
+        primeiro = self.ler(f"SELECT * FROM {PonderacaoColheita.CNB}")
+        self.manejo.CustosColheita(is_cnb=True)
+        pd.testing.assert_frame_equal(self.ler(f"SELECT * FROM {PonderacaoColheita.CNB}"), primeiro)
+
+
+if __name__ == '__main__':
+    unittest.main()
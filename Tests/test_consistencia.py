@@ -0,0 +1,47 @@
+import sqlite3
+import unittest
+
+from Database.Consistencia import Consist
+from Tests.bases import BaseSintetica
+from Threads.Runner import ManejoRunner
+
+
+class TestRegionalResumo(BaseSintetica):
+    """
+    The regional summaries follow the changes to the output table made after the first call.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.base()
+        self.goal = ManejoRunner(self.db, True).simulate(progress=False)
+        self.assertIsNotNone(self.goal)
+
+    def resumos(self, consist):
+        return [consist.regional_resumo(self.goal, regime, regiao, 3)
+                for regime in ('Reforma', 'Regeneração') for regiao in ('SA', 'CO', 'BO')]
+
+    def test_escrita_pela_instancia(self):
+        consist = Consist(self.db)
+        antes = self.resumos(consist)
+        with consist.connect() as conn:
+            conn.execute(f"UPDATE {self.goal} SET Area = Area * 2")
+        self.assertEqual(self.resumos(consist), self.resumos(Consist(self.db)))
+        self.assertNotEqual(self.resumos(consist), antes)
+
+    def test_tabela_recriada(self):
+        consist = Consist(self.db)
+        antes = self.resumos(consist)
+        # Another connection replaces the table, as a new run with the same name would
+        with sqlite3.connect(self.db) as conn:
+            conn.execute(f"CREATE TABLE copia AS SELECT * FROM {self.goal}")
+            conn.execute(f"DROP TABLE {self.goal}")
+            conn.execute(f"CREATE TABLE {self.goal} AS SELECT * FROM copia")
+            conn.execute(f"UPDATE {self.goal} SET Area = Area * 3")
+        conn.close()
+        self.assertEqual(self.resumos(consist), self.resumos(Consist(self.db)))
+        self.assertNotEqual(self.resumos(consist), antes)
+
+
+if __name__ == '__main__':
+    unittest.main()
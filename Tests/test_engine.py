@@ -0,0 +1,51 @@
+import unittest
+
+import pandas as pd
+
+from Benchmarks.Sintetico import MATERIAIS
+from Database.Engine import VectorEngine
+from Database.Manejo import Manejo
+from Tests.bases import BaseSintetica
+from Threads.Runner import ManejoRunner
+
+
+class TestVectorEngine(BaseSintetica):
+    """
+    The vectorized manejo chain must write the same output table as the SQL pipeline.
+    """
+
+    valores = ('SIM', 'NÃO')
+
+    def preparar(self, db):
+        # RTMaterialGenetico as it comes from the sheet: text flags, not numbers
+        n = len(MATERIAIS)
+        self.substituir(db, 'RTMaterialGenetico', pd.DataFrame({
+            'DCR_MatGen': MATERIAIS,
+            'RegAlta': [self.valores[i % 2] for i in range(n)],
+            'RegBaixaEncosta': [self.valores[i // 2 % 2] for i in range(n)],
+            'RegBaixaBaixada': [self.valores[i // 3 % 2] for i in range(n)],
+        }))
+
+    def simular(self, db, vetorizado):
+        goal = ManejoRunner(db, True, vetorizado=vetorizado, incremental=False).simulate(progress=False)
+        self.assertIsNotNone(goal)
+        return goal
+
+    def test_igual_ao_sql(self):
+        sql, vetor = self.base('sql.db'), self.base('vetor.db')
+        self.assertTrue(VectorEngine(Manejo(vetor)).supports())
+        goal = self.simular(sql, False)
+        self.assertEqual(self.simular(vetor, True), goal)
+        self.assertTabelasIguais(sql, vetor, [goal.lower()])
+
+
+class TestVectorEngineMisto(TestVectorEngine):
+    """
+    Numbers and text in the same columns, with the number 0 that marks a material without regeneration.
+    """
+
+    valores = ('SIM', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import functools
+import unittest
+
+from Database.Journal import RunJournal
+from Tests.bases import BaseSintetica
+from Threads.Runner import ManejoRunner
+
+
+class TestRunJournal(BaseSintetica):
+    """
+    The output table of an interrupted run is not listed as finished until the run is resumed.
+    """
+
+    def manejo_tables(self, runner):
+        return [x for x in runner.db.list_tables() if x.startswith('Apex_Manejo')]
+
+    def falhar(self, runner):
+        def falha(*args):
+            raise RuntimeError('falha simulada')
+
+        original = runner.db.CustosTransporteGeral
+        runner.db.CustosTransporteGeral = functools.wraps(original)(falha)
+        self.assertIsNone(runner.simulate(progress=False))
+
+    def test_transacao_unica(self):
+        # Without resuming (the default) a failed run leaves nothing behind
+        db = self.base()
+        runner = ManejoRunner(db, True)
+        self.falhar(runner)
+        self.assertEqual(self.manejo_tables(runner), [])
+        self.assertEqual(RunJournal(db).pending(), {})
+
+    def test_interrompida(self):
+        db = self.base()
+        runner = ManejoRunner(db, True, retomar=True)
+        self.falhar(runner)
+
+        journal = RunJournal(db)
+        tables = self.manejo_tables(runner)
+        self.assertEqual(tables, ['Apex_Manejo_1'])
+        self.assertEqual(journal.finished(tables), [])
+
+        goal = ManejoRunner(db, True, retomar=True).simulate(progress=False)
+        self.assertEqual(goal, 'Apex_Manejo_1')
+        self.assertEqual(journal.finished(self.manejo_tables(runner)), ['Apex_Manejo_1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from Threads.Scheduler import StepGraph
+
+
+class TestStepGraph(unittest.TestCase):
+
+    def graph(self, executados):
+        graph = StepGraph()
+        # Declared out of order: 'total' reads what the two branches write
+        graph.add('total', executados.append, ('total',), reads={'saida.custo_reg', 'saida.custo_ref'}, writes={'saida.total'})
+        graph.add('ref_reg', executados.append, ('ref_reg',), reads={'base'}, writes={'saida.custo_reg'})
+        graph.add('ref_ref', executados.append, ('ref_ref',), reads={'base'}, writes={'saida.custo_ref'})
+        graph.add('base', executados.append, ('base',), writes={'base'})
+        return graph
+
+    def test_ordem(self):
+        executados, progresso = [], []
+        self.graph(executados).run(lambda node: node.func(*node.args), progresso.append)
+        self.assertEqual(executados, ['base', 'ref_reg', 'ref_ref', 'total'])
+        self.assertEqual(progresso, [1, 2, 3, 4])
+
+    def test_erro_interrompe(self):
+        executados = []
+
+        def execute(node):
+            if node.name == 'ref_reg':
+                raise RuntimeError('falha')
+            node.func(*node.args)
+
+        with self.assertRaises(RuntimeError):
+            self.graph(executados).run(execute)
+        self.assertEqual(executados, ['base'])
+
+    def test_ciclo(self):
+        graph = StepGraph()
+        graph.add('a', print, reads={'x'}, writes={'y'})
+        graph.add('b', print, reads={'y'}, writes={'x'})
+        with self.assertRaises(ValueError):
+            graph.order()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import sqlite3
+import unittest
+
+from Database.Manejo import Manejo
+from Tests.bases import BaseSintetica
+
+
+class TestVPLSilvicultura(BaseSintetica):
+    """
+    NULL costs are counted as 0 in the VPL summary and reported per region.
+    """
+
+    def test_custos_nulos(self):
+        db = self.base()
+        with sqlite3.connect(db) as conn:
+            conn.execute("UPDATE CustosSilvicultura_REF_REG SET PO = NULL WHERE ANO IN (2, 3)")
+        conn.close()
+
+        manejo = Manejo(db)
+        nulos = manejo.CustosSilviculturaVPL('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REG_VPL', 'ANO')
+        self.assertEqual(nulos, {'PO': [2, 3]})
+
+        with sqlite3.connect(db) as conn:
+            r1, r2, total = conn.execute(
+                "SELECT r1, r2, Total FROM CustosSilvicultura_REF_REG_VPL_Total WHERE Regiao = 'PO'").fetchone()
+            soma = conn.execute("SELECT TOTAL(PO) FROM CustosSilvicultura_REF_REG_VPL").fetchone()[0]
+        conn.close()
+        self.assertAlmostEqual(total, r1 + r2)
+        self.assertAlmostEqual(total, soma)
+
+    def test_sem_nulos(self):
+        db = self.base()
+        manejo = Manejo(db)
+        self.assertEqual(manejo.CustosSilviculturaVPL('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REG_VPL', 'ANO'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from Benchmarks.Sintetico import gerar, remover
+
+
+class TestSintetico(unittest.TestCase):
+    """
+    The synthetic sheets are stored as the interface stores the imported workbooks.
+    """
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.db = os.path.join(self.pasta, 'base.db')
+        gerar(self.db, 100)
+
+    def tearDown(self):
+        remover(self.db)
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def consultar(self, query):
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute(query).fetchall()
+        conn.close()
+        return rows
+
+    def test_tipos_declarados(self):
+        # Each column is declared with the dtype of the column before it, 'id' included
+        tipos = [(row[1], row[2]) for row in self.consultar("PRAGMA table_info(CustosColheitaBO)")]
+        self.assertEqual(tipos, [('id', 'INTEGER'), ('PROD', 'int64'), ('VMI', 'int64'), ('PD', 'float64'),
+                                 ('GW', 'float64')])
+
+    def test_material_genetico(self):
+        valores = self.consultar("""
+            SELECT DISTINCT typeof(v), v FROM (
+                SELECT RegAlta AS v FROM RTMaterialGenetico
+                UNION ALL SELECT RegBaixaEncosta FROM RTMaterialGenetico
+                UNION ALL SELECT RegBaixaBaixada FROM RTMaterialGenetico
+            ) ORDER BY v
+        """)
+        self.assertEqual(valores, [('text', 'NÃO'), ('text', 'SIM')])
+
+
+if __name__ == '__main__':
+    unittest.main()
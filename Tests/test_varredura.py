@@ -0,0 +1,94 @@
+import json
+import sqlite3
+import unittest
+
+import pandas as pd
+
+from Tests.bases import BaseSintetica
+from Threads.Runner import ManejoRunner, VarreduraRunner
+
+
+class TestVarredura(BaseSintetica):
+    """
+    A sweep stores one result per scenario and leaves 'Parametros' and 'ParametrosHistorico' as they were.
+    """
+
+    CENARIOS = [{'Juros': 8}, {'Juros': 10}, {'Juros': 12}]
+
+    def ler(self, db, query):
+        with sqlite3.connect(db) as conn:
+            df = pd.read_sql(query, conn)
+        conn.close()
+        return df
+
+    def contagem(self, db, table):
+        with sqlite3.connect(db) as conn:
+            existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+            n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] if existe else None
+        conn.close()
+        return n
+
+    def resultado(self, db):
+        return self.ler(db, """
+            SELECT c.Parametros, c.ParametrosEfetivos, r.Talhao, r.CustoMadAV, r.ManejoAPEX_Final
+            FROM ApexCenariosResultado r JOIN ApexCenarios c USING (Cenario)
+            ORDER BY c.Cenario, r.rowid
+        """)
+
+    def test_parametros_inalterados(self):
+        db = self.base()
+        antes = self.ler(db, "SELECT * FROM Parametros")
+        resultados = VarreduraRunner(db, True, self.CENARIOS).run()
+        self.assertEqual([cenario for cenario, _ in resultados], self.CENARIOS)
+        pd.testing.assert_frame_equal(self.ler(db, "SELECT * FROM Parametros"), antes)
+        self.assertIsNone(self.contagem(db, 'ParametrosHistorico'))
+        self.assertEqual(self.contagem(db, 'ApexCenarios'), len(self.CENARIOS))
+
+    def test_igual_a_execucao_simples(self):
+        db = self.base()
+        VarreduraRunner(db, True, self.CENARIOS[1:2]).run()
+        # The same scenario written to 'Parametros' and run as a single run
+        simples = self.base('simples.db')
+        with sqlite3.connect(simples) as conn:
+            conn.execute("UPDATE Parametros SET Juros = ? WHERE rowid = (SELECT MAX(rowid) FROM Parametros)",
+                         (self.CENARIOS[1]['Juros'],))
+        conn.close()
+        goal = ManejoRunner(simples, True).simulate(progress=False)
+        esperado = self.ler(simples, f"SELECT Talhao, CustoMadAV, ManejoAPEX_Final FROM {goal} ORDER BY rowid")
+        obtido = self.resultado(db).drop(columns=['Parametros', 'ParametrosEfetivos'])
+        pd.testing.assert_frame_equal(obtido, esperado)
+
+    def test_parametros_efetivos(self):
+        db = self.base()
+        VarreduraRunner(db, True, self.CENARIOS[:1]).run()
+        # 'Parametros' edited between two sweeps of the same scenario
+        with sqlite3.connect(db) as conn:
+            conn.execute("UPDATE Parametros SET AvaliacaoEco = 90")
+        conn.close()
+        VarreduraRunner(db, True, self.CENARIOS[:1]).run()
+
+        base = self.ler(db, "SELECT * FROM Parametros").drop(columns='id').iloc[-1].to_dict()
+        cenarios = self.ler(db, "SELECT Parametros, ParametrosEfetivos FROM ApexCenarios ORDER BY Cenario")
+        self.assertEqual(cenarios['Parametros'].nunique(), 1)
+        primeiro, segundo = (json.loads(efetivos) for efetivos in cenarios['ParametrosEfetivos'])
+        self.assertEqual(segundo, {**base, 'Juros': 8.0})
+        self.assertNotEqual(primeiro['AvaliacaoEco'], segundo['AvaliacaoEco'])
+
+    def test_processos(self):
+        serial, paralelo = self.base('serial.db'), self.base('paralelo.db')
+        VarreduraRunner(serial, True, self.CENARIOS).run()
+        antes = self.ler(paralelo, "SELECT MAX(Execucao) AS n FROM PipelineRunStats")['n'].iloc[0]
+        etapas = []
+        resultados = VarreduraRunner(paralelo, True, self.CENARIOS, processos=2, estatisticas=etapas.append).run()
+        self.assertEqual(resultados, [(cenario, None) for cenario in self.CENARIOS])
+        pd.testing.assert_frame_equal(self.resultado(paralelo), self.resultado(serial))
+
+        # The measurements of the processes are saved in the base, one run per scenario, and relayed
+        stats = self.ler(paralelo, f"SELECT Execucao, Etapa FROM PipelineRunStats WHERE Execucao > {antes} "
+                                   f"ORDER BY Execucao, Ordem")
+        self.assertEqual(stats['Execucao'].nunique(), len(self.CENARIOS))
+        self.assertEqual([e['Etapa'] for e in etapas], stats['Etapa'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+"""
+Runs the consistency and manejo pipelines without the interface (and without importing Qt), for
+overnight runs on a server and batch evaluations:
+
+    python -m Threads.Headless base.db
+    python -m Threads.Headless base.db --etapas manejo -p Juros=10 --csv saida/
+    python -m Threads.Headless base.db --etapas manejo --grade Juros=8,10 --grade AvaliacaoEco=90,95
+    python -m Threads.Headless base.db --etapas manejo --grade Juros=6,7,8,9,10,11,12 --processos 4
+
+The result tables are written to the database as in the interface, and the time of each step is
+printed at the end (and saved to 'PipelineRunStats', see PipelineTelemetry).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from Database.Consistencia import Consist
+from Database.Pool import ConnectionPool
+from Database.Query import check_identifiers
+from Database.Telemetry import PipelineTelemetry
+from Threads.Runner import ManejoRunner, VarreduraRunner
+
+
+ETAPAS = {'consistencia': ('consistencia',), 'manejo': ('manejo',), 'ambos': ('consistencia', 'manejo')}
+
+# The table the consistency pipeline ends with
+TABELA_CONSISTENCIA = 'apex_base_1'
+
+
+def valores(pares, lista=False):
+    """
+    Parse COLUMN=VALUE arguments.
+
+    :param pares: The 'COLUMN=VALUE' strings (with lista, 'COLUMN=V1,V2,...').
+    :param lista: Whether each column takes a comma-separated list of values.
+    :return: A dict {column: float value} (with lista, {column: list of float values}).
+    """
+    resultado = {}
+    for par in pares or []:
+        column, sep, value = par.partition('=')
+        if not sep or not column.strip():
+            raise ValueError(f"Esperado COLUNA=VALOR, recebido '{par}'")
+        column = column.strip()
+        check_identifiers(column)
+        resultado[column] = [float(v) for v in value.split(',')] if lista else float(value)
+    return resultado
+
+
+class Execucao:
+    """
+    One headless run: the selected pipelines, with the time of each step.
+    """
+
+    def __init__(self, db, etapas=('consistencia', 'manejo'), parametros=None, grade=None, check_remanescentes=True,
+                 vetorizado=False, retomar=True, memoria=False, manter_tabelas=False, processos=1, verbose=True):
+        """
+        :param db: Path to the SQLite database file.
+        :param etapas: The pipelines to run, in order ('consistencia', 'manejo').
+        :param parametros: A dict {Parametros column: value} that overrides the current parameters for
+                           this run; 'Parametros' is not changed.
+        :param grade: A dict {Parametros column: list of values}; runs every combination as a sweep
+                      (see VarreduraRunner), combined with ``parametros``.
+        :param check_remanescentes: Whether remanescentes take the decision of the talhão they refer to.
+        :param vetorizado: Compute the manejo chain with the VectorEngine when the base supports it.
+        :param retomar: Resume an interrupted run (see ManejoRunner).
+        :param memoria: Also measure the peak Python memory of each step.
+        :param manter_tabelas: Keep the output table of every sweep scenario.
+        :param processos: The number of processes of a sweep (see VarreduraRunner).
+        :param verbose: Print each step as it finishes.
+        """
+        self.db = db
+        self.etapas = etapas
+        self.parametros = parametros or {}
+        self.grade = grade or {}
+        self.rem = check_remanescentes
+        self.vetorizado = vetorizado
+        self.retomar = retomar
+        self.memoria = memoria
+        self.manter_tabelas = manter_tabelas
+        self.processos = processos
+        self.verbose = verbose
+        self.tempos = []
+        self.tabelas = []
+
+    def registrar(self, pipeline):
+        """
+        Return the callback that keeps the measurements of each step of a pipeline.
+        """
+        def callback(stats):
+            self.tempos.append({'Pipeline': pipeline, **stats})
+            if self.verbose:
+                print(f"[{pipeline}] {stats['Etapa']}: {stats['Tempo']:.2f} s")
+        return callback
+
+    def consistencia(self):
+        telemetria = PipelineTelemetry(self.db, 'Consist', self.registrar('Consist'), self.memoria)
+        Consist(self.db).pipeline(telemetria=telemetria)
+        self.tabelas.append(TABELA_CONSISTENCIA)
+        return True
+
+    def manejo(self):
+        opcoes = dict(vetorizado=self.vetorizado, retomar=self.retomar, memoria=self.memoria,
+                      estatisticas=self.registrar('APEX'))
+        if not self.parametros and not self.grade:
+            goal = ManejoRunner(self.db, self.rem, **opcoes).simulate(progress=False)
+            if goal is None:
+                return False
+            self.tabelas.append(goal)
+            return True
+
+        # An override is a sweep of one scenario, stored in 'ApexCenarios' with the others
+        cenarios = [{**self.parametros, **cenario} for cenario in VarreduraRunner.grade(self.grade)]
+        manter = self.manter_tabelas or len(cenarios) == 1
+        resultados = VarreduraRunner(self.db, self.rem, cenarios, manter_tabelas=manter, processos=self.processos,
+                                     **opcoes).run()
+        if not resultados:
+            return False
+        if manter:
+            self.tabelas.extend(table for _, table in resultados if table)
+        self.tabelas.extend(['ApexCenarios', 'ApexCenariosResultado'] if len(cenarios) > 1 else [])
+        return len(resultados) == len(cenarios)
+
+    def run(self):
+        """
+        Run the selected pipelines, stopping at the first one that fails.
+
+        :return: Whether every pipeline finished.
+        """
+        for etapa in self.etapas:
+            inicio = time.perf_counter()
+            try:
+                ok = getattr(self, etapa)()
+            except Exception as e:
+                print(f"Erro na etapa '{etapa}': {e}")
+                ok = False
+            print(f"{etapa}: {'concluída' if ok else 'falhou'} em {time.perf_counter() - inicio:.1f} s")
+            if not ok:
+                return False
+        return True
+
+    def resumo(self):
+        """
+        Return the time of each step as a DataFrame (one row per step, in execution order).
+        """
+        return pd.DataFrame(self.tempos, columns=['Pipeline', 'Etapa', *PipelineTelemetry.COLUMNS])
+
+    def exportar(self, pasta):
+        """
+        Write the result tables and the time summary to CSV files.
+
+        :param pasta: The output folder (created if missing).
+        :return: The paths written.
+        """
+        os.makedirs(pasta, exist_ok=True)
+        paths = []
+        with ConnectionPool.for_path(self.db).reader() as conn:
+            for table in dict.fromkeys(self.tabelas):
+                check_identifiers(table)
+                path = os.path.join(pasta, f"{table}.csv")
+                pd.read_sql(f"SELECT * FROM {table}", conn).to_csv(path, index=False)
+                paths.append(path)
+        path = os.path.join(pasta, 'tempos.csv')
+        self.resumo().to_csv(path, index=False)
+        paths.append(path)
+        return paths
+
+
+def imprimir_resumo(resumo):
+    """
+    Print the slowest steps and the total time of each pipeline.
+    """
+    if resumo.empty:
+        return
+    print("\nEtapas mais lentas:")
+    lentas = resumo.sort_values('Tempo', ascending=False).head(10)
+    print(lentas[['Pipeline', 'Etapa', 'Tempo', 'TempoCPU', 'LinhasEscritas']].to_string(index=False))
+    print("\nTotal por pipeline:")
+    print(resumo.groupby('Pipeline', sort=False)[['Tempo', 'TempoCPU', 'LinhasEscritas']].sum().to_string())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the consistency and manejo pipelines on a database, without the interface.")
+    parser.add_argument('base', help="The SQLite database (.db).")
+    parser.add_argument('--etapas', choices=list(ETAPAS), default='ambos', help="The pipelines to run (default: ambos).")
+    parser.add_argument('-p', '--parametro', action='append', metavar='COLUNA=VALOR',
+                        help="Override a 'Parametros' column for this run (repeatable).")
+    parser.add_argument('--grade', action='append', metavar='COLUNA=V1,V2',
+                        help="Run every combination of the given values as a sweep (repeatable).")
+    parser.add_argument('--sem-remanescentes', action='store_true', help="Do not organize the remanescentes.")
+    parser.add_argument('--vetorizado', action='store_true', help="Run the vectorized engine.")
+    parser.add_argument('--sem-retomar', action='store_true', help="Run manejo as a single transaction.")
+    parser.add_argument('--memoria', action='store_true', help="Also measure the peak memory of each step.")
+    parser.add_argument('--manter-tabelas', action='store_true', help="Keep the output table of every sweep scenario.")
+    parser.add_argument('--processos', type=int, default=1, help="Run the sweep in this many processes (default: 1).")
+    parser.add_argument('--csv', metavar='PASTA', help="Export the result tables and the time summary to this folder.")
+    parser.add_argument('-q', '--quieto', action='store_true', help="Do not print each step as it finishes.")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.base):
+        print(f"Base não encontrada: {args.base}")
+        return 2
+    try:
+        parametros, grade = valores(args.parametro), valores(args.grade, lista=True)
+    except ValueError as e:
+        print(e)
+        return 2
+
+    execucao = Execucao(args.base, ETAPAS[args.etapas], parametros, grade, not args.sem_remanescentes,
+                        args.vetorizado, not args.sem_retomar, args.memoria, args.manter_tabelas, args.processos,
+                        not args.quieto)
+    ok = execucao.run()
+    imprimir_resumo(execucao.resumo())
+    if args.csv:
+        for path in execucao.exportar(args.csv):
+            print(f"Exportado: {path}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,494 @@
+import itertools
+import math
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from Database.Engine import VectorEngine
+from Database.Fingerprint import FingerprintStore
+from Database.Journal import RunJournal
+from Database.Manejo import Manejo
+from Database.Planner import OutputPlanner
+from Database.Pool import ConnectionPool
+from Database.Regions import RegionSheets
+from Database.Telemetry import PipelineTelemetry
+from Threads.Scheduler import StepGraph
+
+
+class ManejoRunner:
+    """
+    Runs the manejo pipeline into a new 'Apex_Manejo_N' table, without Qt.
+
+    The GUI drives it through the APEX thread (Threads/Worker.py), which passes its signals as the
+    callbacks; Threads/Headless.py runs it from the command line.
+    """
+
+    def __init__(self, db, check_remanescentes, vetorizado=False, incremental=True, retomar=False,
+                 memoria=False, auditoria=None, progresso=None, maximo=None, estatisticas=None, parametros=None):
+        """
+        :param db: Path to the SQLite database file.
+        :param check_remanescentes: Whether remanescentes take the decision of the talhão they refer to.
+        :param vetorizado: Compute the manejo chain with the VectorEngine when the base supports it.
+        :param incremental: Keep the result of the steps whose inputs did not change since the last run.
+        :param retomar: Commit each step with its entry in the run journal, so a run that dies
+                        halfway is resumed by the next one (its partial table is hidden from the
+                        dashboard meanwhile, see RunJournal.finished). By default the whole run is a
+                        single transaction, rolled back on any error. Long runs opt in: the GUI
+                        worker and Threads/Headless.py.
+        :param memoria: Also measure the peak Python memory of each step (see PipelineTelemetry).
+        :param auditoria: A QueryPlanAuditor that explains the statements of each step.
+        :param progresso: Called with the number of finished steps after each one.
+        :param maximo: Called with the number of steps before the first one.
+        :param estatisticas: Called with the measurements of each step as it finishes.
+        :param parametros: A dict {Parametros column: value} used by the run in place of the values of
+                           the last 'Parametros' row. The table and 'ParametrosHistorico' are left unchanged.
+        """
+        self.db = Manejo(db)
+        self.rem = check_remanescentes
+        self.vetorizado = vetorizado
+        self.incremental = incremental
+        self.retomar = retomar
+        self.memoria = memoria
+        self.auditoria = auditoria
+        self.progresso = progresso
+        self.maximo = maximo
+        self.estatisticas = estatisticas
+        self.parametros = parametros
+        self.efetivos = None
+
+    def steps(self, goal, acrescimo_colheita):
+        """
+        List the pipeline steps in execution order.
+
+        :return: A list of (name, function, args) tuples.
+        """
+        steps = [
+            ('indices', self.db.provision_indexes, ()),
+            ('custos_silvicultura_ref_ref', self.db.create_table_with_repeated_rows, ('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REF', 7)),
+            ('ano_ref_ref', self.db.update_column_based_on_another_table, ('CustosSilvicultura_REF_REF', 'ANO', 'CustosSilvicultura_REF_REG', 'ANO', 'id')),
+            ('custo_terra', self.db.CustoTerra, ('CustosSilvicultura_REF_REF', ['BO', 'IP', 'PO', 'CO', 'PI', 'SB', 'SA', 'VI'], 8)),
+            ('vpl_ref_reg', self.db.CustosSilviculturaVPL, ('CustosSilvicultura_REF_REG', 'CustosSilvicultura_REF_REG_VPL', 'ANO', 'CustosSilvicultura_REF_REG_VPL_Total', 7)),
+            ('vpl_ref_ref', self.db.CustosSilviculturaVPL, ('CustosSilvicultura_REF_REF', 'CustosSilvicultura_REF_REF_VPL', 'ANO', 'CustosSilvicultura_REF_REF_VPL_Total', 7)),
+            ('res_inclinacao', self.db.ResInclinacao, ()),
+            ('custos_colheita', self.db.CustosColheita, ()),
+        ]
+
+        # Steps that fill the output table, which is created with all of their columns at once
+        manejo = [
+            ('esp_area_basal', self.db.ESPAreaBasal, (goal,)),
+            ('curva_vol7', self.db.update_curva_and_vol7, (goal,)),
+            ('perdas', self.db.perdas, (goal,)),
+            ('madpe_ref_reg', self.db.CustoMADPE, (goal, 'CustosSilvicultura_REF_REG_VPL', 'CustosSilvicultura_REF_REG_VPL_Total', 'CustoMADPE_REF_REG', 'Vol7', 'Vol7_2ROT')),
+            ('madpe_ref_ref', self.db.CustoMADPE, (goal, 'CustosSilvicultura_REF_REF_VPL', 'CustosSilvicultura_REF_REF_VPL_Total', 'CustoMADPE_REF_REF', 'Vol7', 'Vol7_1ROT')),
+            ('colheita_op_ref_reg', self.db.CustosColheitaOP, (goal, 'REF_REG', '2ROT', acrescimo_colheita)),
+            ('colheita_op_ref_ref', self.db.CustosColheitaOP, (goal, 'REF_REF', '1ROT', acrescimo_colheita)),
+            ('apoio_colheita_ref_reg', self.db.CustosApoioColheita, (goal, 'REF_REG', '2ROT')),
+            ('apoio_colheita_ref_ref', self.db.CustosApoioColheita, (goal, 'REF_REF', '1ROT')),
+            ('estrada_interna_ref_reg', self.db.CustosColheitaEstradaInterna, (goal, 'REF_REG', '2ROT')),
+            ('estrada_interna_ref_ref', self.db.CustosColheitaEstradaInterna, (goal, 'REF_REF', '1ROT')),
+            ('colheita_total_ref_reg', self.db.CustosColheitaTotal, (goal, 'REF_REG')),
+            ('colheita_total_ref_ref', self.db.CustosColheitaTotal, (goal, 'REF_REF')),
+            ('transporte', self.db.CustosTransporteGeral, (goal,)),
+            ('outros_custos_ref_reg', self.db.OutrosCustos, (goal, 'REF_REG', '2ROT')),
+            ('outros_custos_ref_ref', self.db.OutrosCustos, (goal, 'REF_REF', '1ROT')),
+            ('posto_fabrica_ref_reg', self.db.CustosPostoFabrica, (goal, 'REF_REG')),
+            ('posto_fabrica_ref_ref', self.db.CustosPostoFabrica, (goal, 'REF_REF')),
+            ('custo_mad_av', self.db.CustoMadAV, (goal,)),
+            ('av_pipeline', self.db.AVPipeline, (goal,)),
+            ('t700', self.db.t700, (goal,)),
+            ('apex', self.db.APEX, (goal,)),
+        ]
+
+        # Remanescentes take the decision of the talhão they refer to, looked up in the output table itself
+        manejo.append(('t700_organizador', self.db.t700_organizador, (goal, goal if self.rem else None)))
+
+        planned = OutputPlanner.columns(manejo, goal)
+        engine = VectorEngine(self.db)
+        if self.vetorizado and engine.supports('apex_base_1'):
+            # The same chain computed in memory and written with one bulk insert
+            steps.append(('motor_vetorizado', engine.run, (goal, planned, self.rem, acrescimo_colheita)))
+        else:
+            steps.append(('formato_longo', self.db.provision_region_sheets, (list(RegionSheets.SHEETS),)))
+            steps.append(('dim_talhao', self.db.provision_talhoes, (['apex_base_1'],)))
+            steps.append(('apex_manejo', self.db.create_output_table, ('apex_base_1', goal, planned)))
+            steps += manejo
+        if not self.parametros:
+            # A run with its own parameters did not use the last row of 'Parametros'
+            steps += [
+                ('parametros_historico', self.db.create_table_from_existing_schema, ('ParametrosHistorico', 'Parametros')),
+                ('parametros_historico_linha', self.db.insert_last_row_into_table, ('Parametros', 'ParametrosHistorico')),
+            ]
+        return steps
+
+    @staticmethod
+    def graph(steps):
+        """
+        Build the dependency graph of the steps from the resources declared in OutputPlanner.
+
+        :param steps: A list of (name, function, args) tuples.
+        :return: A StepGraph.
+        """
+        graph = StepGraph()
+        for name, func, args in steps:
+            reads, writes = OutputPlanner.step_io(func, args)
+            graph.add(name, func, args, reads, writes)
+        return graph
+
+    def restorable(self, node, goal, previous):
+        """
+        Check whether the last result of a step is still in the database, so the step can be skipped.
+
+        Columns of the output table are restorable when they can be copied from the previous output
+        table.
+        """
+        if not node.writes or node.func.__name__ in OutputPlanner.NOT_REUSABLE:
+            return False
+        with self.db.connect() as conn:
+            for resource in node.writes:
+                table, _, column = resource.partition('.')
+                if table == goal.lower():
+                    if not column or previous is None or not self.db.schema.has_column(conn, previous, column):
+                        return False
+                elif not self.db.schema.has_table(conn, table):
+                    return False
+                elif column and not self.db.schema.has_column(conn, table, column):
+                    return False
+        return True
+
+    def reuse(self, graph, fingerprints, stored, goal):
+        """
+        Choose the steps whose last result can be kept.
+
+        A step runs again when its fingerprint changed or its output cannot be restored. Running a
+        step again also runs the later steps that write the same resources (their result would be
+        overwritten), and, for a step that updates its output in place, the earlier ones as well.
+        The output table is the exception: it is rebuilt with the reused columns already in place.
+
+        :param graph: The StepGraph of the run.
+        :param fingerprints: The fingerprints of this run.
+        :param stored: The fingerprints of the last run, as returned by FingerprintStore.load.
+        :return: A tuple (names of the skipped steps, previous output table or None).
+        """
+        previous = None
+        saved = stored.get('apex_manejo')
+        if saved and saved[0] == fingerprints.get('apex_manejo') and saved[1] != goal:
+            with self.db.connect() as conn:
+                if self.db.schema.has_table(conn, saved[1]):
+                    previous = saved[1]
+
+        rerun = {node.name for node in graph.nodes
+                 if stored.get(node.name, (None,))[0] != fingerprints[node.name]
+                 or not self.restorable(node, goal, previous)}
+        functions = {node.name: node.func for node in graph.nodes}
+        pending = list(rerun)
+        while pending:
+            name = pending.pop()
+            before, after = graph.shared_writers(name)
+            forced = set() if functions[name].__name__ == 'create_output_table' else after
+            if graph.in_place(name):
+                forced = forced | before
+            for other in forced - rerun:
+                rerun.add(other)
+                pending.append(other)
+        return {node.name for node in graph.nodes} - rerun, previous
+
+    def completed(self, node):
+        """
+        Check whether everything a step writes is in the database.
+        """
+        with self.db.connect() as conn:
+            for resource in node.writes:
+                table, _, column = resource.partition('.')
+                if not self.db.schema.has_table(conn, table):
+                    return False
+                if column and not self.db.schema.has_column(conn, table, column):
+                    return False
+        return True
+
+    def resume(self, graph, fingerprints, done):
+        """
+        Check whether an interrupted run can be resumed.
+
+        It can when every step in its journal is still a step of the run, with the same fingerprint
+        (same call, same inputs), and its output is still in the database.
+
+        :param graph: The StepGraph of the run, built for the output table of the interrupted run.
+        :param fingerprints: The fingerprints of this run.
+        :param done: The journal of the interrupted run, {step name: fingerprint}.
+        :return: True if the steps in ``done`` can be skipped.
+        """
+        nodes = {node.name: node for node in graph.nodes}
+        return all(name in nodes and fingerprints[name] == fingerprint and self.completed(nodes[name])
+                   for name, fingerprint in done.items())
+
+    def discard(self, journal, tables):
+        """
+        Drop the partial output tables of interrupted runs and forget their journal.
+        """
+        for table in tables:
+            print(f"Discarding '{table}', left incomplete by an interrupted run.")
+            self.db.drop_table(table)
+            journal.clear(table)
+
+    def next_run(self):
+        """
+        Return the number of the next output table, one past the highest 'Apex_Manejo_N' in the database.
+        """
+        numbers = [int(x.rpartition('_')[2]) for x in self.db.list_tables()
+                   if x.startswith('Apex_Manejo_') and x.rpartition('_')[2].isdigit()]
+        return max(numbers, default=0)
+
+    def simulate(self, progress=True):
+        """
+        Run the pipeline once, with the last row of 'Parametros' (and ``parametros``), into a new
+        'Apex_Manejo_N' table.
+
+        :param progress: Whether to report the steps of the run through ``maximo`` and ``progresso``.
+        :return: The output table, or None if the run failed.
+        """
+        # Load 'Parametros' and the lookup tables once for the whole run
+        context = self.db.begin_run(self.parametros)
+        acrescimo_colheita = context.parametro(10) / 100
+        row = dict(zip(context.colunas, context.parametros))
+        # The whole row the run reads, kept for the caller (see VarreduraRunner)
+        self.efetivos = {column: value for column, value in row.items() if column != 'id'}
+        last_rows = {'Parametros': row} if self.parametros else None
+        store = FingerprintStore(self.db.db, last_rows)
+        journal = RunJournal(self.db.db)
+        telemetria = PipelineTelemetry(self.db.db, 'APEX', self.estatisticas, self.memoria)
+
+        def plan(goal):
+            graph = self.graph(self.steps(goal, acrescimo_colheita))
+
+            def normalize(args):
+                # The output tables are named after the run, so their names stay out of the fingerprints
+                return repr(args).replace(repr(goal), "'{goal}'")
+
+            return graph, graph.fingerprints(store.content_hash, normalize)
+
+        # A run interrupted after some committed steps goes on from there when nothing it used changed;
+        # otherwise (or when not resuming) its partial output table is dropped
+        done = {}
+        pending = journal.pending()
+        interrupted = max(pending, key=lambda table: int(table.rpartition('_')[2])) if pending else None
+        if interrupted and self.retomar:
+            graph, fingerprints = plan(interrupted)
+            if self.resume(graph, fingerprints, pending[interrupted]):
+                goal, done = interrupted, pending.pop(interrupted)
+                print(f"Resuming '{goal}': {len(done)} of {len(graph)} steps were already completed.")
+        if pending:
+            self.discard(journal, pending)
+        if not done:
+            goal = f'Apex_Manejo_{self.next_run() + 1}'
+            graph, fingerprints = plan(goal)
+
+        if progress and self.maximo is not None:
+            self.maximo(len(graph))
+
+        skipped = set()
+
+        def execute(node):
+            if node.name in done:
+                print(f"Step '{node.name}' skipped: it was completed before the run was interrupted.")
+                return
+            if node.name in skipped:
+                print(f"Step '{node.name}' reused: its inputs did not change since the last run.")
+                return
+            auditoria = self.auditoria.etapa(node.name) if self.auditoria is not None else nullcontext()
+            with self.db.savepoint(node.name), telemetria.etapa(node.name), auditoria:
+                node.func(*node.args)
+                if self.retomar:
+                    # Committed with the step's work, so the journal never lists a step that was rolled back
+                    journal.record(goal, node.name, fingerprints[node.name])
+
+        # Without resuming, the whole run is a single write transaction with a savepoint per step: it
+        # commits once at the end, and a failed step rolls everything back, so a half-built table is
+        # never visible. When resuming, each step commits with its journal entry instead.
+        # The shared writer stays locked for the transaction, so writes from other threads (e.g. dropping
+        # a table from the dashboard) wait until the run ends; reads go through the readers and do not
+        # Every step writes through the same connection, so the graph runs one step at a time
+        try:
+            with nullcontext() if self.retomar else self.db.transaction():
+                if self.incremental and not done:
+                    skipped, previous = self.reuse(graph, fingerprints, store.load(), goal)
+                    if previous:
+                        # The output table starts from the previous one, with the columns of the skipped steps
+                        reused = {resource.partition('.')[2] for node in graph.nodes if node.name in skipped
+                                  for resource in node.writes if resource.startswith(goal.lower() + '.')}
+                        for i, node in enumerate(graph.nodes):
+                            if node.func.__name__ == 'create_output_table':
+                                source, table, planned = node.args
+                                columns = [column for column, _ in planned if column.lower() in reused]
+                                graph.nodes[i] = node._replace(args=(source, table, planned, previous, columns))
+                graph.run(execute, self.progresso if progress else None)
+                with self.db.transaction():
+                    store.save(fingerprints, goal)
+                    journal.clear(goal)
+        except Exception as e:
+            if self.retomar:
+                print(f"Pipeline failed, the completed steps of '{goal}' were kept for the next run: {e}")
+            else:
+                print(f"Pipeline failed, no changes were saved: {e}")
+            return None
+        finally:
+            self.db.end_run()
+            telemetria.save()
+        return goal
+
+
+class VarreduraRunner(ManejoRunner):
+    """
+    Runs the pipeline for every scenario of a grid of 'Parametros' values, in one pass.
+
+    Each scenario is simulated like a single run, with its values passed to the run context in place
+    of those of the last 'Parametros' row (the table is not changed), so the steps that do not depend
+    on the changed parameters are reused from the previous scenario by the incremental mode. The
+    scenarios are sorted so that consecutive ones differ in the parameters read the latest in the
+    chain. The decision of each talhão is stored per scenario by Manejo.save_scenario, and the full
+    output tables are dropped once the next scenario no longer needs them.
+
+    With several processes the sorted scenarios are split into consecutive parts, each part runs on
+    its own copy of the base in a process pool, and the stored scenarios are copied back.
+    """
+
+    # Parameters ordered from the earliest to the latest step that reads them
+    ORDEM = ['GanhoGenetico', 'PerdaGenetica', 'R2', 'MecColheita', 'Juros', 'AcrescimoColheitaTalhadia',
+             'TalhadiaRA', 'TalhadiaRB', 'RA3', 'RB3', 'RA2', 'RB2', 'AvaliacaoEco']
+
+    def __init__(self, db, check_remanescentes, cenarios, vetorizado=False, manter_tabelas=False, processos=1,
+                 **kwargs):
+        """
+        :param cenarios: A list of dicts {Parametros column: value}; missing columns keep the current value.
+        :param manter_tabelas: Keep the full output table of every scenario (runs in this process).
+        :param processos: The number of processes that run parts of the sweep, each on a copy of the base.
+        :param kwargs: The callbacks and options of ManejoRunner.
+        """
+        super().__init__(db, check_remanescentes, vetorizado=vetorizado, incremental=True, **kwargs)
+        self.cenarios = self.ordenar(cenarios)
+        self.manter_tabelas = manter_tabelas
+        self.processos = processos
+
+    @staticmethod
+    def grade(valores):
+        """
+        Build the scenarios of a grid.
+
+        :param valores: A dict {Parametros column: list of values}.
+        :return: A list of dicts, one per combination of values.
+        """
+        columns = list(valores)
+        return [dict(zip(columns, combination)) for combination in itertools.product(*valores.values())]
+
+    @classmethod
+    def ordenar(cls, cenarios):
+        """
+        Sort the scenarios so that the parameters read early in the chain change as rarely as possible.
+        """
+        def key(cenario):
+            return tuple(cenario[column] for column in cls.ORDEM if column in cenario)
+        return sorted(cenarios, key=key)
+
+    def run(self):
+        """
+        Simulate every scenario.
+
+        :return: A list of (scenario, output table) for the scenarios that ran, or None if a scenario
+                 names a column 'Parametros' does not have. The output table is None for the
+                 scenarios run by other processes.
+        """
+        if self.maximo is not None:
+            self.maximo(len(self.cenarios))
+
+        with self.db.connect() as conn:
+            columns = {d[0] for d in conn.execute("SELECT * FROM Parametros LIMIT 0").description} - {'id'}
+        invalid = {column for cenario in self.cenarios for column in cenario} - columns
+        if invalid:
+            print(f"Unknown Parametros columns: {', '.join(sorted(invalid))}")
+            return None
+
+        if self.processos > 1 and len(self.cenarios) > 1 and not self.manter_tabelas:
+            return self.paralelo()
+
+        anterior, resultados = None, []
+        try:
+            for i, cenario in enumerate(self.cenarios, start=1):
+                self.parametros = {column: float(value) for column, value in cenario.items()}
+                result = self.simulate(progress=False)
+                if result is None:
+                    print(f"Scenario {cenario} failed, sweep stopped.")
+                    break
+                self.db.save_scenario(result, cenario, self.efetivos)
+                resultados.append((cenario, result))
+                if anterior and not self.manter_tabelas:
+                    # The previous output table was only kept for the reuse by this scenario
+                    self.db.drop_table(anterior)
+                anterior = result
+                if self.progresso is not None:
+                    self.progresso(i)
+        finally:
+            self.parametros = None
+        return resultados
+
+    def paralelo(self):
+        """
+        Run consecutive parts of the sorted scenarios in a process pool, each on a copy of the base,
+        and copy the stored scenarios back in order. A failed scenario stops its part only.
+
+        :return: A list of (scenario, None) for the scenarios that ran.
+        """
+        tamanho = math.ceil(len(self.cenarios) / self.processos)
+        partes = [self.cenarios[i:i + tamanho] for i in range(0, len(self.cenarios), tamanho)]
+        desde = self.db.last_scenario()
+        raiz = os.path.splitext(self.db.db)[0]
+        copias = [f"{raiz}_varredura_{k}.db" for k in range(1, len(partes) + 1)]
+        opcoes = dict(vetorizado=self.vetorizado, retomar=self.retomar, memoria=self.memoria)
+
+        resultados = []
+        try:
+            with self.db.connect() as conn:
+                for copia in copias:
+                    _remover(copia)
+                    destino = sqlite3.connect(copia)
+                    conn.backup(destino)
+                    destino.close()
+
+            with ProcessPoolExecutor(max_workers=len(partes)) as pool:
+                futures = [pool.submit(_varrer, copia, self.rem, parte, opcoes) for copia, parte in zip(copias, partes)]
+                for copia, parte, future in zip(copias, partes, futures):
+                    try:
+                        _, execucoes = future.result()
+                    except Exception as e:
+                        print(f"Sweep process of '{copia}' failed: {e}")
+                        execucoes = []
+                    # The measurements of the part go to this base, as if its runs were made here
+                    for telemetria in execucoes:
+                        telemetria.db = self.db.db
+                        if self.estatisticas is not None:
+                            for stats in telemetria.etapas:
+                                self.estatisticas(stats)
+                        telemetria.save()
+                    resultados += [(cenario, None) for cenario in parte[:self.db.import_scenarios(copia, desde)]]
+                    if self.progresso is not None:
+                        self.progresso(len(resultados))
+        finally:
+            for copia in copias:
+                _remover(copia)
+        return resultados
+
+
+def _varrer(db, check_remanescentes, cenarios, opcoes):
+    # Runs one part of a parallel sweep, in a process of the pool. The copy of the base is removed
+    # afterwards, so the runs measured in it are returned along with the number of scenarios
+    desde = PipelineTelemetry.ultima(db)
+    resultados = VarreduraRunner(db, check_remanescentes, cenarios, **opcoes).run()
+    return len(resultados or []), PipelineTelemetry.carregar(db, desde)
+
+
+def _remover(path):
+    pool = ConnectionPool.for_path(path)
+    pool.close()
+    pool.schema.invalidate()
+    for arquivo in (path, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
@@ -0,0 +1,151 @@
+import hashlib
+from collections import namedtuple
+
+Node = namedtuple('Node', ['name', 'func', 'args', 'reads', 'writes'])
+
+
+def overlaps(first, second):
+    """
+    Check whether two resources ('table' or 'table.column') touch the same data.
+    """
+    return first == second or first.startswith(second + '.') or second.startswith(first + '.')
+
+
+class StepGraph:
+    """
+    Dependency graph of the pipeline steps, built from the resources each step reads and writes.
+
+    A step waits for every other step that writes something it reads, whatever their declaration
+    order, so new steps do not need to be hand-placed in the list. Steps writing the same resource
+    keep their declaration order. Steps with no path between them (such as the REF_REG and REF_REF
+    cost branches) are independent and keep their declaration order. The steps run one at a time:
+    they all write through the same SQLite connection, inside its transaction and savepoints.
+    """
+
+    def __init__(self):
+        self.nodes = []
+
+    def add(self, name, func, args=(), reads=(), writes=()):
+        """
+        Declare a step.
+
+        :param name: The step name (unique).
+        :param func: The function to call.
+        :param args: The positional arguments of the call.
+        :param reads: The resources the step reads.
+        :param writes: The resources the step writes.
+        """
+        if any(node.name == name for node in self.nodes):
+            raise ValueError(f"Duplicate step name: {name!r}")
+        self.nodes.append(Node(name, func, tuple(args), frozenset(reads), frozenset(writes)))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def dependencies(self):
+        """
+        Return {step name: set of the step names it waits for}.
+        """
+        depends = {node.name: set() for node in self.nodes}
+        for i, node in enumerate(self.nodes):
+            for j, other in enumerate(self.nodes):
+                if i == j:
+                    continue
+                same_writes = any(overlaps(a, b) for a in node.writes for b in other.writes)
+                if same_writes:
+                    # Writers of the same resource run in declaration order
+                    if j < i:
+                        depends[node.name].add(other.name)
+                elif any(overlaps(a, b) for a in node.reads for b in other.writes):
+                    depends[node.name].add(other.name)
+        return depends
+
+    def shared_writers(self, name):
+        """
+        Return the names of the steps declared before and after a step that write the same resources.
+
+        :param name: The step name.
+        :return: A tuple (before, after) of sets of step names.
+        """
+        index = next(i for i, node in enumerate(self.nodes) if node.name == name)
+        node = self.nodes[index]
+        before, after = set(), set()
+        for i, other in enumerate(self.nodes):
+            if i != index and any(overlaps(a, b) for a in node.writes for b in other.writes):
+                (before if i < index else after).add(other.name)
+        return before, after
+
+    def in_place(self, name):
+        """
+        Check whether a step reads what it writes (e.g. ``SET col = col + ?``), so it cannot run twice on its output.
+        """
+        node = next(node for node in self.nodes if node.name == name)
+        return any(overlaps(a, b) for a in node.reads for b in node.writes)
+
+    def fingerprints(self, external, normalize=repr):
+        """
+        Fingerprint every step from its call, the content of its external inputs and the
+        fingerprints of the steps it depends on.
+
+        A resource written by some step is internal: its content is already covered by the
+        fingerprint of that step, so only the resources no step writes are hashed.
+
+        :param external: Called as external(table, column, excluded_columns); returns the content hash
+                         of an input ('column' is None for a whole table).
+        :param normalize: Turns the step arguments into text (e.g. replacing run-specific table names).
+        :return: A dict {step name: hex digest}.
+        """
+        whole, columns = set(), {}
+        for node in self.nodes:
+            for resource in node.writes:
+                table, _, column = resource.partition('.')
+                if column:
+                    columns.setdefault(table, set()).add(column)
+                else:
+                    whole.add(table)
+
+        depends = self.dependencies()
+        result = {}
+        for node in self.order():
+            digest = hashlib.sha256()
+            digest.update(f"{node.name}|{getattr(node.func, '__qualname__', node.func)}|".encode())
+            digest.update(normalize(node.args).encode())
+            for resource in sorted(node.reads):
+                table, _, column = resource.partition('.')
+                if table in whole or column in columns.get(table, ()):
+                    continue
+                digest.update(f"|{resource}={external(table, column or None, columns.get(table, set()))}".encode())
+            for name in sorted(depends[node.name]):
+                digest.update(f"|{name}:{result[name]}".encode())
+            result[node.name] = digest.hexdigest()
+        return result
+
+    def order(self):
+        """
+        Return the steps in a topological order, keeping the declaration order between independent steps.
+
+        :raises ValueError: If the declared reads and writes form a cycle.
+        """
+        depends = self.dependencies()
+        done, ordered = set(), []
+        while len(ordered) < len(self.nodes):
+            ready = [node for node in self.nodes if node.name not in done and depends[node.name] <= done]
+            if not ready:
+                pending = [node.name for node in self.nodes if node.name not in done]
+                raise ValueError(f"Cyclic step dependencies between: {', '.join(pending)}")
+            ordered.append(ready[0])
+            done.add(ready[0].name)
+        return ordered
+
+    def run(self, execute, progress=None):
+        """
+        Execute every step, in the order returned by ``order``.
+
+        :param execute: Called with each Node; runs the step.
+        :param progress: Called with the number of finished steps after each one.
+        :raises Exception: The first error raised by a step; the later steps are not run.
+        """
+        for count, node in enumerate(self.order(), start=1):
+            execute(node)
+            if progress:
+                progress(count)